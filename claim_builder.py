@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   claim_builder.py
+#
+
+from pathlib import Path
+from wikibaseintegrator.wbi_enums import ActionIfExists, WikibaseTimePrecision, WikibaseSnakType
+
+import constants
+import dead_letter
+import json
+import wikibaseintegrator.datatypes as datatypes
+import wikibaseintegrator.models as models
+import yaml
+
+# Read in YAML file.
+yaml_dict=yaml.safe_load(Path("project.yaml").read_text())
+
+wikibase_name = yaml_dict['wikibase']['wikibase_name']
+
+# Builds WikibaseIntegrator claims from the processed objects of the
+# formatters (article, author, grant and journal). The datatype of every
+# property is looked up in constants.property_datatypes_file, and the claim
+# is made by the constructor for that datatype, so building a claim is a
+# dict lookup rather than a walk through lists of property IDs.
+#
+# A claim value may be
+#   - a plain value ('Q123', 'some string', 42, '2024-05-00'),
+#   - a dict with the value under 'value' (or, for items, under the wiki's
+#     name or the claim's own property ID), a 'language' for monolingual
+#     text, a 'precision' for times, a 'reference' dict, and qualifiers
+#     keyed by property ID, or
+#   - a list of either, one claim per element.
+#
+# Only the qualifiers listed for the claim's datatype or property in the
+# "qualifiers" table are added; other keys (e.g. an author's ORCID iD,
+# which belongs on the author rather than on the article's author claim)
+# are left out.
+
+with open(constants.property_datatypes_file, 'r') as f:
+    property_datatypes_json = json.load(f)
+
+property_datatypes = property_datatypes_json['datatypes']
+claim_qualifiers = property_datatypes_json['qualifiers']
+
+def datatype(prop_nr):
+    try:
+        return property_datatypes[prop_nr]
+    except KeyError:
+        raise dead_letter.UnprocessableRecord("No datatype is known for property %s." % str(prop_nr), stage='claims')
+
+# The value of an item, string, identifier or quantity given as a dict.
+def plain_value(value):
+    if isinstance(value, dict):
+        if wikibase_name in value:
+            return value[wikibase_name]
+        return value['value']
+    return value
+
+def build_item(prop_nr, value, **kwargs):
+    value = plain_value(value)
+    if value is None:
+        return datatypes.Item(prop_nr=prop_nr, snaktype=WikibaseSnakType.NO_VALUE, **kwargs)
+    return datatypes.Item(prop_nr=prop_nr, value=value, **kwargs)
+
+def build_string(prop_nr, value, **kwargs):
+    return datatypes.String(prop_nr=prop_nr, value=plain_value(value), **kwargs)
+
+def build_external_id(prop_nr, value, **kwargs):
+    return datatypes.ExternalID(prop_nr=prop_nr, value=plain_value(value), **kwargs)
+
+def build_monolingual_text(prop_nr, value, **kwargs):
+    return datatypes.MonolingualText(prop_nr=prop_nr, text=value['value'], language=value['language'], **kwargs)
+
+def build_quantity(prop_nr, value, **kwargs):
+    return datatypes.Quantity(prop_nr=prop_nr, amount=plain_value(value), **kwargs)
+
+# Dates are YYYY-MM-DD, with 00 for an unknown month or day; a bare year is
+# also accepted. The precision follows from the zeros unless one is given.
+def build_time(prop_nr, value, **kwargs):
+    precision = None
+    if isinstance(value, dict):
+        precision = value.get('precision')
+        value = value['value']
+    if value == "UNKNOWN":
+        return datatypes.Time(prop_nr=prop_nr, snaktype=WikibaseSnakType.UNKNOWN_VALUE, **kwargs)
+    value = str(value)
+    if '-' not in value:
+        value = value + '-00-00'
+    if precision is None:
+        if value.endswith('-00-00'):
+            precision = "YEAR"
+        elif value.endswith('-00'):
+            precision = "MONTH"
+        else:
+            precision = "DAY"
+    if precision not in ["YEAR", "MONTH", "DAY"]:
+        raise dead_letter.UnprocessableRecord("Precision value (%s) not recognized for property %s." % (str(precision), str(prop_nr)), stage='claims')
+    return datatypes.Time(prop_nr=prop_nr, time='+'+value+'T00:00:00'+'Z', precision=WikibaseTimePrecision[precision], **kwargs)
+
+builders = {
+    'wikibase-item': build_item,
+    'string': build_string,
+    'external-id': build_external_id,
+    'monolingualtext': build_monolingual_text,
+    'quantity': build_quantity,
+    'time': build_time
+}
+
+def build_snak(prop_nr, value, **kwargs):
+    return builders[datatype(prop_nr)](prop_nr, value, **kwargs)
+
+# The reference used for everything taken from a PubMed record.
+def pubmed_references():
+    return build_references({'P21': 'Q19463'}) # stated in; PubMed
+
+# References with one reference made of the given {property ID: value}.
+def build_references(reference_dict):
+    references = models.references.References()
+    reference = models.references.Reference()
+    for ref_id, ref_val in reference_dict.items():
+        reference.add(build_snak(ref_id, ref_val))
+    references.add(reference)
+    return references
+
+def build_qualifiers(claim_id, claim_dict, qualifiers=None):
+    if qualifiers is None:
+        qualifiers = models.Qualifiers()
+    allowed = claim_qualifiers.get(datatype(claim_id), []) + claim_qualifiers.get(claim_id, [])
+    for qual_claim_id, qual_claim_val in claim_dict.items():
+        if qual_claim_id in allowed:
+            if isinstance(qual_claim_val, list):
+                for qual_sub_claim_val in qual_claim_val:
+                    qualifiers.add(build_snak(qual_claim_id, qual_sub_claim_val))
+            else:
+                qualifiers.add(build_snak(qual_claim_id, qual_claim_val))
+        elif isinstance(qual_claim_val, dict) and not str(qual_claim_id).startswith('P'):
+            # Groups of qualifiers, e.g. the MeSH qualifiers of a heading (keyed 0, 1, ...).
+            build_qualifiers(claim_id, qual_claim_val, qualifiers=qualifiers)
+    return qualifiers
+
+# Returns the claims for claim_id made from claim_value (see above).
+# references are used unless a value carries its own 'reference'.
+def build_claims(claim_id, claim_value, references=None):
+    if isinstance(claim_value, list):
+        claims = []
+        for sub_claim_value in claim_value:
+            claims.extend(build_claims(claim_id, sub_claim_value, references=references))
+        return claims
+
+    kwargs = {}
+    if isinstance(claim_value, dict):
+        if 'reference' in claim_value:
+            references = build_references(claim_value['reference'])
+        kwargs['qualifiers'] = build_qualifiers(claim_id, claim_value)
+        if 'value' not in claim_value and wikibase_name not in claim_value and claim_id in claim_value:
+            claim_value = claim_value[claim_id]
+    if references is not None:
+        kwargs['references'] = references
+    return [build_snak(claim_id, claim_value, **kwargs)]
+
+# Adds the claims for every {property ID: value} in claims_dict to item,
+# except for the properties in skip.
+def add_claims(item, claims_dict, references=None, skip=(), action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND):
+    for claim_id, claim_value in claims_dict.items():
+        if claim_id in skip:
+            continue
+        for claim_obj in build_claims(claim_id, claim_value, references=references):
+            item.claims.add(claim_obj, action_if_exists=action_if_exists)
+    return item
@@ -58,6 +58,33 @@ funding_mechanism_mapping_file = "pubmed-funding-mechanisms.json"
 nlm_wikibase_mapping_file = "nlm-wikibase-mapping.json"
 pmid_wikibase_mapping_file = "pmid-wikibase-mapping.json"
 
+# Wikibase datatype of each property, and the qualifiers each claim takes.
+property_datatypes_file = "pubmed-property-datatypes.json"
+
+# Caches
+pubmed_xml_cache_file = "pubmed-xml-cache.sqlite"
+
+# Last-run dates for pubmed_query.py --sync, keyed by query term.
+sync_watermark_file = "pubmed-sync-watermarks.json"
+
+# Per-PMID record of completed ingestion stages, used to resume runs.
+run_journal_file = "pubmed-run-journal.sqlite"
+
+# Records the formatters could not handle, kept for dead_letter.py --replay.
+dead_letter_file = "pubmed-dead-letter.sqlite"
+
+# Match questions deferred by pubmed_query.py --headless, and their answers.
+review_queue_file = "review-queue.json"
+
+# QIDs of the items created for each edit key, used to resume plan applies.
+edit_key_store_file = "wikibase-edit-keys.sqlite"
+
+# Identifier -> Wikidata QID mappings (see wikidata_mapping_store.py).
+wikidata_mapping_store_file = "wikidata-mapping.sqlite"
+
+# Offline identifier -> Wikidata QID index built from a dump (see wikidata_index.py).
+wikidata_index_file = "wikidata-index.sqlite"
+
 #
 #   SPARQL QUERIES
 #
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   dead_letter.py
+#
+
+from datetime import datetime, timezone
+
+import argparse
+import constants
+import json
+import sqlite3
+
+# Records that a formatter cannot handle (an unmapped agency, an unknown
+# identifier type, ...) are quarantined here with their error instead of
+# stopping the run. Once the mappings are fixed, they can be replayed with:
+#
+#   python dead_letter.py --replay
+
+conn = None
+
+# PMIDs being replayed; each is released once it has been processed again
+# (see resolve).
+replaying = set()
+
+# Raised by a formatter when a record contains something it does not know
+# how to map. stage names the part of the record that failed.
+class UnprocessableRecord(Exception):
+
+    def __init__(self, message, stage=None):
+        super().__init__(message)
+        self.stage = stage
+
+def main():
+
+    # Parse arguments
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--list', action='store_true', help='List the quarantined PMIDs with the stage and error that stopped them.')
+    parser.add_argument('--replay', action='store_true', help='Fetch the quarantined PMIDs again and re-run them through the formatters.')
+    parser.add_argument('--pmid', type=str, action='append', help='Only replay this PMID (may be given more than once).')
+    args=parser.parse_args()
+
+    if args.replay:
+        replay(pmids=args.pmid)
+        return
+
+    for pmid, stage, error, quarantined_at in list_records():
+        print(f"{pmid}\t{stage}\t{quarantined_at}\t{error}")
+
+def connect(dead_letter_file=constants.dead_letter_file):
+    global conn
+    if conn is None:
+        conn = sqlite3.connect(dead_letter_file)
+        conn.execute("""CREATE TABLE IF NOT EXISTS records (
+            pmid TEXT PRIMARY KEY,
+            stage TEXT,
+            error TEXT NOT NULL,
+            record TEXT,
+            quarantined_at TEXT NOT NULL
+        )""")
+        conn.commit()
+    return conn
+
+def quarantine(pmid, exception, entrez_obj=None):
+    stage = getattr(exception, 'stage', None)
+    error = "%s: %s" % (type(exception).__name__, str(exception))
+    print(f"Quarantining PMID {pmid} ({error}).")
+    connect().execute(
+        "INSERT OR REPLACE INTO records (pmid, stage, error, record, quarantined_at) VALUES (?, ?, ?, ?, ?)",
+        (str(pmid), stage, error, json.dumps(entrez_obj, default=str) if entrez_obj is not None else None, datetime.now(timezone.utc).isoformat())
+    )
+    conn.commit()
+
+def release(pmid):
+    connect().execute("DELETE FROM records WHERE pmid = ?", (str(pmid),))
+    conn.commit()
+
+# Called by pubmed_format.process_object once an article has been processed
+# without error. Only PMIDs being replayed are released.
+def resolve(pmid):
+    if str(pmid) in replaying:
+        replaying.discard(str(pmid))
+        release(pmid)
+
+# Returns (pmid, stage, error, quarantined_at) for every quarantined record.
+def list_records():
+    return connect().execute("SELECT pmid, stage, error, quarantined_at FROM records ORDER BY quarantined_at").fetchall()
+
+# Re-fetches the quarantined PMIDs and processes them again. Each record is
+# kept until its article has been processed without error, so a replay that
+# is interrupted, or a PMID that fails to fetch, leaves it quarantined;
+# records that fail again are quarantined with the new error.
+def replay(pmids=None):
+    import pmid_index
+    import pubmed_query
+
+    if not pmids:
+        pmids = [record[0] for record in list_records()]
+    pmids = [str(pmid) for pmid in pmids]
+    print(f"Replaying {len(pmids)} quarantined articles...")
+    if pmids:
+        pubmed_wikibase_mappings = pmid_index.load_pmid_index()
+        # Articles already mapped to the Wikibase are skipped by
+        # process_raw_batches; there is nothing left to replay for them.
+        for pmid in pmids:
+            if pmid in pubmed_wikibase_mappings:
+                release(pmid)
+        replaying.update(pmids)
+        try:
+            raw_batches = pubmed_query.pubmed_id_batches(pmids)
+            pubmed_query.process_raw_batches(raw_batches, pubmed_wikibase_mappings, stream=True)
+        finally:
+            replaying.clear()
+    print(f"{len(list_records())} articles remain quarantined.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   edit_keys.py
+#
+
+from datetime import datetime, timezone
+
+import constants
+import run_journal
+import sqlite3
+import threading
+
+# Gives every Wikibase edit made while ingesting an article a deterministic
+# key, and remembers the QID each keyed edit produced, so a run or a plan
+# apply that stopped part way can be resumed without creating any item
+# twice. A key is
+#
+#   <PMID>:<stage>:<op>:<name>#<ordinal>
+#
+# where stage is the run journal stage making the edit ('journal',
+# 'article', 'author:2', ...), op is 'create' or 'update', name is the new
+# item's English label (or the QID being updated) and ordinal counts edits
+# with the same name within the stage. Counting per name keeps keys stable
+# when a rerun finds an item it created last time and skips that create.
+#
+# Items are never merged by content: two authors with the same name and no
+# identifier look alike but are different people, so an item planned in
+# several articles is created once per article.
+
+conn = None
+store_lock = threading.Lock()
+
+# (PMID, stage, op, name) -> edits keyed so far in the current article.
+ordinals = {}
+
+def connect(store_file=constants.edit_key_store_file):
+    global conn
+    if conn is None:
+        conn = sqlite3.connect(store_file, check_same_thread=False)
+        conn.execute("""CREATE TABLE IF NOT EXISTS keys (
+            key TEXT PRIMARY KEY,
+            qid TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )""")
+        conn.commit()
+    return conn
+
+# Called as an article starts, so its keys are numbered from the start again.
+# Ordinals only matter within an article, so the last article's are dropped.
+def reset_article(pmid):
+    with store_lock:
+        ordinals.clear()
+
+def item_name(entity_json):
+    labels = entity_json.get('labels') or {}
+    label = labels.get('en') or next(iter(labels.values()), None)
+    if label is not None:
+        return label.get('value')
+    return entity_json.get('id')
+
+# Returns the key for the next edit of the current article, or None outside
+# of an article.
+def next_key(op, name, pmid=None, stage=None):
+    pmid = pmid if pmid is not None else run_journal.current_pmid
+    if pmid is None:
+        return None
+    stage = stage or run_journal.current_stage() or 'object'
+    counted = (str(pmid), stage, op, name)
+    with store_lock:
+        ordinals[counted] = ordinals.get(counted, 0) + 1
+        ordinal = ordinals[counted]
+    return f"{pmid}:{stage}:{op}:{name}#{ordinal}"
+
+def lookup(key):
+    if key is None:
+        return None
+    with store_lock:
+        row = connect().execute("SELECT qid FROM keys WHERE key = ?", (key,)).fetchone()
+    return row[0] if row is not None else None
+
+def record(key, qid):
+    if key is None:
+        return
+    with store_lock:
+        connect().execute(
+            "INSERT OR REPLACE INTO keys (key, qid, created_at) VALUES (?, ?, ?)",
+            (key, qid, datetime.now(timezone.utc).isoformat())
+        )
+        conn.commit()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   entrez_scheduler.py
+#
+
+from Bio import Entrez
+from concurrent.futures import ThreadPoolExecutor
+from http.client import IncompleteRead
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+
+import random
+import threading
+import time
+import yaml
+
+# Read in YAML file.
+yaml_dict=yaml.safe_load(Path("project.yaml").read_text())
+
+# PubMed email (provide a valid email address)
+Entrez.email = yaml_dict['entrez']['entrez_email']
+
+# NCBI API key (optional); raises the allowed request rate from 3 to 10
+# requests per second.
+Entrez.api_key = yaml_dict['entrez'].get('entrez_api_key')
+
+# Retries are handled here (with backoff) rather than inside Bio.Entrez.
+Entrez.max_tries = 1
+
+requests_per_second = 10 if Entrez.api_key else 3
+default_max_workers = yaml_dict['entrez'].get('max_workers', 3)
+
+max_tries = 6
+base_backoff = 1.0
+max_backoff = 60.0
+
+# Token bucket shared by every Entrez call made through this module. With
+# the default capacity of one token, requests are spaced evenly at 1/rate
+# seconds; a larger capacity allows bursts of that many requests, which
+# NCBI's per-second limit does not.
+class TokenBucket:
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+token_bucket = TokenBucket(requests_per_second)
+
+def is_retryable(exception):
+    if isinstance(exception, HTTPError):
+        return exception.code == 429 or exception.code >= 500
+    return isinstance(exception, (URLError, IncompleteRead, ConnectionError, TimeoutError))
+
+# Calls an Entrez function (e.g. Entrez.efetch), waiting for a token before
+# each attempt and backing off exponentially on HTTP 429/5xx and network
+# errors. Returns the raw response body.
+def call_entrez(entrez_function, **kwargs):
+    for attempt in range(max_tries):
+        token_bucket.acquire()
+        try:
+            handle = entrez_function(**kwargs)
+            try:
+                return handle.read()
+            finally:
+                handle.close()
+        except Exception as exception:
+            if not is_retryable(exception) or attempt == max_tries - 1:
+                raise
+            delay = min(max_backoff, base_backoff * (2 ** attempt)) + random.uniform(0, base_backoff)
+            if isinstance(exception, HTTPError) and exception.headers and exception.headers.get('Retry-After'):
+                try:
+                    delay = max(delay, float(exception.headers.get('Retry-After')))
+                except ValueError:
+                    pass
+            print(f"Entrez request failed ({exception}); retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+def fetch_history_batch(webenv, query_key, retstart, retmax):
+    return call_entrez(Entrez.efetch, db="pubmed", retmode="xml", retstart=retstart, retmax=retmax, webenv=webenv, query_key=query_key)
+
+# Fetches the batches of a history-server result set with up to max_workers
+# requests in flight, yielding the raw XML of each batch in order. Only a
+# bounded window of batches is submitted ahead of the consumer.
+def fetch_history_batches(count, webenv, query_key, batch_size, max_workers=default_max_workers):
+    retstarts = list(range(0, count, batch_size))
+    window = max(1, max_workers) * 2
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {}
+        next_to_submit = 0
+        for index, retstart in enumerate(retstarts):
+            while next_to_submit < len(retstarts) and next_to_submit < index + window:
+                futures[next_to_submit] = executor.submit(fetch_history_batch, webenv, query_key, retstarts[next_to_submit], batch_size)
+                next_to_submit += 1
+            print(f"Fetching records {retstart + 1} to {min(retstart + batch_size, count)} of {count}...")
+            yield futures.pop(index).result()
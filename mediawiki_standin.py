@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   mediawiki_standin.py
+#
+
+import json
+import threading
+
+# A local stand-in for the parts of the MediaWiki action API that the
+# Wikibase writers use (edit tokens, wbeditentity and wbgetentities). Entities
+# are kept in memory and new items are numbered from first_id. Every request
+# and response is recorded, so a run can be inspected or saved and replayed
+# later with RecordedMediaWiki:
+#
+#   standin = MediaWikiStandIn()
+#   qids = wikibase_batch_writer.create_items(items, api=standin)
+#   standin.save('calls.jsonl')
+
+class MediaWikiStandIn:
+
+    def __init__(self, first_id=1):
+        self.next_id = first_id
+        self.next_statement = 1
+        self.entities = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def edit_token(self):
+        return self.call({'action': 'query', 'meta': 'tokens', 'format': 'json'})['query']['tokens']['csrftoken']
+
+    def call(self, data):
+        with self.lock:
+            response = self.respond(dict(data))
+            self.calls.append({'request': dict(data), 'response': response})
+        if 'error' in response:
+            raise StandInError(response['error'])
+        return response
+
+    def respond(self, data):
+        action = data.get('action')
+        if action == 'query' and data.get('meta') == 'tokens':
+            return {'query': {'tokens': {'csrftoken': 'standin+\\'}}}
+        if action == 'wbeditentity':
+            if data.get('token') != 'standin+\\':
+                return {'error': {'code': 'badtoken', 'info': 'Invalid CSRF token.'}}
+            entity = json.loads(data.get('data') or '{}')
+            if data.get('new') == 'item':
+                entity['id'] = 'Q%d' % self.next_id
+                entity['type'] = 'item'
+                self.next_id += 1
+            elif data.get('id') in self.entities:
+                if not data.get('clear'):
+                    entity = self.merge(self.entities[data['id']], entity)
+                entity['id'] = data['id']
+            else:
+                return {'error': {'code': 'no-such-entity', 'info': 'Could not find an entity with the ID "%s".' % data.get('id')}}
+            entity['lastrevid'] = entity.get('lastrevid', 0) + 1
+            self.entities[entity['id']] = entity
+            return {'entity': entity, 'success': 1}
+        if action == 'wbgetentities':
+            entities = {}
+            for entity_id in str(data.get('ids', '')).split('|'):
+                entities[entity_id] = self.entities.get(entity_id, {'id': entity_id, 'missing': ''})
+            return {'entities': entities, 'success': 1}
+        return {'error': {'code': 'badvalue', 'info': 'Unrecognized value for parameter "action": %s.' % action}}
+
+    # Applies the changes in entity (as wbeditentity would without clear) to
+    # existing: terms are set, or removed with 'remove'; aliases with 'add'
+    # are added to the existing ones; statements with an ID replace or
+    # ('remove') remove that statement, and new statements are added.
+    def merge(self, existing, entity):
+        for part in ['labels', 'descriptions']:
+            for language, term in (entity.get(part) or {}).items():
+                existing.setdefault(part, {})
+                if 'remove' in term:
+                    existing[part].pop(language, None)
+                else:
+                    existing[part][language] = {'language': language, 'value': term['value']}
+        for language, aliases in (entity.get('aliases') or {}).items():
+            if not any('add' in alias or 'remove' in alias for alias in aliases):
+                existing.setdefault('aliases', {})[language] = []
+            current = existing.setdefault('aliases', {}).setdefault(language, [])
+            for alias in aliases:
+                current[:] = [kept for kept in current if kept['value'] != alias['value']]
+                if 'remove' not in alias:
+                    current.append({'language': language, 'value': alias['value']})
+        claims = entity.get('claims') or []
+        if isinstance(claims, dict):
+            claims = [statement for statements in claims.values() for statement in statements]
+        for statement in claims:
+            for statements in (existing.get('claims') or {}).values():
+                statements[:] = [kept for kept in statements if 'id' not in statement or kept.get('id') != statement['id']]
+            if 'remove' not in statement:
+                statement = dict(statement)
+                if 'id' not in statement:
+                    statement['id'] = '%s$standin-%d' % (existing['id'], self.next_statement)
+                    self.next_statement += 1
+                existing.setdefault('claims', {}).setdefault(statement['mainsnak']['property'], []).append(statement)
+        return existing
+
+    # Writes the recorded calls as JSON lines.
+    def save(self, record_file):
+        with open(record_file, 'w') as f:
+            for recorded_call in self.calls:
+                f.write(json.dumps(recorded_call, sort_keys=True) + '\n')
+
+# Replays calls saved by MediaWikiStandIn.save(), checking that each request
+# matches the one that was recorded.
+class RecordedMediaWiki:
+
+    def __init__(self, record_file):
+        with open(record_file, 'r') as f:
+            self.calls = [json.loads(line) for line in f if line.strip()]
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def edit_token(self):
+        return self.call({'action': 'query', 'meta': 'tokens', 'format': 'json'})['query']['tokens']['csrftoken']
+
+    def call(self, data):
+        with self.lock:
+            if self.position >= len(self.calls):
+                raise StandInError({'code': 'unrecorded', 'info': 'No recorded response left for %s.' % json.dumps(data, sort_keys=True)})
+            recorded_call = self.calls[self.position]
+            self.position += 1
+        if recorded_call['request'] != json.loads(json.dumps(data)):
+            raise StandInError({'code': 'unexpected-request', 'info': 'Expected %s, got %s.' % (json.dumps(recorded_call['request'], sort_keys=True), json.dumps(data, sort_keys=True))})
+        if 'error' in recorded_call['response']:
+            raise StandInError(recorded_call['response']['error'])
+        return recorded_call['response']
+
+class StandInError(Exception):
+
+    def __init__(self, error):
+        super().__init__("%s: %s" % (error.get('code'), error.get('info')))
+        self.code = error.get('code')
+        self.info = error.get('info')
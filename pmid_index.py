@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   pmid_index.py
+#
+
+from array import array
+from bisect import bisect_left
+
+import constants
+import json
+import os.path
+
+# Mappings with more PMIDs than this are indexed as a sorted array of
+# 32-bit integers on disk (4 bytes per PMID) rather than as a set of
+# strings in memory.
+sorted_index_threshold = 1000000
+
+# Indexes are loaded once per process and reused.
+loaded_indexes = {}
+
+# Answers "is this PMID already mapped to the Wikibase?" for single PMIDs
+# or whole batches.
+class PmidIndex:
+
+    def __init__(self, pmid_set=None, pmid_array=None):
+        self.pmid_set = pmid_set
+        self.pmid_array = pmid_array
+
+    def __len__(self):
+        if self.pmid_set is not None:
+            return len(self.pmid_set)
+        return len(self.pmid_array)
+
+    def __contains__(self, pmid):
+        if self.pmid_set is not None:
+            return str(pmid) in self.pmid_set
+        try:
+            pmid = int(pmid)
+        except (TypeError, ValueError):
+            return False
+        position = bisect_left(self.pmid_array, pmid)
+        return position < len(self.pmid_array) and self.pmid_array[position] == pmid
+
+    # Returns the PMIDs (in their original order) that are not in the index.
+    def filter_new(self, pmids):
+        if self.pmid_set is not None:
+            pmid_set = self.pmid_set
+            return [pmid for pmid in pmids if str(pmid) not in pmid_set]
+        return [pmid for pmid in pmids if pmid not in self]
+
+def load_pmid_index(mapping_file=constants.pmid_wikibase_mapping_file, reload=False):
+    if mapping_file in loaded_indexes and not reload:
+        return loaded_indexes[mapping_file]
+
+    index_file = mapping_file + '.idx'
+    if os.path.isfile(index_file) and (not os.path.isfile(mapping_file) or os.path.getmtime(index_file) >= os.path.getmtime(mapping_file)):
+        index = PmidIndex(pmid_array=read_sorted_index(index_file))
+    else:
+        pmid_mappings = {}
+        if os.path.isfile(mapping_file):
+            with open(mapping_file, 'r') as f:
+                pmid_mappings = json.load(f)
+
+        if len(pmid_mappings) > sorted_index_threshold:
+            pmid_array = array('I', sorted(int(pmid) for pmid in pmid_mappings if str(pmid).isdigit()))
+            del pmid_mappings
+            write_sorted_index(index_file, pmid_array)
+            index = PmidIndex(pmid_array=pmid_array)
+        else:
+            index = PmidIndex(pmid_set=set(pmid_mappings.keys()))
+
+    loaded_indexes[mapping_file] = index
+    return index
+
+def read_sorted_index(index_file):
+    pmid_array = array('I')
+    with open(index_file, 'rb') as f:
+        pmid_array.frombytes(f.read())
+    return pmid_array
+
+def write_sorted_index(index_file, pmid_array):
+    with open(index_file, 'wb') as f:
+        pmid_array.tofile(f)
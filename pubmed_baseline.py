@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   pubmed_baseline.py
+#
+
+from multiprocessing import Pool
+
+import glob
+import gzip
+import os.path
+import xml.etree.ElementTree as ET
+import zlib
+
+# Reads the annual PubMed baseline and daily update files
+# (https://ftp.ncbi.nlm.nih.gov/pubmed/baseline/, .../updatefiles/)
+# and picks out the articles matching a MeSH heading or keyword.
+
+def list_baseline_files(directory):
+    return sorted(glob.glob(os.path.join(directory, 'pubmed*.xml.gz')))
+
+# Matches the way pubmed_query builds its '"term"[MeSH]' and '"term"[OT]'
+# queries, except that MeSH headings are not exploded to narrower terms.
+def article_matches(article_elem, term, mesh=True):
+    term = term.strip().lower()
+    if mesh:
+        for descriptor in article_elem.iterfind('MedlineCitation/MeshHeadingList/MeshHeading/DescriptorName'):
+            if (descriptor.text or '').strip().lower() == term:
+                return True
+    else:
+        for keyword in article_elem.iterfind('MedlineCitation/KeywordList/Keyword'):
+            if (''.join(keyword.itertext())).strip().lower() == term:
+                return True
+    return False
+
+# Decompresses and parses one file incrementally, returning the file name,
+# its prolog, the raw XML of each matching PubmedArticle, the PMID of every
+# PubmedArticle in the file, matching or not, and the PMIDs the file deletes
+# (DeleteCitation, in update files). Runs in a worker process.
+def scan_baseline_file(args):
+    file_name, term, mesh = args
+    matches = {}
+    seen = []
+    deleted = []
+    prolog = b''
+    with gzip.open(file_name, 'rb') as f:
+        head = f.read(4096)
+        if b'<PubmedArticleSet' in head:
+            prolog = head[:head.find(b'<PubmedArticleSet')]
+
+    with gzip.open(file_name, 'rb') as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        root = None
+        for event, elem in context:
+            if root is None:
+                root = elem
+            if event == 'end' and elem.tag == 'PubmedArticle':
+                pmid = elem.findtext('MedlineCitation/PMID')
+                if pmid:
+                    seen.append(pmid)
+                    # A later version in the same file replaces an earlier one.
+                    matches.pop(pmid, None)
+                    if article_matches(elem, term, mesh=mesh):
+                        matches[pmid] = ET.tostring(elem)
+                root.clear()
+            elif event == 'end' and elem.tag == 'DeleteCitation':
+                deleted.extend(pmid_elem.text.strip() for pmid_elem in elem.iterfind('PMID') if pmid_elem.text)
+                root.clear()
+
+    return file_name, prolog, list(matches.items()), seen, deleted
+
+# Adds one file's matches to conn, a pubmed_cache database used as a spool,
+# replacing earlier versions of the same articles, then drops the articles
+# the file deletes and those whose version in this file no longer matches.
+# Files must be spooled in order, so the latest version of each article is
+# the one that decides whether it is kept.
+def spool_matches(conn, prolog, matches, seen, deleted, chunk_size=500):
+    if prolog.strip():
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('prolog', ?)", (prolog,))
+    conn.executemany(
+        "INSERT OR REPLACE INTO articles (pmid, date_revised, fetched_at, xml) VALUES (?, NULL, '', ?)",
+        [(pmid, zlib.compress(article_xml)) for pmid, article_xml in matches]
+    )
+    matched = set(pmid for pmid, article_xml in matches)
+    dropped = [pmid for pmid in seen if pmid not in matched] + deleted
+    for i in range(0, len(dropped), chunk_size):
+        chunk = dropped[i:i+chunk_size]
+        conn.execute("DELETE FROM articles WHERE pmid IN (%s)" % ",".join("?" * len(chunk)), chunk)
+    conn.commit()
+
+def spooled_pmids(conn):
+    return [pmid for (pmid,) in conn.execute("SELECT pmid FROM articles ORDER BY rowid")]
+
+# Yields (file name, prolog, matches, seen, deleted) for each file, in order,
+# scanning files in parallel across processes.
+def scan_baseline_directory(directory, term, mesh=True, processes=None):
+    file_names = list_baseline_files(directory)
+    print(f"Scanning {len(file_names)} baseline/update files in {directory}...")
+    with Pool(processes=processes) as pool:
+        for result in pool.imap(scan_baseline_file, [(file_name, term, mesh) for file_name in file_names]):
+            yield result
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   pubmed_cache.py
+#
+
+from datetime import datetime, timezone
+
+import constants
+import io
+import sqlite3
+import xml.etree.ElementTree as ET
+import zlib
+
+# Used when wrapping cached articles if no prolog has been recorded yet.
+default_prolog = b'<?xml version="1.0" ?>\n<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2024//EN" "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd">\n'
+
+# Local cache of raw efetch XML, one zlib-compressed PubmedArticle per PMID,
+# along with its DateRevised and the date it was fetched.
+def connect(cache_file=constants.pubmed_xml_cache_file):
+    conn = sqlite3.connect(cache_file)
+    conn.execute("""CREATE TABLE IF NOT EXISTS articles (
+        pmid TEXT PRIMARY KEY,
+        date_revised TEXT,
+        fetched_at TEXT NOT NULL,
+        xml BLOB NOT NULL
+    )""")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB)")
+    conn.commit()
+    return conn
+
+# Splits a raw efetch (or baseline) PubmedArticleSet into its prolog and
+# (PMID, DateRevised, article XML) tuples.
+def split_pubmed_xml(raw_xml):
+    prolog = raw_xml[:raw_xml.find(b'<PubmedArticleSet')] if b'<PubmedArticleSet' in raw_xml else b''
+    articles = []
+    for event, elem in ET.iterparse(io.BytesIO(raw_xml), events=('end',)):
+        if elem.tag == 'PubmedArticle':
+            pmid = elem.findtext('MedlineCitation/PMID')
+            articles.append((pmid, date_revised(elem), ET.tostring(elem)))
+            elem.clear()
+    return prolog, articles
+
+def date_revised(article_elem):
+    date_elem = article_elem.find('MedlineCitation/DateRevised')
+    if date_elem is None:
+        return None
+    return "%s-%s-%s" % (date_elem.findtext('Year'), date_elem.findtext('Month'), date_elem.findtext('Day'))
+
+def store_batch(conn, raw_xml):
+    prolog, articles = split_pubmed_xml(raw_xml)
+    fetched_at = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    if prolog.strip():
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('prolog', ?)", (prolog,))
+    conn.executemany(
+        "INSERT OR REPLACE INTO articles (pmid, date_revised, fetched_at, xml) VALUES (?, ?, ?, ?)",
+        [(pmid, revised, fetched_at, zlib.compress(article_xml)) for pmid, revised, article_xml in articles if pmid]
+    )
+    conn.commit()
+    return len(articles)
+
+# Returns {pmid: (date_revised, fetched_at)} for the PMIDs that are cached.
+def get_cached_pmids(conn, pmids, chunk_size=500):
+    cached = {}
+    pmids = [str(pmid) for pmid in pmids]
+    for i in range(0, len(pmids), chunk_size):
+        chunk = pmids[i:i+chunk_size]
+        rows = conn.execute(
+            "SELECT pmid, date_revised, fetched_at FROM articles WHERE pmid IN (%s)" % ",".join("?" * len(chunk)),
+            chunk
+        )
+        for pmid, revised, fetched_at in rows:
+            cached[pmid] = (revised, fetched_at)
+    return cached
+
+def get_prolog(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'prolog'").fetchone()
+    return row[0] if row else default_prolog
+
+# Yields cached articles re-wrapped as PubmedArticleSet documents of at most
+# batch_size articles, so they can be parsed exactly like an efetch response.
+def load_batches(conn, pmids, batch_size=500):
+    prolog = get_prolog(conn)
+    pmids = [str(pmid) for pmid in pmids]
+    for i in range(0, len(pmids), batch_size):
+        chunk = pmids[i:i+batch_size]
+        rows = conn.execute(
+            "SELECT xml FROM articles WHERE pmid IN (%s)" % ",".join("?" * len(chunk)),
+            chunk
+        )
+        parts = [prolog, b'<PubmedArticleSet>\n']
+        for (blob,) in rows:
+            parts.append(zlib.decompress(blob))
+            parts.append(b'\n')
+        parts.append(b'</PubmedArticleSet>\n')
+        yield b''.join(parts)
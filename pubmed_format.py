@@ -10,13 +10,63 @@ from pubmed_format_article import process_article
 from pubmed_format_grant import process_grant
 from pubmed_format_journal import process_journal
 
+import dead_letter
+import edit_keys
+import pubmed_format_affiliation
+import pubmed_format_author
+import pubmed_format_grant
+import pubmed_format_journal
+import pubmed_format_keywords
+import re
+import review_queue
+import run_journal
+import wikibase_plan
+import wikibase_session
+import wikidata_mapping
+
 # This file is intended to map the Entrez output format
 # (https://www.nlm.nih.gov/bsd/mms/medlineelements.html)
 # to a Wikibase instance.
 
-def process_object(entrez_obj):
-    journal_id = process_journal(entrez_obj)
-    article_id = process_article(entrez_obj, journal_id)
+# prepared holds values computed ahead of time by
+# pubmed_format_pipeline.prepare_object, if any.
+#
+# Each stage is recorded in the run journal, so re-running an interrupted
+# ingest skips the stages that already finished for this PMID. Records the
+# formatters cannot handle are quarantined (see dead_letter.py), and in a
+# headless run articles waiting on a match decision are deferred (see
+# review_queue.py); either way None is returned and the batch carries on.
+#
+# In a dry run (see wikibase_plan.py) nothing is written or quarantined;
+# the edits the article would make are added to the plan instead.
+def process_object(entrez_obj, prepared=None):
+    pmid = str(entrez_obj['PMID'])
+    article_id = None
+    plan_status = 'complete'
+    run_journal.begin_article(pmid)
+    edit_keys.reset_article(pmid)
+    if wikibase_plan.planning:
+        wikibase_plan.begin_article(pmid)
+    try:
+        journal_id = run_journal.run_stage(pmid, 'journal', process_journal, entrez_obj)
+        article_id = run_journal.run_stage(pmid, 'article', process_article, entrez_obj, journal_id, prepared=prepared)
+    except dead_letter.UnprocessableRecord as exception:
+        plan_status = 'quarantined'
+        if wikibase_plan.planning:
+            print(f"PMID {pmid} would be quarantined ({exception}).")
+        else:
+            dead_letter.quarantine(pmid, exception, entrez_obj)
+    except review_queue.DeferredDecision as exception:
+        plan_status = 'deferred'
+        print(f"Deferring PMID {pmid} until the {exception.kind} match is reviewed.")
+    else:
+        if not wikibase_plan.planning:
+            dead_letter.resolve(pmid)
+    finally:
+        run_journal.end_article()
+        if wikibase_plan.planning:
+            wikibase_plan.end_article(status=plan_status)
+    return article_id
 
 
     
@@ -24,3 +74,99 @@ def process_object(entrez_obj):
 
     
 
+
+# Fetches, in bulk, the existing items a group of articles may update or
+# refer to (journals, authors, affiliations, grants and keywords, as far as
+# the mapping files already know them). The add_to_existing_* functions then
+# read them from wikibase_session's cache instead of one request at a time.
+# The Wikidata IDs the formatters look up (journal NLM IDs and author ORCID
+# iDs) are resolved at the same time, both types together, so their
+# get_wikidata_id calls are answered from the lookup cache.
+#
+# Prefetching only saves requests, so if it fails the error is printed and
+# the articles are processed without it.
+def prefetch_existing(entrez_objs):
+    qids = []
+    identifiers = []
+    for entrez_obj in entrez_objs:
+        qids.extend(existing_qids(entrez_obj))
+        identifiers.extend(wikidata_identifiers(entrez_obj))
+    if qids:
+        print(f"Prefetching up to {len(set(qids))} existing items...")
+        try:
+            wikibase_session.prefetch_items(qids)
+        except Exception as exception:
+            print(f"Could not prefetch existing items ({type(exception).__name__}: {exception}); fetching them one at a time instead.")
+    if identifiers:
+        try:
+            wikidata_mapping.get_wikidata_ids(identifiers)
+        except Exception as exception:
+            print(f"Could not prefetch Wikidata IDs ({type(exception).__name__}: {exception}); looking them up one at a time instead.")
+
+# (id_type, identifier) pairs for the identifiers of an article that the
+# formatters resolve to Wikidata IDs: its journal's NLM Unique ID (see
+# pubmed_format_journal) and its authors' ORCID iDs (see
+# pubmed_format_author).
+def wikidata_identifiers(entrez_obj):
+    identifiers = []
+
+    nlm_unique_id = entrez_obj.get('MedlineJournalInfo', {}).get('NlmUniqueID')
+    if nlm_unique_id:
+        identifiers.append(('NLM', str(nlm_unique_id)))
+
+    for author in entrez_obj.get('Article', {}).get('AuthorList', []):
+        for identifier in author.get('Identifier', []):
+            if getattr(identifier, 'attributes', {}).get('Source') == 'ORCID':
+                identifiers.append(('ORCID', str(identifier)))
+
+    return identifiers
+
+def existing_qids(entrez_obj):
+    qids = []
+
+    nlm_unique_id = entrez_obj.get('MedlineJournalInfo', {}).get('NlmUniqueID')
+    if nlm_unique_id in pubmed_format_journal.wikibase_mappings_json:
+        qids.extend(mapped_qids(pubmed_format_journal.wikibase_mappings_json[nlm_unique_id]))
+
+    author_index = author_name_index()
+    for author in entrez_obj.get('Article', {}).get('AuthorList', []):
+        if 'ForeName' in author and 'LastName' in author:
+            qids.extend(author_index.get(str(author['ForeName']) + " " + str(author['LastName']), []))
+        for affiliation in author.get('AffiliationInfo', []):
+            if str(affiliation.get('Affiliation')) in pubmed_format_affiliation.affiliations_json:
+                qids.extend(mapped_qids(pubmed_format_affiliation.affiliations_json[str(affiliation['Affiliation'])]))
+
+    for grant in entrez_obj.get('Article', {}).get('GrantList', []):
+        if str(grant.get('GrantID')) in pubmed_format_grant.grants_json:
+            qids.extend(mapped_qids(pubmed_format_grant.grants_json[str(grant['GrantID'])]))
+
+    for keyword_list in entrez_obj.get('KeywordList', []):
+        for keyword in keyword_list:
+            if str(keyword) in pubmed_format_keywords.keywords_json:
+                qids.extend(mapped_qids(pubmed_format_keywords.keywords_json[str(keyword)]))
+
+    return qids
+
+# The QID(s) recorded in a mapping-file entry, which may be a QID, a list of
+# QIDs or a dictionary keyed by Wikibase name.
+def mapped_qids(mapping_value):
+    if isinstance(mapping_value, dict):
+        mapping_value = mapping_value.get(pubmed_format_journal.wikibase_name)
+    if isinstance(mapping_value, list):
+        return [str(value) for value in mapping_value if re.fullmatch(r'Q[0-9]+', str(value))]
+    if mapping_value is not None and re.fullmatch(r'Q[0-9]+', str(mapping_value)):
+        return [str(mapping_value)]
+    return []
+
+# Author mapping keys are "ForeName LastName, n"; maps each name to the QIDs
+# recorded under it. Rebuilt whenever the mapping has grown.
+author_index_cache = {'size': None, 'index': {}}
+
+def author_name_index():
+    if author_index_cache['size'] != len(pubmed_format_author.authors_json):
+        index = {}
+        for key, value in list(pubmed_format_author.authors_json.items()):
+            index.setdefault(key.rsplit(', ', 1)[0], []).extend(mapped_qids(value))
+        author_index_cache['size'] = len(pubmed_format_author.authors_json)
+        author_index_cache['index'] = index
+    return author_index_cache['index']
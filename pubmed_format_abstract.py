@@ -11,9 +11,11 @@ from pathlib import Path
 from pubmed_format_copyright_information import process_copyright_information
 
 import constants
+import dead_letter
 import json
 import nltk.data
 import re
+import review_queue
 import textwrap
 import yaml
 
@@ -59,10 +61,7 @@ def process_abstract(entrez_obj, abstract_obj):
         processed_abstract = process_str_abstract(abstract_obj)
 
     else:
-        print("HERE")
-        print(type(abstract_obj))
-        print(abstract_obj)
-        exit()
+        raise dead_letter.UnprocessableRecord("Abstract of type %s not recognized." % str(type(abstract_obj)), stage='Abstract')
 
     if copyright_information:
         for counter, abstract_part in enumerate(processed_abstract):
@@ -439,13 +438,12 @@ def determine_tokenizer(abstract_obj):
             punkt = LA_dict["punkt"]
             break
     if punkt is None:
-        print("No value found. Exiting...")
-        exit()
+        raise dead_letter.UnprocessableRecord("No sentence tokenizer found for language %s." % str(wikibase_lang), stage='Abstract')
 
     return nltk.data.load('tokenizers/punkt/%s.pickle' % punkt)
 
 def add_to_mapping_file(abstract_type):
-    new_match = input('What is the QID that matches the abstract type "%s"?\n' % (str(abstract_type)))
+    new_match = review_queue.ask('abstract', 'What is the QID that matches the abstract type "%s"?\n' % (str(abstract_type)))
     abstracttype_json[str(abstract_type)][wikibase_name] = new_match.strip()
 
     with open(constants.AbstractType_mapping_file, 'w') as f:
@@ -7,12 +7,15 @@
 #
 
 from pathlib import Path
-from wikibaseintegrator import wbi_login, WikibaseIntegrator
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_enums import ActionIfExists
 
 import constants
+import dead_letter
 import json
+import review_queue
+import wikibase_plan
+import wikibase_session
 import wikibaseintegrator.datatypes as datatypes
 import wikibaseintegrator.wbi_helpers as wbi_helpers
 import wikibaseintegrator.models as models
@@ -61,8 +64,7 @@ def process_affiliation(affiliation_obj):
 
     if 'Identifier' in affiliation_obj:
         if len(affiliation_obj['Identifier']) > 0:
-            print(affiliation_obj['Identifier'])
-            exit()
+            raise dead_letter.UnprocessableRecord("Affiliation identifiers (%s) not recognized." % str(affiliation_obj['Identifier']), stage='AffiliationInfo')
     processed_affiliation['value'] = affiliation_obj['Affiliation']
 
     if affiliation_obj['Affiliation'] in affiliations_json:
@@ -86,10 +88,11 @@ def process_affiliation(affiliation_obj):
             else:
                 item = add_new_affiliation(processed_affiliation)
                 match_id = item.id
-                affiliations_json[affiliation_obj['Affiliation']][wikibase_name] = match_id
-                with open(constants.AD_mapping_file, 'w') as f:
-                    json.dump(affiliations_json, f, indent=4, sort_keys=True)
-                affiliation_id = affiliations_json[affiliation_obj['Affiliation']][wikibase_name]
+                if not wikibase_plan.planning:
+                    affiliations_json[affiliation_obj['Affiliation']][wikibase_name] = match_id
+                    with open(constants.AD_mapping_file, 'w') as f:
+                        json.dump(affiliations_json, f, indent=4, sort_keys=True)
+                affiliation_id = match_id
     else:
         affiliations_json[affiliation_obj['Affiliation']] = {}
         match_id = check_if_affiliation_exists(processed_affiliation['value'])
@@ -109,25 +112,24 @@ def process_affiliation(affiliation_obj):
         else:
             item = add_new_affiliation(processed_affiliation)
             match_id = item.id
-            affiliations_json[affiliation_obj['Affiliation']][wikibase_name] = match_id
-            with open(constants.AD_mapping_file, 'w') as f:
-                json.dump(affiliations_json, f, indent=4, sort_keys=True)
-            affiliation_id = affiliations_json[affiliation_obj['Affiliation']][wikibase_name]
+            if not wikibase_plan.planning:
+                affiliations_json[affiliation_obj['Affiliation']][wikibase_name] = match_id
+                with open(constants.AD_mapping_file, 'w') as f:
+                    json.dump(affiliations_json, f, indent=4, sort_keys=True)
+            affiliation_id = match_id
 
         with open(constants.AD_mapping_file, 'w') as f:
             json.dump(affiliations_json, f, indent=4, sort_keys=True)
 
     if affiliation_id is None:
-        print(affiliation_obj)
-        exit()
+        raise dead_letter.UnprocessableRecord("No match found for affiliation (%s)." % str(affiliation_obj), stage='AffiliationInfo')
     processed_affiliation[wikibase_name] = affiliation_id
     return processed_affiliation
 
 # Add if exists.
 def add_to_existing_affiliation(processed_affiliation_object, match_id):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
-    item = wbi.item.get(match_id)
+    item = wikibase_session.get_item(match_id)
+    original = item.get_json()
 
     referencesA = models.references.References()
     referenceA = models.references.Reference()
@@ -135,14 +137,13 @@ def add_to_existing_affiliation(processed_affiliation_object, match_id):
     referencesA.add(referenceA)
 
     item.aliases.set('en', processed_affiliation_object['value'])
-    item.write()
+    wikibase_session.write_item(item, original=original)
 
     return item
 
 # Add new.
 def add_new_affiliation(processed_affiliation_object):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
+    wbi = wikibase_session.get_wbi()
     item = wbi.item.new()
 
     referencesA = models.references.References()
@@ -151,7 +152,7 @@ def add_new_affiliation(processed_affiliation_object):
     referencesA.add(referenceA)
 
     item.aliases.set('en', processed_affiliation_object['value'])
-    item.write()
+    wikibase_session.create_item(item)
 
     return item
 
@@ -160,19 +161,19 @@ def check_if_affiliation_exists(query_str):
     match_id = None
     if str(query_str) in affiliations_json:
         if 'wikibase_name' in affiliations_json[str(query_str)]:
-            accept_match = input("Is this entity (%s) a match for the affiliation name (%s)? [Y/n]\n" % (str(affiliations_json[str(query_str)][wikibase_name]), str(query_str)))
+            accept_match = review_queue.ask('affiliation', "Is this entity (%s) a match for the affiliation name (%s)? [Y/n]\n" % (str(affiliations_json[str(query_str)][wikibase_name]), str(query_str)))
             if accept_match in ['Y', 'y', 'yes', 'true']:
                 match_id = str(affiliations_json[str(query_str)][wikibase_name])
                 return match_id
         search_list = wbi_helpers.search_entities(query_str)
         if len(search_list) > 0:
             for search_result in search_list:
-                accept_match = input("Is this entity (%s) a match for the affiliation name (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
+                accept_match = review_queue.ask('affiliation', "Is this entity (%s) a match for the affiliation name (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
                 if accept_match in ['Y', 'y', 'yes', 'true']:
                     match_id = search_result
                     add_to_mapping_file(query_str, match_id)
     if match_id is None:
-        accept_match = input("Is there another match you would like to indicate for this affiliation name (%s)? If so, provide it here:\n" % (str(query_str)))
+        accept_match = review_queue.ask('affiliation', "Is there another match you would like to indicate for this affiliation name (%s)? If so, provide it here:\n" % (str(query_str)))
         if accept_match:
             if ';' in accept_match:
                 match_id = []
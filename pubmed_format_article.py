@@ -20,16 +20,16 @@ from pubmed_format_language import process_languages, return_wikibase_mapping
 from pubmed_format_mesh_headings import process_mesh_headings_list
 from pubmed_format_identifier import process_pmid, process_elocation_ids
 from pubmed_format_publication_type import process_publication_type_list
-from wikibaseintegrator import wbi_login, WikibaseIntegrator
 from wikibaseintegrator.wbi_config import config as wbi_config
-from wikibaseintegrator.wbi_enums import ActionIfExists, WikibaseDatePrecision, WikibaseSnakType
 from wikidata_mapping import get_wikidata_id
 
+import claim_builder
 import constants
+import dead_letter
 import json
-import wikibaseintegrator.datatypes as datatypes
+import review_queue
+import wikibase_session
 import wikibaseintegrator.wbi_helpers as wbi_helpers
-import wikibaseintegrator.models as models
 import yaml
 
 # Read in YAML file.
@@ -53,13 +53,17 @@ with open(constants.PubModel_mapping_file, 'r') as f:
 with open(constants.pmid_wikibase_mapping_file, 'r') as f:
     wikibase_mappings_json = json.load(f)
 
-def process_article(entrez_obj, journal_id):
+def process_article(entrez_obj, journal_id, prepared=None):
+
+    # Values already computed by pubmed_format_pipeline.prepare_object.
+    if prepared is None:
+        prepared = {}
 
     aliases = {}
 
     # LA: Language
     print("Processing language entities...")
-    languages = process_languages(entrez_obj['Article']['Language'])
+    languages = prepared['languages'] if 'languages' in prepared else process_languages(entrez_obj['Article']['Language'])
     if len(languages) > 1:
         wikibase_language = []
         for language in languages:
@@ -68,7 +72,7 @@ def process_article(entrez_obj, journal_id):
         wikibase_language = return_wikibase_mapping(languages[0])
 
     print("Processing PubMed identifier...")
-    pmid = process_pmid(entrez_obj['PMID'])
+    pmid = prepared['pmid'] if 'pmid' in prepared else process_pmid(entrez_obj['PMID'])
 
     # TI: Title
     print("Processing article title...")
@@ -79,7 +83,7 @@ def process_article(entrez_obj, journal_id):
         }
     }
     if len(languages) > 1:
-        detected_lang = detect_language(str(entrez_obj['Article']['ArticleTitle']))
+        detected_lang = prepared['title_language'] if 'title_language' in prepared else detect_language(str(entrez_obj['Article']['ArticleTitle']))
         article_title['language'] = detected_lang
         if detected_lang in aliases:
             aliases[detected_lang].append(str(entrez_obj['Article']['ArticleTitle']))
@@ -98,7 +102,7 @@ def process_article(entrez_obj, journal_id):
     else:
         match_qid = check_if_article_exists(article_title['value'])
         if match_qid:
-            continue_to_add = input("Has this item (%s) already been updated? [Y/n]\n" % (str(match_qid)))
+            continue_to_add = review_queue.ask('article', "Has this item (%s) already been updated? [Y/n]\n" % (str(match_qid)), per_article=True)
             if continue_to_add in ['Y', 'y']:
                 wikibase_mappings_json[pmid['value']] = match_qid
                 with open(constants.pmid_wikibase_mapping_file, 'w') as f:
@@ -109,35 +113,27 @@ def process_article(entrez_obj, journal_id):
     print("Processing general notes...")
     if 'GeneralNote' in entrez_obj:
         if len(entrez_obj['GeneralNote']) > 0:
-            print("GeneralNote")
-            print(entrez_obj['GeneralNote'])
-            exit()
+            raise dead_letter.UnprocessableRecord("GeneralNote is not yet supported: %s" % str(entrez_obj['GeneralNote']), stage='GeneralNote')
     # IRAD: Investigator Affiliation; IR: Investigator Name; FIR: Full Investigator Name
     print("Processing investigators...")
     if 'InvestigatorList' in entrez_obj:
         if len(entrez_obj['InvestigatorList']) > 0:
-            print("InvestigatorList")
-            print(entrez_obj['InvestigatorList'])
-            exit()
+            raise dead_letter.UnprocessableRecord("InvestigatorList is not yet supported: %s" % str(entrez_obj['InvestigatorList']), stage='InvestigatorList')
     # OID: Other ID
     print("Processing other identifiers...")
     if 'OtherID' in entrez_obj:
         if len(entrez_obj['OtherID']) > 0:
-            print("OtherID")
-            print(entrez_obj['OtherID'])
-            exit()
+            raise dead_letter.UnprocessableRecord("OtherID is not yet supported: %s" % str(entrez_obj['OtherID']), stage='OtherID')
     # SFM: Space Flight Mission
     print("Processing space flight missions...")
     if 'SpaceFlightMission' in entrez_obj:
         if len(entrez_obj['SpaceFlightMission']) > 0:
-            print("SpaceFlightMission")
-            print(entrez_obj['SpaceFlightMission'])
-            exit()
+            raise dead_letter.UnprocessableRecord("SpaceFlightMission is not yet supported: %s" % str(entrez_obj['SpaceFlightMission']), stage='SpaceFlightMission')
 
     print("Processing date last revised...")
     in_database_article = {
         'value': 'Q19463', # PubMed
-        'P794': process_date(entrez_obj['DateRevised']), # Date last revised (adding as 'date revised' in case there are many revision dates)
+        'P794': prepared['date_revised'] if 'date_revised' in prepared else process_date(entrez_obj['DateRevised']), # Date last revised (adding as 'date revised' in case there are many revision dates)
         
     }
     print("Processing indexing method...")
@@ -147,22 +143,19 @@ def process_article(entrez_obj, journal_id):
     elif indexing_method == "Curated":
         in_database_article['P834'] = 'Q27775'
     else:
-        print(indexing_method)
-        exit()
+        raise dead_letter.UnprocessableRecord("IndexingMethod (%s) not recognized." % indexing_method, stage='IndexingMethod')
     print("Processing status...")
     in_database_status = str(entrez_obj.attributes['Status'])
     if in_database_status == "MEDLINE":
         in_database_article['P835'] = 'Q27187'
     else:
-        print(in_database_status)
-        exit()
+        raise dead_letter.UnprocessableRecord("Status (%s) not recognized." % in_database_status, stage='Status')
     print("Processing owner...")
     in_database_owner = str(entrez_obj.attributes['Owner'])
     if in_database_owner == "NLM":
         in_database_article['P492'] = 'Q27188'
     else:
-        print(in_database_owner)
-        exit()
+        raise dead_letter.UnprocessableRecord("Owner (%s) not recognized." % in_database_owner, stage='Owner')
 
     print("Processing journal-related entities...")
     if 'Journal' in entrez_obj['Article']:
@@ -183,10 +176,11 @@ def process_article(entrez_obj, journal_id):
     # DCOM: Date Completed
     # If OLDMEDLINE (OM), DCOM is approximate date record entered PubMed:
     print("Processing date completed...")
+    date_completed = prepared['date_completed'] if 'date_completed' in prepared else process_date(entrez_obj['DateCompleted'])
     if 'OM' in entrez_obj['CitationSubset']:
-        in_database_article['P437'] = process_date(entrez_obj['DateCompleted']) # (Approximate) date record available in PubMed
+        in_database_article['P437'] = date_completed # (Approximate) date record available in PubMed
     else:
-        in_database_article['P793'] = process_date(entrez_obj['DateCompleted']) # Date data processing ended
+        in_database_article['P793'] = date_completed # Date data processing ended
 
     # VI: Volume
     print("Processing volume...")
@@ -405,484 +399,35 @@ def process_article(entrez_obj, journal_id):
     
 # Add if exists.
 def add_to_existing_article(processed_article_object, match_id):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
-    item = wbi.item.get(match_id)
+    item = wikibase_session.get_item(match_id)
+    original = item.get_json()
 
     for alias_lang, alias_list in processed_article_object['aliases'].items():
         for alias in alias_list:
             item.aliases.set(alias_lang, alias)
 
-    for claim_id, claim_dict in processed_article_object['claims'].items():
-        already_appended = False
-
-        referencesA = models.references.References()
-        referenceA1 = models.references.Reference()
-        referenceA1.add(datatypes.Item(prop_nr='P21', value='Q19463'))
-        referencesA.add(referenceA1)
-
-        if claim_id in ["P1", "P68", "P72", "P136", "P206", "P307", "P568", "P791", "P799", "P828", "P840", "P846"]: # Item
-            if isinstance(claim_dict, str):
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict, references=referencesA)
-            elif isinstance(claim_dict, list):
-                if isinstance(claim_dict[0], str):
-                    for sub_claim in claim_dict:
-                        claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim, references=referencesA)
-                        item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                        already_appended = True
-                elif isinstance(claim_dict[0], dict):
-                    for sub_claim_dict in claim_dict:
-                        qualifiers = models.Qualifiers()
-                        for qual_claim_id, qual_claim_val in sub_claim_dict.items():
-                            if qual_claim_id in ["P816", "P825", "P492"]: # Item
-                                qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif qual_claim_id in ["P842"]: # String
-                                qualifiers.add(datatypes.String(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif qual_claim_id in ["P843", "P844", "P845"]: # ExternalID
-                                qualifiers.add(datatypes.ExternalID(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif isinstance(qual_claim_val, dict) and claim_id == 'P206':
-                                for qual_sub_claim_id, qual_sub_claim_val in qual_claim_val.items():
-                                    if qual_sub_claim_id in ["P205", "P829"]: # Item
-                                        qualifiers.add(datatypes.Item(prop_nr=qual_sub_claim_id, value=qual_sub_claim_val))
-                            elif isinstance(qual_claim_val, str) and claim_id == 'P72':
-                                if qual_claim_id in ["P812"]: # Item
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif isinstance(qual_claim_val, dict) and claim_id == 'P72':
-                                if qual_claim_id in ["P797", "P839"]: # Monolingual Text
-                                    qualifiers.add(datatypes.MonolingualText(prop_nr=qual_claim_id, text=qual_claim_val['value'], language=qual_claim_val['language']))
-                                elif qual_claim_id in ["P798"]: # String
-                                    qualifiers.add(datatypes.String(prop_nr=qual_claim_id, value=qual_claim_val['value']))
-                            elif isinstance(qual_claim_val, int) and claim_id == 'P72':
-                                if qual_claim_id in ["P33"]: # Quantity
-                                    qualifiers.add(datatypes.Quantity(prop_nr=qual_claim_id, amount=qual_claim_val))
-                            elif isinstance(qual_claim_val, list) and claim_id == 'P72':
-                                if qual_claim_id in ["P838"]: # Item
-                                    for affiliation in qual_claim_val:
-                                        qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=affiliation[wikibase_name]))
-                        print(qualifiers)
-                        if 'value' in sub_claim_dict:
-                            claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim_dict['value'], qualifiers=qualifiers, references=referencesA)
-                        elif wikibase_name in sub_claim_dict:
-                            claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim_dict[wikibase_name], qualifiers=qualifiers, references=referencesA)
-                        elif 'P846' in sub_claim_dict:
-                            claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim_dict['P846'], qualifiers=qualifiers, references=referencesA)
-                        item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                        already_appended = True
-            elif isinstance(claim_dict, dict):
-                qualifiers = models.Qualifiers()
-                for qual_claim_id, qual_claim_val in claim_dict.items():
-                    if qual_claim_id in ["P793", "P794"]: # Time
-                        qualifiers.add(datatypes.Time(prop_nr=qual_claim_id, time='+'+str(qual_claim_val)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY))
-                    elif qual_claim_id in ["P492", "P834", "P835", "P837"]: # Item
-                        qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict['value'], qualifiers=qualifiers, references=referencesA)
-            else:
-                print(claim_id)
-                print(claim_dict)
-                exit()
-
-        elif claim_id in ["P67", "P434", "P830", "P833", "P841"]: # Monolingual Text
-            if isinstance(claim_dict, list):
-                if isinstance(claim_dict[0], dict):
-                    for sub_claim_dict in claim_dict:
-                        qualifiers = models.Qualifiers()
-                        for qual_claim_id, qual_claim_val in sub_claim_dict.items():
-                            if qual_claim_id in ["P33"]: # Quantity
-                                qualifiers.add(datatypes.Quantity(prop_nr=qual_claim_id, amount=qual_claim_val))
-                            elif qual_claim_id in ["P87", "P816", "P826", "P832"]: # Item
-                                if qual_claim_val is None:
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, snaktype=WikibaseSnakType.NO_VALUE))
-                                else:
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif qual_claim_id in ["P827", "P831"]: # MonolingualText
-                                qualifiers.add(datatypes.MonolingualText(prop_nr=qual_claim_id, text=qual_claim_val['value'], language=qual_claim_val['language']))
-                            elif qual_claim_id in ["P59"]: # Time
-                                qualifiers.add(datatypes.Time(prop_nr=qual_claim_id, time='+'+str(qual_claim_val)+'-00-00'+'T00:00:00'+'Z', precision=WikibaseDatePrecision.YEAR))
-                            elif qual_claim_id in ["P450"]: # Item
-                                for sub_item in qual_claim_val:
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=sub_item))
-                        claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=sub_claim_dict['value'], language=sub_claim_dict['language'], qualifiers=qualifiers, references=referencesA)
-                        item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                        already_appended = True
-                elif isinstance(claim_dict[0], list):
-                    print(claim_id)
-                    if isinstance(claim_dict[0][0], dict):
-                        for sub_claim_dict in claim_dict:
-                            for infra_claim_dict in sub_claim_dict:
-                                qualifiers = models.Qualifiers()
-                                for qual_claim_id, qual_claim_val in infra_claim_dict.items():
-                                    if qual_claim_id in ["P33"]: # Quantity
-                                        qualifiers.add(datatypes.Quantity(prop_nr=qual_claim_id, amount=qual_claim_val))
-                                    elif qual_claim_id in ["P87", "P816", "P826", "P832"]:
-                                        if qual_claim_val is None:
-                                            qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, snaktype=WikibaseSnakType.NO_VALUE))
-                                        else:
-                                            qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                                    elif qual_claim_id in ["P827"]:
-                                        qualifiers.add(datatypes.MonolingualText(prop_nr=qual_claim_id, text=qual_claim_val['value'], language=qual_claim_val['language']))
-                                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=infra_claim_dict['value'], language=infra_claim_dict['language'], qualifiers=qualifiers, references=referencesA)
-                                item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                                already_appended = True
-                    else:
-                        print(claim_id)
-                        print(claim_dict)
-                        exit()
-                else:
-                    print(claim_id)
-                    print(claim_dict)
-                    exit()
-            elif isinstance(claim_dict, dict):
-                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'], references=referencesA)
-            else:
-                print(claim_id)
-                print(claim_dict)
-                exit()
-
-        elif claim_id in ["P3", "P95", "P199"]: # External Identifier
-            if claim_id == "P3":
-                referencesB = models.references.References()
-                referenceB1 = models.references.Reference()
-                for ref_id, ref_val in claim_dict['reference'].items():
-                    if ref_id in ['P21', 'P278', 'P279']:
-                        referenceB1.add(datatypes.Item(prop_nr=ref_id, value=ref_val))
-                    elif ref_id in ['P561', 'P562']:
-                        referenceB1.add(datatypes.String(prop_nr=ref_id, value=ref_val))
-                referencesB.add(referenceB1)
-                claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesB)
-            else:
-                if isinstance(claim_dict, str):
-                    claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesA)
-                elif isinstance(claim_dict, list):
-                    print(claim_id)
-                    print(claim_dict)
-                    exit()
-                elif isinstance(claim_dict, dict):
-                    qualifiers = models.Qualifiers()
-                    for qual_claim_id, qual_claim_val in claim_dict.items():
-                        if qual_claim_id in ["P792"]: # String
-                            qualifiers.add(datatypes.String(prop_nr=qual_claim_id, value=qual_claim_val))
-                        elif qual_claim_id in ["P795"]: # Item
-                            qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                    claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict['value'], qualifiers=qualifiers, references=referencesA)
-                else:
-                    print(claim_id)
-                    print(claim_dict)
-                    exit()
-
-        elif claim_id in ["P57", "P76", "P77", "P510", "P511", "P808"]: # String
-            if isinstance(claim_dict, str):
-                claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict, references=referencesA)
-            elif isinstance(claim_dict, list):
-                print(claim_id)
-                print(claim_dict)
-                exit()
-            elif isinstance(claim_dict, dict):
-                claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-
-        elif claim_id in ["P58", "P469", "P836"]: # Time
-            if isinstance(claim_dict, str):
-                if claim_dict == "UNKNOWN":
-                    claim_obj = datatypes.Time(prop_nr=claim_id, snaktype=WikibaseSnakType.UNKNOWN_VALUE, references=referencesA)
-                else:
-                    if "-00-00" in str(claim_dict):
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.YEAR, references=referencesA)
-                    elif "-00" in str(claim_dict):
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.MONTH, references=referencesA)
-                    else:
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, references=referencesA)
-            elif isinstance(claim_dict, list):
-                for sub_claim in claim_dict:
-                    
-                    if isinstance(sub_claim, dict):
-                        qualifiers = models.Qualifiers()
-                        for qual_claim_id, qual_claim_val in sub_claim.items():
-                            if qual_claim_id in ["P828"]: # Item
-                                qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(sub_claim['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, qualifiers=qualifiers, references=referencesA)
-                    elif isinstance(sub_claim, str):
-                        if sub_claim == "UNKNOWN":
-                            claim_obj = datatypes.Time(prop_nr=claim_id, snaktype=WikibaseSnakType.UNKNOWN_VALUE, references=referencesA)
-                        else:
-                            claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(sub_claim['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, references=referencesA)
-                    item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                    already_appended = True
-            elif isinstance(claim_dict, dict):
-                qualifiers = models.Qualifiers()
-                for qual_claim_id, qual_claim_val in claim_dict.items():
-                    if qual_claim_id in ["P828"]: # Item
-                        qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                    elif qual_claim_id in ["P847", "P848"]:
-                        qualifiers.add(datatypes.Time(prop_nr=qual_claim_id, time='+'+str(qual_claim_val)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY))
-                if 'precision' in claim_dict:
-                    if claim_dict['precision'] == "YEAR":
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.YEAR, qualifiers=qualifiers, references=referencesA)
-                    elif claim_dict['precision'] == "MONTH":
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.MONTH, qualifiers=qualifiers, references=referencesA)
-                    else:
-                        print("Precision value not recognized. Exiting...")
-                        exit()
-                else:
-                    claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, qualifiers=qualifiers, references=referencesA)
-        else:
-            print(claim_id)
-            print(claim_dict)
-            print('here2')
-            exit()
-
-        if not already_appended:
-            item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
+    claim_builder.add_claims(item, processed_article_object['claims'], references=claim_builder.pubmed_references())
 
     #print(item)
-    item.write()
+    wikibase_session.write_item(item, original=original)
 
-    exit()
+    raise dead_letter.UnprocessableRecord("Updated article %s, but adding the rest of the article is not implemented yet." % str(match_id), stage='article')
     
 # Add new.
 def add_new_article(processed_article_object):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
+    wbi = wikibase_session.get_wbi()
     item = wbi.item.new()
 
     for alias_lang, alias_list in processed_article_object['aliases'].items():
         for alias in alias_list:
             item.aliases.set(alias_lang, alias)
 
-    for claim_id, claim_dict in processed_article_object['claims'].items():
-        already_appended = False
-
-        referencesA = models.references.References()
-        referenceA1 = models.references.Reference()
-        referenceA1.add(datatypes.Item(prop_nr='P21', value='Q19463'))
-        referencesA.add(referenceA1)
-
-        if claim_id in ["P1", "P68", "P72", "P136", "P206", "P307", "P568", "P791", "P799", "P828", "P840", "P846"]: # Item
-            if isinstance(claim_dict, str):
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict, references=referencesA)
-            elif isinstance(claim_dict, list):
-                if isinstance(claim_dict[0], str):
-                    for sub_claim in claim_dict:
-                        claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim, references=referencesA)
-                        item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                        already_appended = True
-                elif isinstance(claim_dict[0], dict):
-                    for sub_claim_dict in claim_dict:
-                        qualifiers = models.Qualifiers()
-                        for qual_claim_id, qual_claim_val in sub_claim_dict.items():
-                            if qual_claim_id in ["P816", "P825", "P492"]: # Item
-                                qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif qual_claim_id in ["P842"]: # String
-                                qualifiers.add(datatypes.String(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif qual_claim_id in ["P843", "P844", "P845"]: # ExternalID
-                                qualifiers.add(datatypes.ExternalID(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif isinstance(qual_claim_val, dict) and claim_id == 'P206':
-                                for qual_sub_claim_id, qual_sub_claim_val in qual_claim_val.items():
-                                    if qual_sub_claim_id in ["P205", "P829"]: # Item
-                                        qualifiers.add(datatypes.Item(prop_nr=qual_sub_claim_id, value=qual_sub_claim_val))
-                            elif isinstance(qual_claim_val, str) and claim_id in ['P72', 'P840']:
-                                if qual_claim_id in ["P812"]: # Item
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif isinstance(qual_claim_val, dict) and claim_id == 'P72':
-                                if qual_claim_id in ["P797", "P839"]: # Monolingual Text
-                                    qualifiers.add(datatypes.MonolingualText(prop_nr=qual_claim_id, text=qual_claim_val['value'], language=qual_claim_val['language']))
-                                elif qual_claim_id in ["P798"]: # String
-                                    qualifiers.add(datatypes.String(prop_nr=qual_claim_id, value=qual_claim_val['value']))
-                            elif isinstance(qual_claim_val, int) and claim_id == 'P72':
-                                if qual_claim_id in ["P33"]: # Quantity
-                                    qualifiers.add(datatypes.Quantity(prop_nr=qual_claim_id, amount=qual_claim_val))
-                            elif isinstance(qual_claim_val, list) and claim_id == 'P72':
-                                if qual_claim_id in ["P838"]: # Item
-                                    for affiliation in qual_claim_val:
-                                        qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=affiliation[wikibase_name]))
-                        print(qualifiers)
-                        if 'value' in sub_claim_dict:
-                            claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim_dict['value'], qualifiers=qualifiers, references=referencesA)
-                        elif wikibase_name in sub_claim_dict:
-                            claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim_dict[wikibase_name], qualifiers=qualifiers, references=referencesA)
-                        elif 'P846' in sub_claim_dict:
-                            claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim_dict['P846'], qualifiers=qualifiers, references=referencesA)
-                        item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                        already_appended = True
-            elif isinstance(claim_dict, dict):
-                qualifiers = models.Qualifiers()
-                for qual_claim_id, qual_claim_val in claim_dict.items():
-                    if qual_claim_id in ["P793", "P794"]: # Time
-                        qualifiers.add(datatypes.Time(prop_nr=qual_claim_id, time='+'+str(qual_claim_val)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY))
-                    elif qual_claim_id in ["P492", "P812", "P834", "P835", "P837"]: # Item
-                        qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                if 'value' in claim_dict:
-                    claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict['value'], qualifiers=qualifiers, references=referencesA)
-                else:
-                    print(claim_id)
-                    print(claim_dict)
-                    claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict[wikibase_name], qualifiers=qualifiers, references=referencesA)
-            else:
-                print("x1")
-                print(claim_id)
-                print(claim_dict)
-                exit()
-
-        elif claim_id in ["P67", "P434", "P830", "P833", "P841"]: # Monolingual Text
-            if isinstance(claim_dict, list):
-                if isinstance(claim_dict[0], dict):
-                    for sub_claim_dict in claim_dict:
-                        qualifiers = models.Qualifiers()
-                        for qual_claim_id, qual_claim_val in sub_claim_dict.items():
-                            if qual_claim_id in ["P33"]: # Quantity
-                                qualifiers.add(datatypes.Quantity(prop_nr=qual_claim_id, amount=qual_claim_val))
-                            elif qual_claim_id in ["P87", "P816", "P826", "P832"]: # Item
-                                if qual_claim_val is None:
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, snaktype=WikibaseSnakType.NO_VALUE))
-                                else:
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                            elif qual_claim_id in ["P827", "P831"]: # MonolingualText
-                                qualifiers.add(datatypes.MonolingualText(prop_nr=qual_claim_id, text=qual_claim_val['value'], language=qual_claim_val['language']))
-                            elif qual_claim_id in ["P59"]: # Time
-                                qualifiers.add(datatypes.Time(prop_nr=qual_claim_id, time='+'+str(qual_claim_val)+'-00-00'+'T00:00:00'+'Z', precision=WikibaseDatePrecision.YEAR))
-                            elif qual_claim_id in ["P450"]: # Item
-                                for sub_item in qual_claim_val:
-                                    qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=sub_item))
-                        claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=sub_claim_dict['value'], language=sub_claim_dict['language'], qualifiers=qualifiers, references=referencesA)
-                        item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                        already_appended = True
-                elif isinstance(claim_dict[0], list):
-                    print(claim_id)
-                    if isinstance(claim_dict[0][0], dict):
-                        for sub_claim_dict in claim_dict:
-                            for infra_claim_dict in sub_claim_dict:
-                                qualifiers = models.Qualifiers()
-                                for qual_claim_id, qual_claim_val in infra_claim_dict.items():
-                                    if qual_claim_id in ["P33"]: # Quantity
-                                        qualifiers.add(datatypes.Quantity(prop_nr=qual_claim_id, amount=qual_claim_val))
-                                    elif qual_claim_id in ["P87", "P816", "P826", "P832"]:
-                                        if qual_claim_val is None:
-                                            qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, snaktype=WikibaseSnakType.NO_VALUE))
-                                        else:
-                                            qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                                    elif qual_claim_id in ["P827"]:
-                                        qualifiers.add(datatypes.MonolingualText(prop_nr=qual_claim_id, text=qual_claim_val['value'], language=qual_claim_val['language']))
-                                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=infra_claim_dict['value'], language=infra_claim_dict['language'], qualifiers=qualifiers, references=referencesA)
-                                item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                                already_appended = True
-                    else:
-                        print("x2")
-                        print(claim_id)
-                        print(claim_dict)
-                        exit()
-                else:
-                    print("x3")
-                    print(claim_id)
-                    print(claim_dict)
-                    exit()
-            elif isinstance(claim_dict, dict):
-                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'], references=referencesA)
-            else:
-                print("x4")
-                print(claim_id)
-                print(claim_dict)
-                exit()
-
-        elif claim_id in ["P3", "P95", "P199"]: # External Identifier
-            if claim_id == "P3":
-                referencesB = models.references.References()
-                referenceB1 = models.references.Reference()
-                for ref_id, ref_val in claim_dict['reference'].items():
-                    if ref_id in ['P21', 'P278', 'P279']:
-                        referenceB1.add(datatypes.Item(prop_nr=ref_id, value=ref_val))
-                    elif ref_id in ['P561', 'P562']:
-                        referenceB1.add(datatypes.String(prop_nr=ref_id, value=ref_val))
-                referencesB.add(referenceB1)
-                claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesB)
-            else:
-                if isinstance(claim_dict, str):
-                    claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesA)
-                elif isinstance(claim_dict, list):
-                    print("x5")
-                    print(claim_id)
-                    print(claim_dict)
-                    exit()
-                elif isinstance(claim_dict, dict):
-                    qualifiers = models.Qualifiers()
-                    for qual_claim_id, qual_claim_val in claim_dict.items():
-                        if qual_claim_id in ["P792"]: # String
-                            qualifiers.add(datatypes.String(prop_nr=qual_claim_id, value=qual_claim_val))
-                        elif qual_claim_id in ["P795"]: # Item
-                            qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                    claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict['value'], qualifiers=qualifiers, references=referencesA)
-                else:
-                    print("x6")
-                    print(claim_id)
-                    print(claim_dict)
-                    exit()
-
-        elif claim_id in ["P57", "P76", "P77", "P510", "P511", "P808"]: # String
-            if isinstance(claim_dict, str):
-                claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict, references=referencesA)
-            elif isinstance(claim_dict, list):
-                print("x7")
-                print(claim_id)
-                print(claim_dict)
-                exit()
-            elif isinstance(claim_dict, dict):
-                claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-
-        elif claim_id in ["P58", "P469", "P836"]: # Time
-            if isinstance(claim_dict, str):
-                if claim_dict == "UNKNOWN":
-                    claim_obj = datatypes.Time(prop_nr=claim_id, snaktype=WikibaseSnakType.UNKNOWN_VALUE, references=referencesA)
-                else:
-                    if "-00-00" in str(claim_dict):
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.YEAR, references=referencesA)
-                    elif "-00" in str(claim_dict):
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.MONTH, references=referencesA)
-                    else:
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, references=referencesA)
-            elif isinstance(claim_dict, list):
-                for sub_claim in claim_dict:
-                    
-                    if isinstance(sub_claim, dict):
-                        qualifiers = models.Qualifiers()
-                        for qual_claim_id, qual_claim_val in sub_claim.items():
-                            if qual_claim_id in ["P828"]: # Item
-                                qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(sub_claim['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, qualifiers=qualifiers, references=referencesA)
-                    elif isinstance(sub_claim, str):
-                        if sub_claim == "UNKNOWN":
-                            claim_obj = datatypes.Time(prop_nr=claim_id, snaktype=WikibaseSnakType.UNKNOWN_VALUE, references=referencesA)
-                        else:
-                            claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(sub_claim['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, references=referencesA)
-                    item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                    already_appended = True
-            elif isinstance(claim_dict, dict):
-                qualifiers = models.Qualifiers()
-                for qual_claim_id, qual_claim_val in claim_dict.items():
-                    if qual_claim_id in ["P828"]: # Item
-                        qualifiers.add(datatypes.Item(prop_nr=qual_claim_id, value=qual_claim_val))
-                    elif qual_claim_id in ["P847", "P848"]:
-                        qualifiers.add(datatypes.Time(prop_nr=qual_claim_id, time='+'+str(qual_claim_val)+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY))
-                if 'precision' in claim_dict:
-                    if claim_dict['precision'] == "YEAR":
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.YEAR, qualifiers=qualifiers, references=referencesA)
-                    elif claim_dict['precision'] == "MONTH":
-                        claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.MONTH, qualifiers=qualifiers, references=referencesA)
-                    else:
-                        print("Precision value not recognized. Exiting...")
-                        exit()
-                else:
-                    claim_obj = datatypes.Time(prop_nr=claim_id, time='+'+str(claim_dict['value'])+'T00:00:00'+'Z', precision=WikibaseDatePrecision.DAY, qualifiers=qualifiers, references=referencesA)
-        else:
-            print("x8")
-            print(claim_id)
-            print(claim_dict)
-            print('here2')
-            exit()
-
-        if not already_appended:
-            item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
+    claim_builder.add_claims(item, processed_article_object['claims'], references=claim_builder.pubmed_references())
 
     #print(item)
-    item.write()
+    wikibase_session.create_item(item)
 
-    exit()
+    raise dead_letter.UnprocessableRecord("Created article %s, but adding the rest of the article is not implemented yet." % str(item.id), stage='article')
 
 # Check if article exists.
 def check_if_article_exists(query_str):
@@ -890,11 +435,11 @@ def check_if_article_exists(query_str):
     search_list = wbi_helpers.search_entities(query_str)
     if len(search_list) > 0:
         for search_result in search_list:
-            accept_match = input("Is this entity (%s) a match for the article name (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
+            accept_match = review_queue.ask('article', "Is this entity (%s) a match for the article name (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
             if accept_match in ['Y', 'y', 'yes', 'true']:
                 match_id = search_result
     if match_id is None:
-        accept_match = input("Is there another match you would like to indicate for this article title (%s)? If so, provide it here:\n" % (str(query_str)))
+        accept_match = review_queue.ask('article', "Is there another match you would like to indicate for this article title (%s)? If so, provide it here:\n" % (str(query_str)))
         if accept_match:
             match_id = accept_match.strip()
     return match_id
@@ -915,7 +460,7 @@ def detect_language(str):
     return wikibase_lang
 
 def add_to_mapping_file(pubmodel_name):
-    new_match = input('What is the QID that matches the publication model "%s"?\n' % (str(pubmodel_name)))
+    new_match = review_queue.ask('publication_model', 'What is the QID that matches the publication model "%s"?\n' % (str(pubmodel_name)))
     pubmodel_mappings_json[str(pubmodel_name)][wikibase_name] = new_match.strip()
 
     with open(constants.PubModel_mapping_file, 'w') as f:
@@ -9,16 +9,19 @@
 from pathlib import Path
 from pubmed_format_affiliation import process_affiliation_list
 from pubmed_format_identifier import process_orcid
-from wikibaseintegrator import wbi_login, WikibaseIntegrator
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_enums import ActionIfExists
 from wikidata_mapping import get_wikidata_id
 
+import claim_builder
 import constants
+import dead_letter
 import json
-import wikibaseintegrator.datatypes as datatypes
+import review_queue
+import run_journal
+import threading
+import wikibase_session
 import wikibaseintegrator.wbi_helpers as wbi_helpers
-import wikibaseintegrator.models as models
 import yaml
 
 # Read in YAML file.
@@ -37,9 +40,19 @@ wikibase_name = yaml_dict['wikibase']['wikibase_name']
 with open(constants.AU_mapping_file, 'r') as f:
     authors_json = json.load(f)
 
+# Authors are written from several threads (see process_author_list).
+authors_lock = threading.Lock()
+
 # Author List
+#
+# The authors are matched and written concurrently on the Wikibase write
+# queue; their QIDs are filled in once all of them have finished.
+#
+# Not called yet: the author step in pubmed_format_article.process_article
+# is still commented out.
 def process_author_list(author_list_obj):
     processed_author_list = []
+    submitted_stages = []
     author_counter = 1
     for author_obj in author_list_obj:
         processed_author = process_author(author_obj)
@@ -64,18 +77,41 @@ def process_author_list(author_list_obj):
             pass
 
         print("HERE1")
-        match_id = check_if_author_exists(author_obj)
-        print("HERE2")
-        if match_id:
-            print("HERE2.5")
-            continue_to_add = input("Has this item (%s) already been updated? [Y/n]\n" % (str(match_id)))
-            if continue_to_add in ['Y', 'y']:
+        stage = 'author:%s' % str(author_counter)
+        submitted_stages.append((stage, run_journal.submit_stage(run_journal.current_pmid, stage, write_author, author_obj, processed_author)))
+        print("HERE3")
+
+        processed_author_list.append(processed_author)
+        author_counter += 1
+        print("HERE4")
+
+    author_ids = run_journal.finish_stages(run_journal.current_pmid, submitted_stages)
+    for processed_author, author_id in zip(processed_author_list, author_ids):
+        processed_author['lgbtdb'] = author_id
+
+    print("HERE5")
+    print(processed_author_list)
+    print("HERE6")
+
+    return processed_author_list
+
+# Matches the author against the Wikibase and writes it (as a new item or
+# an update to the match), returning the author's QID.
+def write_author(author_obj, processed_author):
+    author_id = None
+    match_id = check_if_author_exists(author_obj)
+    print("HERE2")
+    if match_id:
+        print("HERE2.5")
+        continue_to_add = review_queue.ask('author', "Has this item (%s) already been updated? [Y/n]\n" % (str(match_id)), per_article=True)
+        if continue_to_add in ['Y', 'y']:
+            with authors_lock:
                 full_name = author_obj['ForeName'] + " " + author_obj['LastName']
                 list_of_keys = [value for key, value in authors_json.items() if full_name in key.lower()]
                 full_name_counter = 1 + len(list_of_keys)
                 match_key = None
                 for key in list_of_keys:
-                    accept_match = input("Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(key), str(full_name)))
+                    accept_match = review_queue.ask('author', "Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(key), str(full_name)))
                     if accept_match in ['Y', 'y', 'yes', 'true']:
                         match_id = authors_json[key]['lgbtdb']
                         if match_id:
@@ -91,25 +127,15 @@ def process_author_list(author_list_obj):
                         authors_json[full_name + ", " + str(full_name_counter)][wikibase_name] = match_id
                 with open(constants.AU_mapping_file, 'w') as f:
                     json.dump(authors_json, f, indent=4, sort_keys=True)
-                processed_author['lgbtdb'] = match_id
-            else:
-                item = add_to_existing_author(processed_author, match_id)
-                processed_author['lgbtdb'] = str(item.id)
+            author_id = match_id
         else:
-            print("HERE2.8")
-            item = add_new_author(processed_author)
-            processed_author['lgbtdb'] = str(item.id)
-        print("HERE3")
-
-        processed_author_list.append(processed_author)
-        author_counter += 1
-        print("HERE4")
-
-    print("HERE5")
-    print(processed_author_list)
-    print("HERE6")
-
-    return processed_author_list
+            item = add_to_existing_author(processed_author, match_id)
+            author_id = str(item.id)
+    else:
+        print("HERE2.8")
+        item = add_new_author(processed_author)
+        author_id = str(item.id)
+    return author_id
 
 # AU: Author
 def process_author(author_obj):
@@ -170,10 +196,7 @@ def process_author_identifiers(author_obj):
             if sourceval == "ORCID":
                 processed_ids['P796'] = eidval
             else:
-                print(eidval)
-                print(sourceval)
-                print("Author identifier (%s) of type %s not recognized. Exiting..." % (str(eidval), str(eidtype)))
-                exit()
+                raise dead_letter.UnprocessableRecord("Author identifier (%s) of type %s not recognized." % (str(eidval), str(sourceval)), stage='AuthorIdentifier')
         else:
             pass
 
@@ -181,9 +204,8 @@ def process_author_identifiers(author_obj):
 
 # Add if exists.
 def add_to_existing_author(processed_author_object, match_id):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
-    item = wbi.item.get(match_id)
+    item = wikibase_session.get_item(match_id)
+    original = item.get_json()
 
     full_name = processed_author_object['P797']['value'] + " " + processed_author_object['P839']['value']
     last_name_first = processed_author_object['P839']['value'] + ", " + processed_author_object['P797']['value']
@@ -194,63 +216,33 @@ def add_to_existing_author(processed_author_object, match_id):
         item.aliases.set('en', full_name)
     item.aliases.set('en', last_name_first)
 
-    referencesA = models.references.References()
-    referenceA = models.references.Reference()
-    referenceA.add(datatypes.Item(prop_nr="P21", value="Q19463"))
-    referencesA.add(referenceA)
+    referencesA = claim_builder.pubmed_references()
 
-    author_instance_of_claim = datatypes.Item(prop_nr="P1", value="Q20846", references=referencesA)
+    author_instance_of_claim = claim_builder.build_snak("P1", "Q20846", references=referencesA)
     item.claims.add(author_instance_of_claim, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
 
-    for claim_id, claim_dict in processed_author_object.items():
-        already_appended = False
-
-        if claim_id in ["P798"]: # String
-            claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-        elif claim_id in ["P797", "P839"]: # MonolingualText
-            claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'], references=referencesA)
-        elif claim_id in ["P838"]: # Item
-            # ??? --> affiliation
-            print(claim_dict)
-            for sub_claim in claim_dict:
-                print(sub_claim)
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim[wikibase_name], references=referencesA)
-                item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                already_appended = True
-        elif claim_id in ["P796"]: # ExternalID
-            claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesA)
-        elif claim_id in ["P3"]: # Wikidata mapping
-            referencesB = models.references.References()
-            referenceB = models.references.Reference()
-            referenceB.add(datatypes.Item(prop_nr="P21", value="Q20285")) # stated in; Wikidata
-            referenceB.add(datatypes.Item(prop_nr="P278", value="Q27192")) # mapping subject source, mapping from
-            referenceB.add(datatypes.Item(prop_nr="P279", value="Q21039")) # mapping object source, mapping to
-            referenceB.add(datatypes.ExternalID(prop_nr="P561", value=processed_author_object["P796"]))
-            referenceB.add(datatypes.ExternalID(prop_nr="P562", value=processed_author_object["P3"]))
-            referencesB.add(referenceB)
-            claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesB)
-        else:
-            if claim_id in ['P812', 'P795', 'P33']: # These properties are qualifiers declared in the article, not on the author themself.
-                pass
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here3')
-                exit()
+    # P812, P795 and P33 are qualifiers declared in the article, not on the author themself.
+    claim_builder.add_claims(item, processed_author_object, references=referencesA, skip=['P3', 'P812', 'P795', 'P33'])
 
-        if not already_appended:
-            item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
+    if 'P3' in processed_author_object: # Wikidata mapping
+        referencesB = claim_builder.build_references({
+            'P21': 'Q20285', # stated in; Wikidata
+            'P278': 'Q27192', # mapping subject source, mapping from
+            'P279': 'Q21039', # mapping object source, mapping to
+            'P561': processed_author_object['P796'],
+            'P562': processed_author_object['P3']
+        })
+        claim_builder.add_claims(item, {'P3': processed_author_object['P3']}, references=referencesB)
 
     print(item)
-    item.write()
+    wikibase_session.write_item(item, original=original)
     return item
 
 # Add new.
 def add_new_author(processed_author_object):
     print(processed_author_object)
 
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
+    wbi = wikibase_session.get_wbi()
     item = wbi.item.new()
 
     full_name = processed_author_object['P797']['value'] + " " + processed_author_object['P839']['value']
@@ -259,56 +251,26 @@ def add_new_author(processed_author_object):
     item.aliases.set('en', full_name)
     item.aliases.set('en', last_name_first)
 
-    referencesA = models.references.References()
-    referenceA = models.references.Reference()
-    referenceA.add(datatypes.Item(prop_nr="P21", value="Q19463"))
-    referencesA.add(referenceA)
+    referencesA = claim_builder.pubmed_references()
 
-    author_instance_of_claim = datatypes.Item(prop_nr="P1", value="Q20846", references=referencesA)
+    author_instance_of_claim = claim_builder.build_snak("P1", "Q20846", references=referencesA)
     item.claims.add(author_instance_of_claim, action_if_exists=ActionIfExists.FORCE_APPEND)
-    item.write()
-
-    for claim_id, claim_dict in processed_author_object.items():
-        already_appended = False
-
-        if claim_id in ["P798"]: # String
-            claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-        elif claim_id in ["P797", "P839"]: # MonolingualText
-            claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'], references=referencesA)
-        elif claim_id in ["P838"]: # Item
-            # ??? --> affiliation
-            for sub_claim in claim_dict:
-                print(sub_claim)
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=sub_claim[wikibase_name], references=referencesA)
-                item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-                already_appended = True
-        elif claim_id in ["P796"]: # ExternalID
-            print(claim_dict)
-            claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesA)
-        elif claim_id in ["P3"]: # Wikidata mapping
-            referencesB = models.references.References()
-            referenceB = models.references.Reference()
-            referenceB.add(datatypes.Item(prop_nr="P21", value="Q20285")) # stated in; Wikidata
-            referenceB.add(datatypes.Item(prop_nr="P278", value="Q27192")) # mapping subject source, mapping from
-            referenceB.add(datatypes.Item(prop_nr="P279", value="Q21039")) # mapping object source, mapping to
-            referenceB.add(datatypes.ExternalID(prop_nr="P561", value=processed_author_object["P796"]))
-            referenceB.add(datatypes.ExternalID(prop_nr="P562", value=claim_dict))
-            referencesB.add(referenceB)
-            claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict, references=referencesB)
-        else:
-            if claim_id in ['P812', 'P795', 'P33']: # These properties are qualifiers declared in the article, not on the author themself.
-                pass
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here3')
-                exit()
 
-        if not already_appended:
-            item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
+    # P812, P795 and P33 are qualifiers declared in the article, not on the author themself.
+    claim_builder.add_claims(item, processed_author_object, references=referencesA, skip=['P3', 'P812', 'P795', 'P33'])
+
+    if 'P3' in processed_author_object: # Wikidata mapping
+        referencesB = claim_builder.build_references({
+            'P21': 'Q20285', # stated in; Wikidata
+            'P278': 'Q27192', # mapping subject source, mapping from
+            'P279': 'Q21039', # mapping object source, mapping to
+            'P561': processed_author_object['P796'],
+            'P562': processed_author_object['P3']
+        })
+        claim_builder.add_claims(item, {'P3': processed_author_object['P3']}, references=referencesB)
 
     print(item)
-    item.write()
+    wikibase_session.create_item(item)
     return item
 
 # Check if author exists (lgbtDB).
@@ -319,18 +281,18 @@ def check_if_author_exists(author_obj):
     search_list_1 = wbi_helpers.search_entities(full_name)
     if len(search_list_1) > 0:
         for search_result in search_list_1:
-            accept_match = input("Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(search_result), str(full_name)))
+            accept_match = review_queue.ask('author', "Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(search_result), str(full_name)))
             if accept_match in ['Y', 'y', 'yes', 'true']:
                 match_id = search_result
     if match_id is None:
         search_list_2 = wbi_helpers.search_entities(last_name_first)
         if len(search_list_2) > 0:
             for search_result in search_list_2:
-                accept_match = input("Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(search_result), str(last_name_first)))
+                accept_match = review_queue.ask('author', "Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(search_result), str(last_name_first)))
                 if accept_match in ['Y', 'y', 'yes', 'true']:
                     match_id = search_result
         if match_id is None:
-            accept_match = input("Is there another match you would like to indicate for this author name (%s)? If so, provide it here:\n" % (str(full_name)))
+            accept_match = review_queue.ask('author', "Is there another match you would like to indicate for this author name (%s)? If so, provide it here:\n" % (str(full_name)))
             if accept_match:
                 match_id = accept_match.strip()
     return match_id
\ No newline at end of file
@@ -17,8 +17,10 @@
 from pathlib import Path
 
 import constants
+import dead_letter
 import json
 import re
+import review_queue
 import yaml
 
 # Read in YAML file.
@@ -56,8 +58,6 @@ def get_registry_number(chemical_obj):
         processed_chemical_obj["P843"] = chemical_obj['RegistryNumber']
     elif registry_number_type is None:
         pass
-    else:
-        exit()
     return processed_chemical_obj
 
 def identify_registry_number_type(registry_number_str):
@@ -76,8 +76,7 @@ def identify_registry_number_type(registry_number_str):
     elif cas_regex.match(str(registry_number_str)):
         return "CAS"
     else:
-        print("Could not identify '%s'. Exiting..." % str(registry_number_str))
-        exit()
+        raise dead_letter.UnprocessableRecord("Could not identify registry number '%s'." % str(registry_number_str), stage='RegistryNumber')
 
 # See here:
 # https://wayback.archive-it.org/org-350/20240424200258/https://www.nlm.nih.gov/bsd/mms/medlineelements.html
@@ -109,7 +108,7 @@ def get_mesh_ui(substance_name):
     return processed_mesh_descriptor_name
 
 def add_to_mapping_file(mesh_name, mesh_uid):
-    new_match = input('What is the QID that matches the MeSH heading "%s" (%s)?\n' % (str(mesh_name), str(mesh_uid)))
+    new_match = review_queue.ask('chemical', 'What is the QID that matches the MeSH heading "%s" (%s)?\n' % (str(mesh_name), str(mesh_uid)))
     if str(mesh_name) not in mesh_headings_json:
         mesh_headings_json[str(mesh_name)] = {}
     mesh_headings_json[str(mesh_name)][wikibase_name] = new_match.strip()
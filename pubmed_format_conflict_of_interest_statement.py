@@ -10,6 +10,7 @@ from langdetect import detect
 from pubmed_format_language import process_languages, return_wikibase_mapping
 
 import constants
+import dead_letter
 import json
 import nltk
 import textwrap
@@ -74,7 +75,6 @@ def determine_tokenizer(str):
             punkt = LA_dict["punkt"]
             break
     if punkt is None:
-        print("No value found. Exiting...")
-        exit()
+        raise dead_letter.UnprocessableRecord("No sentence tokenizer found for language %s." % str(wikibase_lang), stage='CoiStatement')
 
     return nltk.data.load('tokenizers/punkt/%s.pickle' % punkt)
\ No newline at end of file
@@ -14,8 +14,10 @@ from pubmed_format_language import process_languages, return_wikibase_mapping
 from wikidata_mapping import get_wikidata_id
 
 import constants
+import dead_letter
 import json
 import re
+import review_queue
 import yaml
 
 # Read in YAML file.
@@ -78,11 +80,9 @@ def process_copyright_information(entrez_obj, copyright_object, from_abstract=Fa
             if copyright_object == entrez_obj['Article']['Abstract']['CopyrightInformation']:
                 return copyright_info_obj
             else:
-                print("This sentence (%s) appears to not contain copyright or publisher information." % copyright_object)
-                exit()
+                raise dead_letter.UnprocessableRecord("This sentence (%s) appears to not contain copyright or publisher information." % copyright_object, stage='CopyrightInformation')
     else:
-        print(copyright_object)
-        exit()
+        raise dead_letter.UnprocessableRecord("Copyright information (%s) not recognized." % str(copyright_object), stage='CopyrightInformation')
 
     return copyright_info_obj
 
@@ -102,8 +102,7 @@ def process_copyright(entrez_obj, copyright_str):
                     try:
                         processed_copyright_info_str = copyright_str.split('(c)')[1]
                     except IndexError:
-                        print("This sentence (%s) appears to not contain copyright information." % copyright_str)
-                        exit()
+                        raise dead_letter.UnprocessableRecord("This sentence (%s) appears to not contain copyright information." % copyright_str, stage='CopyrightInformation')
 
     copyright_info_obj = {}
     copyright_info_obj['P59'] = process_copyright_date(processed_copyright_info_str)
@@ -142,7 +141,7 @@ def process_copyright_holder(entrez_obj, copyright_str):
                 # then ask the user to add the mapping. Then exit.
                 for key in list_of_keys:
 
-                    accept_match = input("Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(key), str(full_name)))
+                    accept_match = review_queue.ask('author', "Is this entity (%s) a match for the author name (%s)? [Y/n]\n" % (str(key), str(full_name)))
                     if accept_match in ['Y', 'y', 'yes', 'true']:
                         match_id = authors_json[key][wikibase_name]
                         if match_id:
@@ -166,7 +165,7 @@ def process_copyright_holder(entrez_obj, copyright_str):
                     
                     with open('pubmed-authors.json', 'w') as f:
                         json.dump(authors_json, f, indent=4, sort_keys=True)
-                    exit()
+                    raise dead_letter.UnprocessableRecord("No match found for author (%s). Please add to the appropriate JSON file." % str(full_name), stage='CopyrightInformation')
     else:
         copyright_holder = copyright_str.split(' ', 1)[1]
         copyright_holder = copyright_str.rsplit(',', 1)[0]
@@ -182,7 +181,7 @@ def process_copyright_holder(entrez_obj, copyright_str):
                 affiliations_json[copyright_holder_str] = {}
                 with open('pubmed-affiliation-mappings.json', 'w') as f:
                     json.dump(affiliations_json, f, indent=4, sort_keys=True)
-                exit()
+                raise dead_letter.UnprocessableRecord("No match found for copyright holder value (%s). Please add to the appropriate JSON file." % str(copyright_holder_str), stage='CopyrightInformation')
         else:
             if copyright_holder_str in affiliations_json:
                 processed_copyright_holder_list.append(affiliations_json[copyright_holder_str][wikibase_name])
@@ -205,8 +204,7 @@ def process_publisher_info(copyright_str):
         try:
             processed_publisher_info_str = copyright_str.split('published by')[1]
         except IndexError:
-            print("This sentence (%s) appears to not contain publisher information." % copyright_str)
-            exit()
+            raise dead_letter.UnprocessableRecord("This sentence (%s) appears to not contain publisher information." % copyright_str, stage='CopyrightInformation')
 
     if 'on behalf of' in copyright_str.lower():
         processed_publisher_info_list = processed_publisher_info_str.split('on behalf of')
@@ -226,7 +224,7 @@ def process_publisher_info(copyright_str):
                 affiliations_json[on_behalf_of_str] = {}
                 with open('pubmed-affiliation-mappings.json', 'w') as f:
                     json.dump(affiliations_json, f, indent=4, sort_keys=True)
-                exit()
+                raise dead_letter.UnprocessableRecord("No match found for on-behalf-of value (%s). Please add to the appropriate JSON file." % str(on_behalf_of_str), stage='CopyrightInformation')
 
         publisher_match_id = check_if_affiliation_exists(publisher_str)
 
@@ -238,7 +236,7 @@ def process_publisher_info(copyright_str):
                 affiliations_json[publisher_str] = {}
                 with open('pubmed-affiliation-mappings.json', 'w') as f:
                     json.dump(affiliations_json, f, indent=4, sort_keys=True)
-                exit()
+                raise dead_letter.UnprocessableRecord("No match found for publisher value (%s). Please add to the appropriate JSON file." % str(publisher_str), stage='CopyrightInformation')
 
         processed_publisher_info['P87'] = publisher_match_id # publisher
         processed_publisher_info['P832'] = on_behalf_of_match_id # on behalf of
@@ -254,7 +252,7 @@ def process_publisher_info(copyright_str):
                 affiliations_json[publisher_str] = {}
                 with open('pubmed-affiliation-mappings.json', 'w') as f:
                     json.dump(affiliations_json, f, indent=4, sort_keys=True)
-                exit()
+                raise dead_letter.UnprocessableRecord("No match found for publisher value (%s). Please add to the appropriate JSON file." % str(publisher_str), stage='CopyrightInformation')
 
         processed_publisher_info['P87'] = publisher_match_id # publisher
 
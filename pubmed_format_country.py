@@ -9,7 +9,9 @@
 from pathlib import Path
 
 import constants
+import dead_letter
 import json
+import review_queue
 import yaml
 
 # Read in YAML file.
@@ -28,12 +30,11 @@ def process_country(country_str):
         wikibase_qid = add_to_mapping_file(country_str)
         process_country(country_str)
     if wikibase_qid is None:
-        print(country_str)
-        exit()
+        raise dead_letter.UnprocessableRecord("No match found for country (%s)." % str(country_str), stage='Country')
     return wikibase_qid
 
 def add_to_mapping_file(country_str):
-    new_match = input('What is the QID that matches the country "%s"?\n' % (str(country_str)))
+    new_match = review_queue.ask('country', 'What is the QID that matches the country "%s"?\n' % (str(country_str)))
     countries_json[str(country_str)][wikibase_name] = new_match.strip()
 
     with open(constants.PL_mapping_file, 'w') as f:
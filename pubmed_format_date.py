@@ -9,6 +9,7 @@
 from daterangeparser import parse
 from time import strptime
 
+import dead_letter
 import pyparsing
 
 def process_date(pubmed_date):
@@ -52,8 +53,7 @@ def process_date_range(pubmed_date):
     
     # If neither, return an appropriate message
     else:
-        print("The PubMed date range (%s) does not appear to share a year or month." % str(pubmed_date))
-        exit()
+        raise dead_letter.UnprocessableRecord("The PubMed date range (%s) does not appear to share a year or month." % str(pubmed_date), stage='DateRange')
 
     return {
         'value': shared_overlap,
@@ -8,16 +8,20 @@
 
 from pathlib import Path
 from pubmed_format_country import process_country
-from wikibaseintegrator import wbi_login, WikibaseIntegrator
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_enums import ActionIfExists
 
+import claim_builder
 import constants
+import dead_letter
 import json
 import re
-import wikibaseintegrator.datatypes as datatypes
+import review_queue
+import run_journal
+import threading
+import wikibase_plan
+import wikibase_session
 import wikibaseintegrator.wbi_helpers as wbi_helpers
-import wikibaseintegrator.models as models
 import yaml
 
 # Read in YAML file.
@@ -36,6 +40,9 @@ wikibase_name = yaml_dict['wikibase']['wikibase_name']
 with open(constants.grants_mapping_file, 'r') as f:
     grants_json = json.load(f)
 
+# Grants are written from several threads (see process_grant_list).
+grants_lock = threading.Lock()
+
 with open(constants.GR_mapping_file, 'r') as f:
     grant_codes_json = json.load(f)
 
@@ -49,8 +56,16 @@ with open(constants.award_type_mapping_file, 'r') as f:
 #   GENERAL METHODS
 #
 
+# Grants with a GrantID are matched and written concurrently on the Wikibase
+# write queue. Grants without one are keyed by the article title, so each
+# depends on the one before it and they are written in order.
+#
+# Not called yet: the grant step in pubmed_format_article.process_article is
+# still commented out.
 def process_grant_list(entrez_obj, grant_list_object):
     grant_list_obj = {}
+    submitted_stages = []
+    submitted_grant_ids = []
     for counter, grant in enumerate(grant_list_object):
         grant_complete = None
         try:
@@ -63,54 +78,75 @@ def process_grant_list(entrez_obj, grant_list_object):
             if grant_complete:
                 grant_list_obj[grant['GrantID']]['P812'] = grant_complete
 
-            match_id = check_if_grant_exists(grant['GrantID'])
-            if match_id:
-                continue_to_add = input("Has this item (%s) already been updated? [Y/n]\n" % (str(match_id)))
-                if continue_to_add in ['Y', 'y']:
-                    if grant['GrantID'] not in grants_json:
-                        grants_json[grant['GrantID']] = {}
-                    grants_json[grant['GrantID']][wikibase_name] = match_id
-                    with open(constants.grants_mapping_file, 'w') as f:
-                        json.dump(grants_json, f)
-                    grants_json[grant['GrantID']][wikibase_name] = match_id
-                    with open(constants.grants_mapping_file, 'w') as f:
-                        json.dump(grants_json, f, indent=4, sort_keys=True)
-                    grant_list_obj[grant['GrantID']][wikibase_name] = str(match_id)
-                else:
-                    item = add_to_existing_grant(grant_list_obj[grant['GrantID']], match_id)
-                    grants_json[grant['GrantID']][wikibase_name] = str(match_id)
-                    grant_list_obj[grant['GrantID']][wikibase_name] = str(match_id)
-            else:
-                item = add_new_grant(grant_list_obj[grant['GrantID']])
-                if grant['GrantID'] in grants_json:
-                    grants_json[grant['GrantID']][wikibase_name] = str(item.id)
-                    grant_list_obj[grant['GrantID']][wikibase_name] = str(item.id)
-                else:
-                    grants_json[grant['GrantID']] = {}
-                    grants_json[grant['GrantID']][wikibase_name] = str(item.id)
-                    grant_list_obj[grant['GrantID']][wikibase_name] = str(item.id)
-                with open(constants.grants_mapping_file, 'w') as f:
-                    json.dump(grants_json, f, indent=4, sort_keys=True)
+            if grant['GrantID'] not in submitted_grant_ids:
+                stage = 'grant:%s' % str(grant['GrantID'])
+                submitted_stages.append((stage, run_journal.submit_stage(run_journal.current_pmid, stage, write_grant, grant, grant_list_obj[grant['GrantID']])))
+                submitted_grant_ids.append(grant['GrantID'])
         else:
             grant_list_obj[str(counter)] = process_grant(grant)
             if grant_complete:
                 grant_list_obj[str(counter)]['P812'] = grant_complete
             
-            if str(entrez_obj['Article']['ArticleTitle']) in grants_json:
-                item = add_to_existing_grant(grant_list_obj[str(counter)], grants_json[str(entrez_obj['Article']['ArticleTitle'])][wikibase_name])
-                grant_list_obj[str(counter)][wikibase_name] = item.id
-            else:
-                item = add_new_grant(grant_list_obj[str(counter)])
-                grant_list_obj[str(counter)][wikibase_name] = item.id
-                grants_json[str(entrez_obj['Article']['ArticleTitle'])] = {}
-                grants_json[str(entrez_obj['Article']['ArticleTitle'])][wikibase_name] = str(item.id)
-                with open(constants.grants_mapping_file, 'w') as f:
-                    json.dump(grants_json, f, indent=4, sort_keys=True)
+            grant_list_obj[str(counter)][wikibase_name] = run_journal.run_stage(run_journal.current_pmid, 'grant:%s' % str(counter), write_untitled_grant, entrez_obj, grant_list_obj[str(counter)])
             
             print(grant_list_obj)
 
+    grant_ids = run_journal.finish_stages(run_journal.current_pmid, submitted_stages)
+    for submitted_grant_id, grant_qid in zip(submitted_grant_ids, grant_ids):
+        grant_list_obj[submitted_grant_id][wikibase_name] = grant_qid
+
     return grant_list_obj
 
+# Matches a grant with a GrantID against the Wikibase and writes it,
+# returning the grant's QID.
+def write_grant(grant, processed_grant):
+    grant_id = None
+    match_id = check_if_grant_exists(grant['GrantID'])
+    if match_id:
+        continue_to_add = review_queue.ask('grant', "Has this item (%s) already been updated? [Y/n]\n" % (str(match_id)), per_article=True)
+        if continue_to_add in ['Y', 'y']:
+            with grants_lock:
+                if grant['GrantID'] not in grants_json:
+                    grants_json[grant['GrantID']] = {}
+                grants_json[grant['GrantID']][wikibase_name] = match_id
+                with open(constants.grants_mapping_file, 'w') as f:
+                    json.dump(grants_json, f)
+                grants_json[grant['GrantID']][wikibase_name] = match_id
+                with open(constants.grants_mapping_file, 'w') as f:
+                    json.dump(grants_json, f, indent=4, sort_keys=True)
+            grant_id = str(match_id)
+        else:
+            item = add_to_existing_grant(processed_grant, match_id)
+            with grants_lock:
+                grants_json[grant['GrantID']][wikibase_name] = str(match_id)
+            grant_id = str(match_id)
+    else:
+        item = add_new_grant(processed_grant)
+        if not wikibase_plan.planning:
+            with grants_lock:
+                if grant['GrantID'] not in grants_json:
+                    grants_json[grant['GrantID']] = {}
+                grants_json[grant['GrantID']][wikibase_name] = str(item.id)
+                with open(constants.grants_mapping_file, 'w') as f:
+                    json.dump(grants_json, f, indent=4, sort_keys=True)
+        grant_id = str(item.id)
+    return grant_id
+
+# Writes a grant without a GrantID, keyed in the mapping file by the
+# article title, returning the grant's QID.
+def write_untitled_grant(entrez_obj, processed_grant):
+    if str(entrez_obj['Article']['ArticleTitle']) in grants_json:
+        item = add_to_existing_grant(processed_grant, grants_json[str(entrez_obj['Article']['ArticleTitle'])][wikibase_name])
+    else:
+        item = add_new_grant(processed_grant)
+        if not wikibase_plan.planning:
+            with grants_lock:
+                grants_json[str(entrez_obj['Article']['ArticleTitle'])] = {}
+                grants_json[str(entrez_obj['Article']['ArticleTitle'])][wikibase_name] = str(item.id)
+                with open(constants.grants_mapping_file, 'w') as f:
+                    json.dump(grants_json, f, indent=4, sort_keys=True)
+    return str(item.id)
+
 # GR: Grant
 #
 # Based on:
@@ -287,8 +323,7 @@ def grant_agency(grant_obj):
                 if grant_obj['Acronym'] in grant_codes_json:
                     grant_primary_funding_institute = grant_agency_val[wikibase_name]
                 else:
-                    print("Agency (%s) not found. Exiting..." % grant_agency_raw)
-                    exit()
+                    raise dead_letter.UnprocessableRecord("Agency (%s) not found." % grant_agency_raw, stage='GrantAgency')
     else:
         grant_agency_val = grant_codes_json[grant_obj['Agency']]
         grant_primary_funding_institute_val = grant_agency_val[wikibase_name]
@@ -342,8 +377,7 @@ def grant_primary_funding_institute(grant_obj):
                 if grant_obj['Acronym'] in grant_codes_json:
                     grant_primary_funding_institute_val = grant_agency_val[wikibase_name]
                 else:
-                    print("Agency (%s) not found. Exiting..." % grant_agency_raw)
-                    exit()
+                    raise dead_letter.UnprocessableRecord("Agency (%s) not found." % grant_agency_raw, stage='GrantAgency')
     else:
         grant_agency_val = grant_codes_json[grant_obj['Agency']]
         grant_primary_funding_institute_val = grant_agency_val[wikibase_name]
@@ -375,91 +409,40 @@ def grant_country(grant_obj):
 
 # Add if exists.
 def add_to_existing_grant(processed_grant_object, match_id):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
-
-    item = wbi.item.get(match_id)
+    item = wikibase_session.get_item(match_id)
+    original = item.get_json()
 
     if 'P809' in processed_grant_object:
         item.aliases.set('en', processed_grant_object['P809'])
 
-    referencesA = models.references.References()
-    referenceA = models.references.Reference()
-    referenceA.add(datatypes.Item(prop_nr="P21", value="Q19463"))
-    referencesA.add(referenceA)
+    referencesA = claim_builder.pubmed_references()
 
-    grant_instance_of_claim = datatypes.Item(prop_nr="P1", value="Q5185", references=referencesA)
+    grant_instance_of_claim = claim_builder.build_snak("P1", "Q5185", references=referencesA)
     item.claims.add(grant_instance_of_claim, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
 
-    for claim_id, claim_dict in processed_grant_object.items():
-        if claim_id in ["P809", "P810", "P807"]: # String
-            claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict, references=referencesA)
-        elif claim_id in ["P804", "P805", "P806", "P811", "P802"]: # Item
-            if isinstance(claim_dict, str):
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict, references=referencesA)
-            elif isinstance(claim_dict, dict):
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict[wikibase_name], references=referencesA)
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here4')
-                exit()
-        elif claim_id in ["P812"]:
-            pass
-        else:
-            print(claim_id)
-            print(claim_dict)
-            print('here3')
-            exit()
-
-        item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
+    claim_builder.add_claims(item, processed_grant_object, references=referencesA, skip=['P812'])
 
     print(item)
-    item.write()
+    wikibase_session.write_item(item, original=original)
     return item
 
 # Add new.
 def add_new_grant(processed_grant_object):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
+    wbi = wikibase_session.get_wbi()
     item = wbi.item.new()
 
     if 'P809' in processed_grant_object:
         item.aliases.set('en', processed_grant_object['P809'])
 
-    referencesA = models.references.References()
-    referenceA = models.references.Reference()
-    referenceA.add(datatypes.Item(prop_nr="P21", value="Q19463"))
-    referencesA.add(referenceA)
+    referencesA = claim_builder.pubmed_references()
 
-    grant_instance_of_claim = datatypes.Item(prop_nr="P1", value="Q5185", references=referencesA)
+    grant_instance_of_claim = claim_builder.build_snak("P1", "Q5185", references=referencesA)
     item.claims.add(grant_instance_of_claim)
 
-    for claim_id, claim_dict in processed_grant_object.items():
-        if claim_id in ["P809", "P810", "P807"]: # String
-            claim_obj = datatypes.String(prop_nr=claim_id, value=claim_dict, references=referencesA)
-        elif claim_id in ["P804", "P805", "P806", "P811", "P802"]: # Item
-            if isinstance(claim_dict, str):
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict, references=referencesA)
-            elif isinstance(claim_dict, dict):
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict[wikibase_name], references=referencesA)
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here4')
-                exit()
-        elif claim_id in ["P812"]:
-            pass
-        else:
-            print(claim_id)
-            print(claim_dict)
-            print('here3')
-            exit()
-
-        item.claims.add(claim_obj)
+    claim_builder.add_claims(item, processed_grant_object, references=referencesA, skip=['P812'])
 
     print(item)
-    item.write()
+    wikibase_session.create_item(item)
     return item
 
 # Check if grant exists.
@@ -468,11 +451,11 @@ def check_if_grant_exists(query_str):
     search_list = wbi_helpers.search_entities(query_str)
     if len(search_list) > 0:
         for search_result in search_list:
-            accept_match = input("Is this entity (%s) a match for the grant (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
+            accept_match = review_queue.ask('grant', "Is this entity (%s) a match for the grant (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
             if accept_match in ['Y', 'y', 'yes', 'true']:
                 match_id = search_result
     if match_id is None:
-        accept_match = input("Is there another match you would like to indicate for this grant (%s)? If so, provide it here:\n" % (str(query_str)))
+        accept_match = review_queue.ask('grant', "Is there another match you would like to indicate for this grant (%s)? If so, provide it here:\n" % (str(query_str)))
         if accept_match:
             match_id = accept_match.strip()
     return match_id
\ No newline at end of file
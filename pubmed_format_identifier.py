@@ -6,6 +6,8 @@
 #   pubmed_format_identifier.py
 #
 
+import dead_letter
+
 def process_elocation_ids(elocation_id_array):
     processed_ids = {}
 
@@ -31,8 +33,7 @@ def process_elocation_ids(elocation_id_array):
             elif eidtype == 'pii':
                 processed_ids['P808'] = process_pii(str(eidval), str(eidvalid))
             else:
-                print("ElocationID (%s) of type %s not recognized. Exiting..." % (str(eidval), str(eidtype)))
-                exit()
+                raise dead_letter.UnprocessableRecord("ElocationID (%s) of type %s not recognized." % (str(eidval), str(eidtype)), stage='ELocationID')
         else:
             pass
 
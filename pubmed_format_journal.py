@@ -11,16 +11,16 @@ from pathlib import Path
 from pubmed_format_country import process_country
 from pubmed_format_identifier import process_issn
 from pubmed_format_language import process_languages, return_wikibase_mapping
-from wikibaseintegrator import wbi_login, WikibaseIntegrator
 from wikibaseintegrator.wbi_config import config as wbi_config
 from wikibaseintegrator.wbi_enums import ActionIfExists
 from wikidata_mapping import get_wikidata_id
 
+import claim_builder
 import constants
 import json
-import wikibaseintegrator.datatypes as datatypes
+import review_queue
+import wikibase_session
 import wikibaseintegrator.wbi_helpers as wbi_helpers
-import wikibaseintegrator.models as models
 import yaml
 
 # Read in YAML file.
@@ -50,7 +50,7 @@ def process_journal(entrez_obj):
     else:
         match_qid = check_if_journal_exists(entrez_obj['Article']['Journal']['Title'])
         if match_qid:
-            continue_to_add = input("Has this item (%s) already been updated? [Y/n]\n" % (str(match_qid)))
+            continue_to_add = review_queue.ask('journal', "Has this item (%s) already been updated? [Y/n]\n" % (str(match_qid)), per_article=True)
             if continue_to_add in ['Y', 'y']:
                 wikibase_mappings_json[entrez_obj['MedlineJournalInfo']['NlmUniqueID']] = match_qid
                 with open(constants.nlm_wikibase_mapping_file, 'w') as f:
@@ -259,9 +259,8 @@ def process_journal(entrez_obj):
 
 # Add if exists.
 def add_to_existing_journal(processed_journal_object, match_id):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
-    item = wbi.item.get(match_id)
+    item = wikibase_session.get_item(match_id)
+    original = item.get_json()
 
     for alias_lang, alias_list in processed_journal_object['aliases'].items():
         for alias in alias_list:
@@ -270,97 +269,36 @@ def add_to_existing_journal(processed_journal_object, match_id):
     appended_claims = []
 
     for claim_id, claim_dict in processed_journal_object['claims'].items():
-        already_added = False
-
-        referencesA = models.references.References()
-        referenceA1 = models.references.Reference()
-        if ('reference' in claim_dict) or (claim_id == 'P68'):
-            if isinstance(claim_dict, list):
-                for ref_id, ref_val in claim_dict[0]['reference'].items():
-                    if ref_id in ['P21', 'P278', 'P279']:
-                        referenceA1.add(datatypes.Item(prop_nr=ref_id, value=ref_val))
-                    elif ref_id in ['P561', 'P562']:
-                        print(ref_id)
-                        print(ref_val)
-                        referenceA1.add(datatypes.ExternalID(prop_nr=ref_id, value=ref_val))
-                    else:
-                        print(ref_id)
-                        print(ref_val)
-                        print('here1')
-                        exit()
-            else:
-                for ref_id, ref_val in claim_dict['reference'].items():
-                    if ref_id in ['P21', 'P278', 'P279']:
-                        referenceA1.add(datatypes.Item(prop_nr=ref_id, value=ref_val))
-                    elif ref_id in ['P561', 'P562']:
-                        print(ref_id)
-                        print(ref_val)
-                        referenceA1.add(datatypes.ExternalID(prop_nr=ref_id, value=ref_val))
-                    else:
-                        print(ref_id)
-                        print(ref_val)
-                        print('here1')
-                        exit()
-
-            referencesA.add(referenceA1)
-
-            if claim_id in ["P1", "P68", "P568", "P802"]: # Item
-                if isinstance(claim_dict, list):
-                    for counter, list_item in enumerate(claim_dict):
-                        claim_obj = datatypes.Item(prop_nr=claim_id, value=list_item['value'], references=referencesA)
-                        if counter == 0:
-                            item.claims.add(claim_obj)
-                        else:
-                            appended_claims.append(claim_obj)
-                    already_added = True
-                elif claim_id == "P1":
-                    claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-                    appended_claims.append(claim_obj)
-                else:
-                    claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-            elif claim_id in ["P67", "P800", "P801"]: # Monolingual Text
-                print(claim_id)
-                print(claim_dict)
-                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'], references=referencesA)
-            elif claim_id in ["P3", "P430", "P432", "P433", "P526", "P803"]: # External Identifier
-                claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here2')
-                exit()
+        # Values carry their own 'reference'; every P68 value is given the
+        # reference of the first one.
+        references = None
+        if isinstance(claim_dict, list) and claim_id == 'P68':
+            references = claim_builder.build_references(claim_dict[0]['reference'])
+        claim_objs = claim_builder.build_claims(claim_id, claim_dict, references=references)
+
+        if isinstance(claim_dict, list):
+            item.claims.add(claim_objs[0])
+            appended_claims.extend(claim_objs[1:])
+        elif claim_id == "P1" and 'reference' in claim_dict:
+            appended_claims.extend(claim_objs)
         else:
-            if claim_id in ["P1", "P68", "P568", "P802"]: # Item
-                print(claim_id)
-                print(claim_dict)
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict['value'])
-            elif claim_id in ["P67", "P800", "P801"]: # Monolingual Text
-                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'])
-            elif claim_id in ["P3", "P430", "P432", "P433", "P526", "P803"]: # External Identifier
-                claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict['value'])
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here3')
-                exit()
-
-        if not already_added:
-            item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
+            for claim_obj in claim_objs:
+                item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
 
     print(item)
-    item.write()
+    wikibase_session.write_item(item, original=original)
 
-    item = wbi.item.get(match_id)
+    item = wikibase_session.get_item(match_id)
+    original = item.get_json()
     for claim_obj in appended_claims:
         item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
-    item.write()
+    wikibase_session.write_item(item, original=original)
     
     return item
 
 # Add new.
 def add_new_journal(processed_journal_object):
-    login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
-    wbi = WikibaseIntegrator(login=login_instance)
+    wbi = wikibase_session.get_wbi()
     item = wbi.item.new()
 
     for alias_lang, alias_list in processed_journal_object['aliases'].items():
@@ -370,87 +308,25 @@ def add_new_journal(processed_journal_object):
     appended_claims = []
 
     for claim_id, claim_dict in processed_journal_object['claims'].items():
-        already_added = False
-
-        referencesA = models.references.References()
-        referenceA1 = models.references.Reference()
-        if ('reference' in claim_dict) or (claim_id == 'P68'):
-            if isinstance(claim_dict, list):
-                for ref_id, ref_val in claim_dict[0]['reference'].items():
-                    if ref_id in ['P21', 'P278', 'P279']:
-                        referenceA1.add(datatypes.Item(prop_nr=ref_id, value=ref_val))
-                    elif ref_id in ['P561', 'P562']:
-                        print(ref_id)
-                        print(ref_val)
-                        referenceA1.add(datatypes.ExternalID(prop_nr=ref_id, value=ref_val))
-                    else:
-                        print(ref_id)
-                        print(ref_val)
-                        print('here1')
-                        exit()
-            else:
-                for ref_id, ref_val in claim_dict['reference'].items():
-                    if ref_id in ['P21', 'P278', 'P279']:
-                        referenceA1.add(datatypes.Item(prop_nr=ref_id, value=ref_val))
-                    elif ref_id in ['P561', 'P562']:
-                        print(ref_id)
-                        print(ref_val)
-                        referenceA1.add(datatypes.ExternalID(prop_nr=ref_id, value=ref_val))
-                    else:
-                        print(ref_id)
-                        print(ref_val)
-                        print('here1')
-                        exit()
-
-            referencesA.add(referenceA1)
-
-            if claim_id in ["P1", "P68", "P568", "P802"]: # Item
-                if isinstance(claim_dict, list):
-                    for counter, list_item in enumerate(claim_dict):
-                        claim_obj = datatypes.Item(prop_nr=claim_id, value=list_item['value'], references=referencesA)
-                        if counter == 0:
-                            item.claims.add(claim_obj)
-                        else:
-                            appended_claims.append(claim_obj)
-                    already_added = True
-                else:
-                    claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-            elif claim_id in ["P67", "P800", "P801"]: # Monolingual Text
-                print(claim_id)
-                print(claim_dict)
-                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'], references=referencesA)
-            elif claim_id in ["P3", "P430", "P432", "P433", "P526", "P803"]: # External Identifier
-                claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict['value'], references=referencesA)
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here2')
-                exit()
+        # Values carry their own 'reference'; every P68 value is given the
+        # reference of the first one.
+        references = None
+        if isinstance(claim_dict, list) and claim_id == 'P68':
+            references = claim_builder.build_references(claim_dict[0]['reference'])
+        claim_objs = claim_builder.build_claims(claim_id, claim_dict, references=references)
+
+        if isinstance(claim_dict, list):
+            item.claims.add(claim_objs[0])
+            appended_claims.extend(claim_objs[1:])
         else:
-            if claim_id in ["P1", "P68", "P568", "P802"]: # Item
-                print(claim_id)
-                print(claim_dict)
-                claim_obj = datatypes.Item(prop_nr=claim_id, value=claim_dict['value'])
-            elif claim_id in ["P67", "P800", "P801"]: # Monolingual Text
-                claim_obj = datatypes.MonolingualText(prop_nr=claim_id, text=claim_dict['value'], language=claim_dict['language'])
-            elif claim_id in ["P3", "P430", "P432", "P433", "P526", "P803"]: # External Identifier
-                claim_obj = datatypes.ExternalID(prop_nr=claim_id, value=claim_dict['value'])
-            else:
-                print(claim_id)
-                print(claim_dict)
-                print('here3')
-                exit()
-
-        if not already_added:
-            item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
+            for claim_obj in claim_objs:
+                item.claims.add(claim_obj, action_if_exists=ActionIfExists.MERGE_REFS_OR_APPEND)
 
-    print(item)
-    item.write()
-
-    item = wbi.item.get(item.id)
     for claim_obj in appended_claims:
         item.claims.add(claim_obj, action_if_exists=ActionIfExists.FORCE_APPEND)
-    item.write()
+
+    print(item)
+    wikibase_session.create_item(item)
 
     return item
 
@@ -460,11 +336,11 @@ def check_if_journal_exists(query_str):
     search_list = wbi_helpers.search_entities(query_str)
     if len(search_list) > 0:
         for search_result in search_list:
-            accept_match = input("Is this entity (%s) a match for the journal name (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
+            accept_match = review_queue.ask('journal', "Is this entity (%s) a match for the journal name (%s)? [Y/n]\n" % (str(search_result), str(query_str)))
             if accept_match in ['Y', 'y', 'yes', 'true']:
                 match_id = search_result
     if match_id is None:
-        accept_match = input("Is there another match you would like to indicate for this journal title (%s)? If so, provide it here:\n" % (str(query_str)))
+        accept_match = review_queue.ask('journal', "Is there another match you would like to indicate for this journal title (%s)? If so, provide it here:\n" % (str(query_str)))
         if accept_match:
             match_id = accept_match.strip()
     return match_id
@@ -9,7 +9,9 @@
 from pathlib import Path
 
 import constants
+import dead_letter
 import json
+import review_queue
 import yaml
 
 # Read in YAML file.
@@ -30,8 +32,7 @@ def process_keywords_list(keyword_array):
                     if keyword_list.attributes['Owner'] == "NOTNLM":
                         processed_keyword['P492'] = 'Q27189'
                     else:
-                        print(keyword_list.attributes['Owner'])
-                        exit()
+                        raise dead_letter.UnprocessableRecord("Keyword list owner (%s) not recognized." % str(keyword_list.attributes['Owner']), stage='KeywordList')
             except AttributeError:
                 pass
             processed_keywords.append(processed_keyword)
@@ -41,7 +42,7 @@ def process_keywords_list(keyword_array):
 def process_keyword(keyword):
     processed_keyword = {}
     if keyword in keywords_json:
-        accept_match = input("Is this entity (%s) a match for the keyword (%s)? [Y/n]\n" % (str(keywords_json[keyword]['lgbtdb']), str(keyword)))
+        accept_match = review_queue.ask('keyword', "Is this entity (%s) a match for the keyword (%s)? [Y/n]\n" % (str(keywords_json[keyword]['lgbtdb']), str(keyword)))
         if accept_match in ['Y', 'y', 'yes', 'true']:
             try:
                 processed_keyword = {
@@ -55,8 +56,7 @@ def process_keyword(keyword):
             keywords_json[keyword] = {}
             with open(constants.OT_mapping_file, 'w') as f:
                 json.dump(keywords_json, f, indent=4, sort_keys=True)
-            print("Keyword (%s) not found. Please add a mapping to the appropriate JSON file to continue." % str(keyword))
-            exit()
+            raise dead_letter.UnprocessableRecord("Keyword (%s) not found. Please add a mapping to the appropriate JSON file." % str(keyword), stage='KeywordList')
     else:
         keywords_json[keyword] = {}
         with open(constants.OT_mapping_file, 'w') as f:
@@ -68,7 +68,7 @@ def process_keyword(keyword):
     return processed_keyword
 
 def add_to_mapping_file(keyword_str):
-    new_match = input('What is the QID that matches the keyword "%s"?\n' % (str(keyword_str)))
+    new_match = review_queue.ask('keyword', 'What is the QID that matches the keyword "%s"?\n' % (str(keyword_str)))
     keywords_json[str(keyword_str)][wikibase_name] = new_match.strip()
 
     with open(constants.OT_mapping_file, 'w') as f:
@@ -9,7 +9,9 @@
 from pathlib import Path
 
 import constants
+import dead_letter
 import json
+import review_queue
 import yaml
 
 # Read in YAML file.
@@ -57,7 +59,7 @@ def process_mesh_heading(mesh_heading):
             new_match = add_to_mapping_file(str(mesh_heading['DescriptorName']), str(mesh_heading['DescriptorName'].attributes['UI']))
             return process_mesh_heading(mesh_heading)
         except AttributeError:
-            exit()
+            raise dead_letter.UnprocessableRecord("MeSH descriptor name (%s) not found." % str(mesh_heading['DescriptorName']), stage='MeshHeading')
 
     return processed_mesh_heading
 
@@ -72,8 +74,7 @@ def process_descriptor_name(mesh_heading):
             if mesh_heading['DescriptorName'].attributes['Type'] == 'Geographic':
                 processed_mesh_descriptor_name['P816'] = 'Q27278'
             else:
-                print(mesh_heading['DescriptorName'])
-                exit()
+                raise dead_letter.UnprocessableRecord("MeSH descriptor type (%s) not recognized." % str(mesh_heading['DescriptorName'].attributes['Type']), stage='MeshHeading')
     except KeyError:
         new_match = add_to_mapping_file(mesh_heading['DescriptorName'], mesh_heading['DescriptorName'].attributes['UI'])
         process_descriptor_name(mesh_heading)
@@ -104,12 +105,11 @@ def process_qualifier_name(mesh_qualifier):
             new_match = add_to_mapping_file(str(mesh_qualifier), str(mesh_qualifier.attributes['UI']))
             return process_qualifier_name(mesh_qualifier)
         except AttributeError:
-            print(mesh_qualifier)
-            exit()
+            raise dead_letter.UnprocessableRecord("MeSH qualifier name (%s) not found." % str(mesh_qualifier), stage='MeshHeading')
     return processed_mesh_qualifier
 
 def add_to_mapping_file(mesh_name, mesh_uid):
-    new_match = input('What is the QID that matches the MeSH heading "%s" (%s)?\n' % (str(mesh_name), str(mesh_uid)))
+    new_match = review_queue.ask('mesh', 'What is the QID that matches the MeSH heading "%s" (%s)?\n' % (str(mesh_name), str(mesh_uid)))
     mesh_headings_json[str(mesh_name)][wikibase_name] = new_match.strip()
 
     with open(constants.MH_mapping_file, 'w') as f:
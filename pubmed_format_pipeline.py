@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   pubmed_format_pipeline.py
+#
+
+from Bio import Entrez
+from concurrent.futures import ProcessPoolExecutor
+from pubmed_format_conflict_of_interest_statement import detect_language
+from pubmed_format_date import process_date
+from pubmed_format_identifier import process_pmid
+from pubmed_format_language import process_languages
+
+import io
+import os
+
+# Splits article formatting into a CPU-bound stage that needs neither the
+# Wikibase nor user input (XML parsing, date handling, language detection),
+# which runs across a process pool, and the writing stage in
+# pubmed_format.process_object, which runs in order in the main process.
+
+# Pure parts of process_article, computed ahead of time. process_article
+# falls back to computing any value that is missing.
+def prepare_object(entrez_obj):
+    prepared = {}
+
+    languages = process_languages(entrez_obj['Article']['Language'])
+    prepared['languages'] = languages
+    if len(languages) > 1:
+        prepared['title_language'] = detect_language(str(entrez_obj['Article']['ArticleTitle']))
+
+    prepared['pmid'] = process_pmid(entrez_obj['PMID'])
+
+    if 'DateRevised' in entrez_obj:
+        prepared['date_revised'] = process_date(entrez_obj['DateRevised'])
+    if 'DateCompleted' in entrez_obj:
+        prepared['date_completed'] = process_date(entrez_obj['DateCompleted'])
+
+    return prepared
+
+# Parses one raw efetch batch and prepares each article. Runs in a worker
+# process; returns a list of (MedlineCitation, prepared values) tuples.
+def prepare_batch(raw_batch):
+    prepared_articles = []
+    for article in Entrez.parse(io.BytesIO(raw_batch)):
+        # Skip PubmedBookArticle records, which have no MedlineCitation.
+        if "MedlineCitation" in article:
+            medline_citation = article["MedlineCitation"]
+            prepared_articles.append((medline_citation, prepare_object(medline_citation)))
+    return prepared_articles
+
+# Yields (MedlineCitation, prepared values) for every article in the raw
+# batches, in their original order. At most a bounded window of batches is
+# submitted ahead of the consumer, so fetching, preparing and writing
+# overlap without buffering the whole result set.
+def prepare_batches(raw_batches, processes=None):
+    processes = processes or os.cpu_count() or 1
+    window = processes * 2
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = []
+        for raw_batch in raw_batches:
+            pending.append(executor.submit(prepare_batch, raw_batch))
+            if len(pending) >= window:
+                for prepared_article in pending.pop(0).result():
+                    yield prepared_article
+        while pending:
+            for prepared_article in pending.pop(0).result():
+                yield prepared_article
@@ -9,7 +9,9 @@
 from pathlib import Path
 
 import constants
+import dead_letter
 import json
+import review_queue
 import yaml
 
 # Read in YAML file.
@@ -53,8 +55,7 @@ def process_publication_type(publication_type):
         if pub_model == "Print":
             processed_publication_type["P828"] = "Q22733"
         else:
-            print("This publication model (%s) does not have a mapping. Add one to continue. Exiting..." % pub_model)
-            exit()
+            raise dead_letter.UnprocessableRecord("This publication model (%s) does not have a mapping. Add one to continue." % pub_model, stage='PublicationType')
     except KeyError:
         pass
     except AttributeError:
@@ -65,12 +66,11 @@ def process_publication_type(publication_type):
 def add_to_mapping_file(key_name, key_type):
     new_match = None
     if key_type == "instance_of":
-        new_match = input('What is the QID that for an instance of "%s" in the Wikibase %s?\n' % (str(key_name), str(wikibase_name)))
+        new_match = review_queue.ask('publication_type', 'What is the QID that for an instance of "%s" in the Wikibase %s?\n' % (str(key_name), str(wikibase_name)))
     elif key_type == "publication_type":
-        new_match = input('What is the QID that for the publication type "%s" in the Wikibase %s?\n' % (str(key_name), str(wikibase_name)))
+        new_match = review_queue.ask('publication_type', 'What is the QID that for the publication type "%s" in the Wikibase %s?\n' % (str(key_name), str(wikibase_name)))
     else:
-        print("The following key type (%s) is not available. Exiting..." % key_type)
-        exit()
+        raise dead_letter.UnprocessableRecord("The following key type (%s) is not available." % key_type, stage='PublicationType')
     publication_types_json[str(key_name)][wikibase_name+'_'+key_type] = new_match.strip()
 
     with open(constants.PT_mapping_file, 'w') as f:
@@ -7,14 +7,26 @@
 #
 
 from Bio import Entrez
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 import argparse
+import constants
+import entrez_scheduler
+import io
 import json
 import os.path
 import pandas as pd
+import pmid_index
+import pubmed_baseline
+import pubmed_cache
 import pubmed_format
+import pubmed_format_pipeline
+import review_queue
+import run_journal
+import tempfile
+import wikibase_plan
 import time
 import wikidata_mapping
 import yaml
@@ -25,17 +37,51 @@ yaml_dict=yaml.safe_load(Path("project.yaml").read_text())
 # PubMed email (provide a valid email address)
 Entrez.email = yaml_dict['entrez']['entrez_email']
 
+# Number of records requested per efetch call when using the history server.
+default_batch_size = yaml_dict['entrez'].get('batch_size', 500)
+
+# Number of articles whose existing Wikibase items are prefetched together.
+prefetch_group_size = 100
+
 def main():
 
     # Parse arguments
     parser=argparse.ArgumentParser()
     parser.add_argument('-q', type=str, required=False, help='The query string to search using.')
+    parser.add_argument('--query-file', type=str, required=False, help='A file of queries (one per line, optionally suffixed with [MeSH] or [OT]) to search together, fetching each distinct article once.')
+    parser.add_argument('--history', action='store_true', help='Search once using the Entrez history server (WebEnv/query_key) and fetch results in batches.')
+    parser.add_argument('--stream', action='store_true', help='Parse and process fetched records one article at a time instead of reading whole batches into memory (implies --history).')
+    parser.add_argument('--cache', action='store_true', help='Reuse raw article XML from the local cache for articles not revised since they were cached (implies --history).')
+    parser.add_argument('--sync', action='store_true', help='Only search for records added or revised since the last --sync run of this query (implies --history). Deferred and quarantined articles are not searched for again; replay them with review_queue.py or dead_letter.py.')
+    parser.add_argument('-b', '--batch-size', type=int, default=default_batch_size, help='The number of records to fetch per efetch call when using the history server.')
+    parser.add_argument('--baseline', type=str, required=False, help='A directory of PubMed baseline/update files (pubmed*.xml.gz) to read from instead of querying Entrez.')
+    parser.add_argument('-p', '--processes', type=int, default=None, help='The number of processes used to scan baseline/update files and to parse and format articles (default: one per core for baseline files; formatting runs in the main process unless set).')
+    parser.add_argument('--plan', type=str, required=False, help='Dry run: write the edits each article would make to this JSONL file instead of writing to the Wikibase.')
+    parser.add_argument('--headless', action='store_true', help='Never prompt; add unanswered match questions to the review queue and defer the articles that need them (see review_queue.py).')
+    parser.add_argument('-w', '--workers', type=int, default=entrez_scheduler.default_max_workers, help='The maximum number of efetch batches to keep in flight when using the history server.')
     args=parser.parse_args()
 
-    download_pubmed_metadata(args.q)
+    if args.sync and (args.query_file or args.baseline):
+        parser.error("--sync can only be used with -q, not with --query-file or --baseline.")
+
+    review_queue.headless = args.headless
+
+    if args.plan:
+        wikibase_plan.start(args.plan)
+        run_journal.enabled = False
+
+    if args.baseline:
+        download_pubmed_metadata_from_baseline(args.baseline, args.q, processes=args.processes)
+        return
+
+    if args.query_file:
+        download_pubmed_metadata_batch(args.query_file, batch_size=args.batch_size, stream=args.stream, max_workers=args.workers, use_cache=args.cache, processes=args.processes)
+        return
+
+    download_pubmed_metadata(args.q, use_history=(args.history or args.stream or args.cache or args.sync or args.processes), batch_size=args.batch_size, stream=args.stream, max_workers=args.workers, use_cache=args.cache, incremental=args.sync, processes=args.processes)
 
 # Step 1: Query PubMed and download metadata
-def download_pubmed_metadata(keyword, mesh=True, retmax=100, use_existing_pmids=True):
+def download_pubmed_metadata(keyword, mesh=True, retmax=100, use_existing_pmids=True, use_history=False, batch_size=default_batch_size, stream=False, max_workers=entrez_scheduler.default_max_workers, use_cache=False, incremental=False, processes=None):
     print(f"Searching PubMed for articles related to: {keyword}")
     
     # Search PubMed with the keyword or MeSH term or something else
@@ -44,6 +90,12 @@ def download_pubmed_metadata(keyword, mesh=True, retmax=100, use_existing_pmids=
     else:
         keyword = ('"%s"' % keyword) + '[OT]'
 
+    if incremental:
+        return sync_pubmed_metadata(keyword, batch_size=batch_size, stream=stream, max_workers=max_workers, use_cache=use_cache, processes=processes)
+
+    if use_history:
+        return download_pubmed_metadata_from_history(keyword, batch_size=batch_size, stream=stream, max_workers=max_workers, use_cache=use_cache, processes=processes)
+
     pubmed_ids = []
     retstart = 0
 
@@ -63,26 +115,12 @@ def download_pubmed_metadata(keyword, mesh=True, retmax=100, use_existing_pmids=
     print(f"Found {len(pubmed_ids)} articles. Fetching metadata...")
     file_json = {}
 
-    final_pubmed_ids = []
-    pubmed_wikibase_mappings = {}
-    with open('pmid-wikibase-mapping.json', 'r') as f:
-        pubmed_wikibase_mappings = json.load(f)
-
-    for pubmed_id in pubmed_ids:
-        if pubmed_id not in pubmed_wikibase_mappings.keys():
-            final_pubmed_ids.append(pubmed_id)
+    pubmed_wikibase_mappings = pmid_index.load_pmid_index()
+    final_pubmed_ids = pubmed_wikibase_mappings.filter_new(pubmed_ids)
 
     # Fetch article details using the list of PubMed IDs
     if len(final_pubmed_ids) > 0:
-    #    if len(final_pubmed_ids) > 500:
-    #        chunks = [final_pubmed_ids[x:x+100] for x in range(0, len(final_pubmed_ids), 100)]
-    #    else:
-    #        chunks = [final_pubmed_ids]
-    #
-    #    for counter, chunk in enumerate(chunks):
-    #        print("Obtaining Wikidata identifiers for chunk %s out of %s..." % (str(counter), str(len(chunks))))
-    #        wikidata_mapping.get_wikidata_id(chunk, id_type="PubMed")
-    #        time.sleep(10)
+    #    wikidata_mapping.get_wikidata_id(final_pubmed_ids, id_type="PubMed") # Chunked and throttled in wikidata_mapping.
 
         handle = Entrez.efetch(db="pubmed", id=",".join(final_pubmed_ids), retmode="xml")
         records = Entrez.read(handle)
@@ -102,6 +140,285 @@ def download_pubmed_metadata(keyword, mesh=True, retmax=100, use_existing_pmids=
         pubmed_objects = pubmed_format.process_object(article["MedlineCitation"])
         to_add.append(pubmed_objects)
 
+# Runs the search once on the history server, then fetches the results
+# in bounded batches rather than passing every PMID back in one URL.
+#
+# If stream is set, each article is parsed incrementally and handed to
+# pubmed_format.process_object on its own, so memory use does not grow
+# with the number of articles the query returns.
+#
+# If use_cache is set, articles already in the local XML cache that have
+# not been revised since they were cached are read from disk instead.
+def download_pubmed_metadata_from_history(term, batch_size=default_batch_size, stream=False, max_workers=entrez_scheduler.default_max_workers, use_cache=False, processes=None):
+    count, webenv, query_key = search_pubmed_history(term)
+    print(f"Found {count} articles. Fetching metadata in batches of {batch_size}...")
+
+    pubmed_wikibase_mappings = pmid_index.load_pmid_index()
+
+    if use_cache:
+        pubmed_ids = run_journal.filter_incomplete(pubmed_wikibase_mappings.filter_new(fetch_history_pmids(count, webenv, query_key)))
+        raw_batches = cached_pubmed_batches(term, pubmed_ids, batch_size=batch_size, max_workers=max_workers)
+    else:
+        raw_batches = entrez_scheduler.fetch_history_batches(count, webenv, query_key, batch_size, max_workers=max_workers)
+
+    return process_raw_batches(raw_batches, pubmed_wikibase_mappings, stream=stream, processes=processes)
+
+# Runs every query in a query file concurrently, takes the deduplicated
+# union of the PMIDs they return and fetches and processes each article
+# only once.
+#
+# Each non-blank line of the query file is a term, optionally suffixed
+# with [MeSH] (the default) or [OT]; lines starting with '#' are ignored.
+def download_pubmed_metadata_batch(query_file, batch_size=default_batch_size, stream=False, max_workers=entrez_scheduler.default_max_workers, use_cache=False, processes=None):
+    terms = read_query_file(query_file)
+    print(f"Searching PubMed for {len(terms)} queries...")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(search_pubmed_pmids, terms))
+
+    pubmed_wikibase_mappings = pmid_index.load_pmid_index()
+
+    union_pubmed_ids = {}
+    for term, term_pubmed_ids in zip(terms, results):
+        print(f"Found {len(term_pubmed_ids)} articles for {term}.")
+        union_pubmed_ids.update(dict.fromkeys(term_pubmed_ids))
+    pubmed_ids = run_journal.filter_incomplete(pubmed_wikibase_mappings.filter_new(union_pubmed_ids))
+    print(f"Found {len(pubmed_ids)} distinct articles not yet in the Wikibase. Fetching metadata in batches of {batch_size}...")
+
+    if use_cache:
+        combined_term = " OR ".join(f"({term})" for term in terms)
+        raw_batches = cached_pubmed_batches(combined_term, pubmed_ids, batch_size=batch_size, max_workers=max_workers)
+    else:
+        raw_batches = pubmed_id_batches(pubmed_ids, batch_size=batch_size, max_workers=max_workers)
+
+    return process_raw_batches(raw_batches, pubmed_wikibase_mappings, stream=stream, processes=processes)
+
+def read_query_file(query_file):
+    terms = []
+    with open(query_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.lower().endswith('[ot]'):
+                terms.append(('"%s"' % line[:-4].strip().strip('"')) + '[OT]')
+            elif line.lower().endswith('[mesh]'):
+                terms.append(('"%s"' % line[:-6].strip().strip('"')) + '[MeSH]')
+            else:
+                terms.append(('"%s"' % line.strip('"')) + '[MeSH]')
+    return terms
+
+def search_pubmed_pmids(term):
+    count, webenv, query_key = search_pubmed_history(term)
+    return fetch_history_pmids(count, webenv, query_key)
+
+# Hands each article to pubmed_format.process_object, skipping PMIDs already
+# mapped to the Wikibase.
+#
+# If processes is set, parsing and the other CPU-bound formatting steps run
+# across that many worker processes (see pubmed_format_pipeline), while the
+# Wikibase-writing steps still run one article at a time, in order.
+def process_raw_batches(raw_batches, pubmed_wikibase_mappings, stream=False, processes=None):
+    if processes:
+        processed_count = 0
+        prepared_articles = pubmed_format_pipeline.prepare_batches(raw_batches, processes=processes)
+        for medline_citation, prepared in prefetch_article_groups(prepared_articles, lambda prepared_article: prepared_article[0]):
+            if str(medline_citation['PMID']) not in pubmed_wikibase_mappings:
+                pubmed_format.process_object(medline_citation, prepared=prepared)
+                processed_count += 1
+        print(f"Processed {processed_count} articles.")
+        return processed_count
+
+    if stream:
+        processed_count = 0
+        for article in prefetch_article_groups(stream_pubmed_articles(raw_batches), lambda article: article["MedlineCitation"]):
+            medline_citation = article["MedlineCitation"]
+            del article
+            if str(medline_citation['PMID']) not in pubmed_wikibase_mappings:
+                pubmed_format.process_object(medline_citation)
+                processed_count += 1
+            del medline_citation
+        print(f"Processed {processed_count} articles.")
+        return processed_count
+
+    to_add = []
+    for records in read_pubmed_batches(raw_batches):
+        pubmed_format.prefetch_existing([article["MedlineCitation"] for article in records["PubmedArticle"]])
+        for article in records["PubmedArticle"]:
+            if str(article["MedlineCitation"]['PMID']) in pubmed_wikibase_mappings:
+                continue
+
+            print(article["MedlineCitation"])
+
+            pubmed_objects = pubmed_format.process_object(article["MedlineCitation"])
+            to_add.append(pubmed_objects)
+
+    return to_add
+
+# Passes articles through in groups of group_size, prefetching the existing
+# Wikibase items each group refers to before handing it on (see
+# pubmed_format.prefetch_existing). get_citation returns the MedlineCitation
+# of an item.
+def prefetch_article_groups(articles, get_citation, group_size=prefetch_group_size):
+    group = []
+    for article in articles:
+        group.append(article)
+        if len(group) >= group_size:
+            pubmed_format.prefetch_existing([get_citation(grouped_article) for grouped_article in group])
+            for grouped_article in group:
+                yield grouped_article
+            group = []
+    if group:
+        pubmed_format.prefetch_existing([get_citation(grouped_article) for grouped_article in group])
+        for grouped_article in group:
+            yield grouped_article
+
+# Incremental sync: restricts the search to records whose Entrez date (EDAT)
+# or modification date (MDAT) falls on or after the query's watermark, and
+# moves the watermark to the date this run started once it has finished.
+# The first run of a query has no watermark and searches its full history.
+# A run that stops with an error, or a dry run (--plan), which writes
+# nothing, leaves the watermark where it was.
+#
+# The watermark still moves when articles in the window were deferred (see
+# review_queue.py) or quarantined (see dead_letter.py), so a later --sync
+# will not search for them again. They are picked up by
+# review_queue.py --replay and dead_letter.py --replay instead.
+def sync_pubmed_metadata(term, batch_size=default_batch_size, stream=False, max_workers=entrez_scheduler.default_max_workers, use_cache=False, processes=None):
+    run_date = datetime.now().strftime('%Y/%m/%d')
+    watermark = load_sync_watermark(term)
+
+    sync_term = term
+    if watermark:
+        print(f"Searching for records added or revised since {watermark}...")
+        sync_term = f'({term}) AND (("{watermark}"[EDAT] : "3000"[EDAT]) OR ("{watermark}"[MDAT] : "3000"[MDAT]))'
+    else:
+        print("No watermark found for this query; searching its full history...")
+
+    result = download_pubmed_metadata_from_history(sync_term, batch_size=batch_size, stream=stream, max_workers=max_workers, use_cache=use_cache, processes=processes)
+    if wikibase_plan.planning:
+        print("Dry run; not moving the sync watermark.")
+    else:
+        save_sync_watermark(term, run_date)
+    return result
+
+def load_sync_watermark(term):
+    watermarks = {}
+    if os.path.isfile(constants.sync_watermark_file):
+        with open(constants.sync_watermark_file, 'r') as f:
+            watermarks = json.load(f)
+    return watermarks.get(term)
+
+def save_sync_watermark(term, watermark):
+    watermarks = {}
+    if os.path.isfile(constants.sync_watermark_file):
+        with open(constants.sync_watermark_file, 'r') as f:
+            watermarks = json.load(f)
+    watermarks[term] = watermark
+    with open(constants.sync_watermark_file, 'w') as f:
+        json.dump(watermarks, f, indent=4, sort_keys=True)
+
+def search_pubmed_history(term, **kwargs):
+    raw_record = entrez_scheduler.call_entrez(Entrez.esearch, db="pubmed", term=term, usehistory="y", retmax=0, **kwargs)
+    record = Entrez.read(io.BytesIO(raw_record))
+    return int(record['Count']), record['WebEnv'], record['QueryKey']
+
+# Uploads a list of PMIDs to the history server (as a POST, so the list
+# length is not limited by the URL).
+def post_pubmed_ids(pubmed_ids):
+    raw_record = entrez_scheduler.call_entrez(Entrez.epost, db="pubmed", id=",".join(pubmed_ids))
+    record = Entrez.read(io.BytesIO(raw_record))
+    return len(pubmed_ids), record['WebEnv'], record['QueryKey']
+
+# Lists the PMIDs of a history-server result set without fetching records.
+def fetch_history_pmids(count, webenv, query_key, page_size=10000):
+    pubmed_ids = []
+    for retstart in range(0, count, page_size):
+        raw_ids = entrez_scheduler.call_entrez(Entrez.efetch, db="pubmed", rettype="uilist", retmode="text", retstart=retstart, retmax=page_size, webenv=webenv, query_key=query_key)
+        if isinstance(raw_ids, bytes):
+            raw_ids = raw_ids.decode('utf-8')
+        pubmed_ids.extend(raw_ids.split())
+    return pubmed_ids
+
+# PMIDs matching the term whose records were modified on or after the given
+# date (YYYY-MM-DD).
+def search_revised_pmids(term, since):
+    count, webenv, query_key = search_pubmed_history(term, datetype="mdat", mindate=since.replace('-', '/'), maxdate="3000")
+    return set(fetch_history_pmids(count, webenv, query_key))
+
+# Yields raw XML batches for a history-server result set, reading articles
+# from the local cache where PubMed reports no revision since they were
+# cached and fetching (and caching) everything else.
+def cached_pubmed_batches(term, pubmed_ids, batch_size=default_batch_size, max_workers=entrez_scheduler.default_max_workers):
+    conn = pubmed_cache.connect()
+    try:
+        cached = pubmed_cache.get_cached_pmids(conn, pubmed_ids)
+        revised = set()
+        if cached:
+            revised = search_revised_pmids(term, min(fetched_at for date_revised, fetched_at in cached.values()))
+
+        from_cache = [pubmed_id for pubmed_id in pubmed_ids if pubmed_id in cached and pubmed_id not in revised]
+        to_fetch = [pubmed_id for pubmed_id in pubmed_ids if pubmed_id not in cached or pubmed_id in revised]
+        print(f"Reading {len(from_cache)} unchanged articles from the local cache and fetching {len(to_fetch)} from PubMed...")
+
+        for raw_batch in pubmed_cache.load_batches(conn, from_cache, batch_size=batch_size):
+            yield raw_batch
+
+        for raw_batch in pubmed_id_batches(to_fetch, batch_size=batch_size, max_workers=max_workers):
+            pubmed_cache.store_batch(conn, raw_batch)
+            yield raw_batch
+    finally:
+        conn.close()
+
+# Fetches an explicit list of PMIDs by posting them to the history server
+# in chunks and fetching each chunk in batches.
+def pubmed_id_batches(pubmed_ids, batch_size=default_batch_size, max_workers=entrez_scheduler.default_max_workers, post_size=10000):
+    for i in range(0, len(pubmed_ids), post_size):
+        post_count, post_webenv, post_query_key = post_pubmed_ids(pubmed_ids[i:i+post_size])
+        for raw_batch in entrez_scheduler.fetch_history_batches(post_count, post_webenv, post_query_key, batch_size, max_workers=max_workers):
+            yield raw_batch
+
+# Offline alternative to download_pubmed_metadata: reads the baseline/update
+# files in a directory, keeps the articles matching the MeSH heading (or
+# keyword, if mesh is False) and processes them without contacting Entrez.
+# Files are scanned in parallel and their matches spooled to a temporary
+# sqlite database one file at a time, so memory use does not grow with the
+# number of matches. Where a PMID appears in more than one file, the version
+# from the latest file is used: it is dropped if that version no longer
+# matches, as are PMIDs deleted by a later update file (DeleteCitation).
+def download_pubmed_metadata_from_baseline(directory, keyword, mesh=True, processes=None, batch_size=default_batch_size):
+    print(f"Searching PubMed baseline files for articles related to: {keyword}")
+
+    pubmed_wikibase_mappings = pmid_index.load_pmid_index()
+
+    with tempfile.TemporaryDirectory() as spool_directory:
+        conn = pubmed_cache.connect(os.path.join(spool_directory, 'baseline-matches.sqlite'))
+        try:
+            for file_name, file_prolog, matches, seen, deleted in pubmed_baseline.scan_baseline_directory(directory, keyword, mesh=mesh, processes=processes):
+                print(f"Found {len(matches)} matching articles in {file_name}" + (f"; {len(deleted)} PMIDs deleted." if deleted else "."))
+                pubmed_baseline.spool_matches(conn, file_prolog, matches, seen, deleted)
+            pubmed_ids = run_journal.filter_incomplete(pubmed_wikibase_mappings.filter_new(pubmed_baseline.spooled_pmids(conn)))
+
+            print(f"Found {len(pubmed_ids)} articles. Processing...")
+            raw_batches = pubmed_cache.load_batches(conn, pubmed_ids, batch_size=batch_size)
+            return process_raw_batches(raw_batches, pubmed_wikibase_mappings, stream=True, processes=processes)
+        finally:
+            conn.close()
+
+def read_pubmed_batches(raw_batches):
+    for raw_batch in raw_batches:
+        yield Entrez.read(io.BytesIO(raw_batch))
+
+# Yields one PubmedArticle at a time; each batch is parsed incrementally
+# with Entrez.parse rather than loaded in full with Entrez.read.
+def stream_pubmed_articles(raw_batches):
+    for raw_batch in raw_batches:
+        for article in Entrez.parse(io.BytesIO(raw_batch)):
+            # Skip PubmedBookArticle records, which have no MedlineCitation.
+            if "MedlineCitation" in article:
+                yield article
+        del raw_batch
+
 def format_pub_date(pub_date):
     """Convert PubMed's complex date format to a simple 'YYYY-MM-DD' string."""
     if 'Year' in pub_date:
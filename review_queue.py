@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   review_queue.py
+#
+
+from datetime import datetime, timezone
+
+import argparse
+import constants
+import csv
+import json
+import os.path
+import run_journal
+import threading
+
+# Lets the matching questions asked during ingestion ("Is this entity a
+# match for ...?", "What is the QID that matches ...?") be answered later.
+#
+# Every question goes through ask(). If it has already been answered in the
+# review queue, the recorded answer is used. Otherwise, in an interactive
+# run the user is prompted as before; in a headless run the question is
+# added to the queue along with the PMID that needed it, and the article is
+# deferred. Once the queue has been resolved with this script, the deferred
+# articles can be processed again:
+#
+#   python review_queue.py --resolve
+#   python review_queue.py --replay
+
+# Set by pubmed_query.py --headless.
+headless = False
+
+queue = None
+
+# ask() may be called from the Wikibase write threads; prompts are asked
+# one at a time and the queue file is written by one thread at a time.
+queue_lock = threading.RLock()
+
+# Raised by ask() in a headless run when a question has not been answered yet.
+class DeferredDecision(Exception):
+
+    def __init__(self, prompt, kind=None):
+        super().__init__(prompt)
+        self.prompt = prompt
+        self.kind = kind
+
+def main():
+
+    # Parse arguments
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--list', action='store_true', help='List the questions still waiting for an answer.')
+    parser.add_argument('--resolve', action='store_true', help='Answer the waiting questions one after another.')
+    parser.add_argument('--export', type=str, required=False, help='Write the waiting questions to a TSV file (kind, question, answer) to be filled in.')
+    parser.add_argument('--import', dest='import_file', type=str, required=False, help='Read answers from a TSV file written by --export; rows with an empty answer are skipped, and an answer of "-" or "none" records "no match".')
+    parser.add_argument('--replay', action='store_true', help='Fetch the deferred PMIDs again and process them in headless mode.')
+    args=parser.parse_args()
+
+    if args.export:
+        export_pending(args.export)
+    elif args.import_file:
+        import_answers(args.import_file)
+    elif args.resolve:
+        resolve_pending()
+    elif args.replay:
+        replay()
+    else:
+        for prompt, entry in pending().items():
+            print(f"[{entry['kind']}] ({len(entry['pmids'])} articles) {prompt.strip()}")
+
+def load_queue(queue_file=constants.review_queue_file):
+    global queue
+    if queue is None:
+        queue = {}
+        if os.path.isfile(queue_file):
+            with open(queue_file, 'r') as f:
+                queue = json.load(f)
+    return queue
+
+def save_queue(queue_file=constants.review_queue_file):
+    with open(queue_file, 'w') as f:
+        json.dump(load_queue(), f, indent=4, sort_keys=True)
+
+# Drop-in replacement for input(prompt). kind groups related questions
+# (e.g. 'author', 'mesh') when listing and resolving the queue.
+#
+# Questions whose answer depends on the article being processed ("Has this
+# item already been updated?") are asked with per_article set. They are
+# queued, and their answers reused, for the current PMID only, under the
+# prompt prefixed with "PMID <pmid>: ".
+def ask(kind, prompt, per_article=False):
+    pmid = run_journal.current_pmid
+    queue_key = prompt
+    if per_article:
+        queue_key = "PMID %s: %s" % (pmid, prompt) if pmid is not None else None
+
+    with queue_lock:
+        entry = load_queue().get(queue_key) if queue_key is not None else None
+        if entry is not None and entry['answer'] is not None:
+            return entry['answer']
+
+        if not headless:
+            return input(prompt)
+
+        if queue_key is not None:
+            if entry is None:
+                entry = queue[queue_key] = {'kind': kind, 'pmids': [], 'answer': None, 'added_at': datetime.now(timezone.utc).isoformat()}
+            if pmid is not None and pmid not in entry['pmids']:
+                entry['pmids'].append(pmid)
+            save_queue()
+    raise DeferredDecision(prompt, kind=kind)
+
+def pending():
+    return {prompt: entry for prompt, entry in load_queue().items() if entry['answer'] is None}
+
+def answer(prompt, value):
+    load_queue()[prompt]['answer'] = value
+    save_queue()
+
+# Prompts for each waiting question in turn, grouped by kind. Stop at any
+# point with Ctrl-D; answers given so far are kept.
+def resolve_pending():
+    waiting = sorted(pending().items(), key=lambda item: (item[1]['kind'] or '', item[0]))
+    print(f"{len(waiting)} questions are waiting for an answer.")
+    for prompt, entry in waiting:
+        print(f"[{entry['kind']}] Needed by PMIDs: {', '.join(entry['pmids'])}")
+        try:
+            answer(prompt, input(prompt))
+        except EOFError:
+            break
+
+def export_pending(export_file):
+    with open(export_file, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(['kind', 'question', 'answer'])
+        for prompt, entry in pending().items():
+            writer.writerow([entry['kind'], prompt, ''])
+
+# An empty answer in the file means the question has not been answered yet,
+# so "no match" is written as one of no_match_answers instead. It is stored
+# as an empty answer, which ask() returns the same way as pressing Enter at
+# the prompt.
+no_match_answers = ['-', 'none']
+
+def import_answers(import_file):
+    answered = 0
+    with open(import_file, 'r', newline='') as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            value = (row['answer'] or '').strip()
+            if row['question'] in load_queue() and value:
+                queue[row['question']]['answer'] = '' if value.lower() in no_match_answers else row['answer']
+                answered += 1
+    save_queue()
+    print(f"Recorded {answered} answers; {len(pending())} questions are still waiting.")
+
+# PMIDs deferred on a question that has since been answered.
+def deferred_pmids():
+    pmids = {}
+    for entry in load_queue().values():
+        if entry['answer'] is not None:
+            pmids.update(dict.fromkeys(entry['pmids']))
+    return list(pmids)
+
+# Processes the deferred articles again. A replayed article may stop on a
+# question further along that has not been asked before, in which case it
+# is deferred again.
+def replay():
+    global headless
+    import pmid_index
+    import pubmed_query
+
+    headless = True
+    pmids = run_journal.filter_incomplete(pmid_index.load_pmid_index().filter_new(deferred_pmids()))
+    print(f"Replaying {len(pmids)} deferred articles...")
+    if pmids:
+        pubmed_query.process_raw_batches(pubmed_query.pubmed_id_batches(pmids), pmid_index.load_pmid_index(), stream=True)
+    print(f"{len(pending())} questions are waiting for an answer.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   run_journal.py
+#
+
+from datetime import datetime, timezone
+
+import constants
+import json
+import sqlite3
+import threading
+import wikibase_write_queue
+
+# Durable record of which ingestion stages (journal, authors, grants,
+# article write) have finished for each PMID, so an interrupted run can
+# be resumed without redoing completed work. Stages that failed (including
+# via exit()) are recorded with their error and retried on the next run.
+
+conn = None
+
+# PMID of the article pubmed_format.process_object is working on.
+current_pmid = None
+
+# The stage being run on each thread (see call_in_stage), which edit_keys
+# uses to name the items a stage creates.
+stage_context = threading.local()
+
+# Turned off for dry runs (pubmed_query.py --plan), which must not mark
+# anything as done.
+enabled = True
+
+def connect(journal_file=constants.run_journal_file):
+    global conn
+    if conn is None:
+        conn = sqlite3.connect(journal_file)
+        conn.execute("""CREATE TABLE IF NOT EXISTS stages (
+            pmid TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (pmid, stage)
+        )""")
+        conn.commit()
+    return conn
+
+def begin_article(pmid):
+    global current_pmid
+    current_pmid = str(pmid)
+
+def end_article():
+    global current_pmid
+    current_pmid = None
+
+def set_status(pmid, stage, status, result=None, error=None):
+    connect().execute(
+        "INSERT OR REPLACE INTO stages (pmid, stage, status, result, error, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (str(pmid), stage, status, json.dumps(result), error, datetime.now(timezone.utc).isoformat())
+    )
+    conn.commit()
+
+# Returns (True, result) if the stage has completed for the PMID, otherwise
+# (False, None).
+def completed(pmid, stage):
+    row = connect().execute(
+        "SELECT result FROM stages WHERE pmid = ? AND stage = ? AND status = 'complete'",
+        (str(pmid), stage)
+    ).fetchone()
+    if row is None:
+        return False, None
+    return True, json.loads(row[0])
+
+def current_stage():
+    return getattr(stage_context, 'stage', None)
+
+# Runs func(*args, **kwargs) with stage as the current thread's stage.
+def call_in_stage(stage, func, *args, **kwargs):
+    previous_stage = current_stage()
+    stage_context.stage = stage
+    try:
+        return func(*args, **kwargs)
+    finally:
+        stage_context.stage = previous_stage
+
+# Runs func(*args, **kwargs) as the given stage of the PMID's ingestion,
+# unless it has already completed, in which case its recorded result is
+# returned instead.
+def run_stage(pmid, stage, func, *args, **kwargs):
+    if pmid is None or not enabled:
+        return call_in_stage(stage, func, *args, **kwargs)
+
+    is_complete, result = completed(pmid, stage)
+    if is_complete:
+        print(f"Skipping {stage} for PMID {pmid} (already completed).")
+        return result
+
+    set_status(pmid, stage, 'started')
+    try:
+        result = call_in_stage(stage, func, *args, **kwargs)
+    except (Exception, SystemExit) as exception:
+        set_status(pmid, stage, 'failed', error="%s: %s" % (type(exception).__name__, str(exception)))
+        raise
+    set_status(pmid, stage, 'complete', result=result)
+    return result
+
+# Like run_stage, but runs func on the Wikibase write queue so independent
+# stages (e.g. the authors of one article) are written concurrently. Returns
+# a future; pass the (stage, future) pairs to finish_stages to collect the
+# results. The journal itself is only touched from the calling thread.
+def submit_stage(pmid, stage, func, *args, **kwargs):
+    if pmid is None or not enabled:
+        return wikibase_write_queue.submit(call_in_stage, stage, func, *args, **kwargs)
+
+    is_complete, result = completed(pmid, stage)
+    if is_complete:
+        print(f"Skipping {stage} for PMID {pmid} (already completed).")
+        return wikibase_write_queue.completed(result)
+
+    set_status(pmid, stage, 'started')
+    return wikibase_write_queue.submit(call_in_stage, stage, func, *args, **kwargs)
+
+# Waits for every submitted stage, records each as complete or failed and
+# returns their results in order. If any stage failed, the first error is
+# raised, but only once all of them have finished and been recorded.
+def finish_stages(pmid, submitted_stages):
+    if not enabled:
+        pmid = None
+    results = []
+    first_exception = None
+    for stage, future in submitted_stages:
+        try:
+            result = future.result()
+        except (Exception, SystemExit) as exception:
+            if pmid is not None:
+                set_status(pmid, stage, 'failed', error="%s: %s" % (type(exception).__name__, str(exception)))
+            if first_exception is None:
+                first_exception = exception
+            results.append(None)
+            continue
+        if pmid is not None:
+            set_status(pmid, stage, 'complete', result=result)
+        results.append(result)
+    if first_exception is not None:
+        raise first_exception
+    return results
+
+# Returns the PMIDs (in their original order) whose article stage has not
+# completed.
+def filter_incomplete(pmids, chunk_size=500):
+    pmids = [str(pmid) for pmid in pmids]
+    complete = set()
+    for i in range(0, len(pmids), chunk_size):
+        chunk = pmids[i:i+chunk_size]
+        rows = connect().execute(
+            "SELECT pmid FROM stages WHERE stage = 'article' AND status = 'complete' AND pmid IN (%s)" % ",".join("?" * len(chunk)),
+            chunk
+        )
+        complete.update(row[0] for row in rows)
+    return [pmid for pmid in pmids if pmid not in complete]
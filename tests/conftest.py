@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# The modules read project.yaml from the working directory when imported,
+# so the tests run from a scratch directory holding a minimal one.
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_directory)
+
+test_directory = tempfile.mkdtemp(prefix='wikisheets-tests-')
+with open(os.path.join(test_directory, 'project.yaml'), 'w') as f:
+    f.write("wikibase:\n  wikibase_name: lgbtdb\n  max_write_workers: 4\n")
+os.chdir(test_directory)
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from wikibaseintegrator import WikibaseIntegrator
+
+import mediawiki_standin
+import wikibase_batch_writer
+
+
+def new_item(label):
+    item = WikibaseIntegrator().item.new()
+    item.labels.set('en', label)
+    return item
+
+
+def created_labels(standin):
+    labels = []
+    for recorded_call in standin.calls:
+        if recorded_call['request'].get('new') == 'item':
+            labels.append(json.loads(recorded_call['request']['data'])['labels']['en']['value'])
+    return labels
+
+
+def test_create_items_sends_each_item_once_in_one_call():
+    standin = mediawiki_standin.MediaWikiStandIn()
+    items = [new_item('Author %d' % n) for n in range(10)]
+
+    wikibase_batch_writer.create_items(items, api=standin)
+
+    assert sorted(created_labels(standin)) == sorted('Author %d' % n for n in range(10))
+
+
+def test_create_items_returns_qids_in_item_order():
+    standin = mediawiki_standin.MediaWikiStandIn(first_id=100)
+    items = [new_item('Grant %d' % n) for n in range(10)]
+
+    qids = wikibase_batch_writer.create_items(items, api=standin)
+
+    assert len(set(qids)) == 10
+    for n, qid in enumerate(qids):
+        assert standin.entities[qid]['labels']['en']['value'] == 'Grant %d' % n
+
+
+def test_create_items_fills_in_qid_and_revision():
+    standin = mediawiki_standin.MediaWikiStandIn()
+    items = [new_item('Journal %d' % n) for n in range(3)]
+
+    qids = wikibase_batch_writer.create_items(items, api=standin)
+
+    assert [item.id for item in items] == qids
+    assert all(item.lastrevid == standin.entities[item.id]['lastrevid'] for item in items)
+
+
+def test_create_items_creates_the_rest_when_one_fails():
+    standin = mediawiki_standin.MediaWikiStandIn()
+    items = [new_item('Author %d' % n) for n in range(3)]
+    call = standin.call
+
+    def failing_call(data):
+        if data.get('new') == 'item' and 'Author 1' in data['data']:
+            return call(dict(data, token='expired'))
+        return call(data)
+    standin.call = failing_call
+
+    with pytest.raises(mediawiki_standin.StandInError):
+        wikibase_batch_writer.create_items(items, api=standin)
+
+    assert items[0].id is not None and items[2].id is not None
+    assert items[1].id is None
@@ -0,0 +1,45 @@
+import json
+
+import mediawiki_standin
+import wikibase_plan
+
+
+def author_create(pmid, placeholder):
+    return {
+        'op': 'create',
+        'id': placeholder,
+        'key': '%s:author:1:create:Jane Smith#1' % pmid,
+        'data': {'labels': {'en': {'language': 'en', 'value': 'Jane Smith'}}}
+    }
+
+
+def write_plan(path, articles):
+    with open(path, 'w') as f:
+        for pmid, edits in articles:
+            f.write(json.dumps({'pmid': pmid, 'status': 'complete', 'edits': edits}) + '\n')
+
+
+def test_apply_plan_keeps_same_name_authors_apart(tmp_path):
+    plan_path = str(tmp_path / 'plan.jsonl')
+    write_plan(plan_path, [
+        ('9100001', [author_create('9100001', 'Q9000000001')]),
+        ('9100002', [author_create('9100002', 'Q9000000001')])
+    ])
+    standin = mediawiki_standin.MediaWikiStandIn()
+
+    made, skipped, conflicts = wikibase_plan.apply_plan(plan_path, api=standin)
+
+    assert (made, skipped, conflicts) == (2, 0, [])
+    assert len(standin.entities) == 2
+
+
+def test_apply_plan_again_skips_the_edits_already_made(tmp_path):
+    plan_path = str(tmp_path / 'plan.jsonl')
+    write_plan(plan_path, [('9200001', [author_create('9200001', 'Q9000000001')])])
+    standin = mediawiki_standin.MediaWikiStandIn()
+
+    wikibase_plan.apply_plan(plan_path, api=standin)
+    made, skipped, conflicts = wikibase_plan.apply_plan(plan_path, api=standin)
+
+    assert (made, skipped, conflicts) == (0, 1, [])
+    assert len(standin.entities) == 1
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   wikibase_batch_writer.py
+#
+
+import json
+import wikibase_write_queue
+import wikibaseintegrator.wbi_helpers as wbi_helpers
+
+# Creates new items from the formatters (add_new_author, add_new_grant,
+# ...). Each item is sent complete, with all of its labels, aliases and
+# claims, in a single wbeditentity call; the formatters used to create the
+# item and then write it again to add claims. The new QID (and revision)
+# are set on the item itself.
+#
+# The action API cannot create more than one entity per request, so there
+# is nothing to gain from holding items back to send them together.
+# create_item() sends the item straight away on the calling thread, which
+# is a write queue thread wherever the formatters submit their writes there
+# (see wikibase_write_queue.py); create_items() creates a list of items
+# concurrently through the write queue.
+#
+# api is anything with edit_token() and call(data) methods; WikibaseApi
+# talks to the configured wiki, and mediawiki_standin.MediaWikiStandIn
+# answers locally, so creates can be checked without a live wiki.
+
+# Sends requests to the configured wiki using the shared login, with the
+# same edit rate, re-login and throttling retries as every other write (see
+# wikibase_session.send_write). The edit token is taken from the login the
+# request is sent with, so a retry after logging in again uses a new one.
+class WikibaseApi:
+
+    def edit_token(self):
+        import wikibase_session
+        return wikibase_session.get_login().get_edit_token()
+
+    def call(self, data):
+        import wikibase_session
+
+        def send(login):
+            request = dict(data)
+            if 'token' in request:
+                request['token'] = login.get_edit_token()
+            return wbi_helpers.mediawiki_api_call_helper(data=request, login=login, allow_anonymous=False, is_bot=True, maxlag=wikibase_session.maxlag)
+
+        return wikibase_session.send_write(send)
+
+def create_entity(item, api=None):
+    api = api if api is not None else WikibaseApi()
+    data = item.get_json()
+    data.pop('id', None)
+    data.pop('lastrevid', None)
+    entity = api.call({
+        'action': 'wbeditentity',
+        'new': 'item',
+        'data': json.dumps(data),
+        'token': api.edit_token(),
+        'bot': 1,
+        'format': 'json'
+    })['entity']
+    item.id = entity['id']
+    if 'lastrevid' in entity:
+        item.lastrevid = entity['lastrevid']
+    return item.id
+
+# Creates item and returns its QID.
+def create_item(item, api=None):
+    return create_entity(item, api=api)
+
+# Creates every item in items, up to max_write_workers at once, and returns
+# their QIDs in the same order. An item that fails does not stop the rest;
+# once all have finished, the first error is raised. Not to be called from
+# a write queue thread, which would wait on the queue it is running on.
+def create_items(items, api=None):
+    futures = [wikibase_write_queue.submit(create_entity, item, api=api) for item in items]
+    qids = []
+    first_exception = None
+    for future in futures:
+        try:
+            qids.append(future.result())
+        except Exception as exception:
+            qids.append(None)
+            if first_exception is None:
+                first_exception = exception
+    if first_exception is not None:
+        raise first_exception
+    return qids
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   wikibase_diff.py
+#
+
+import json
+
+# Compares an item's JSON as fetched from the Wikibase with the same item
+# after the formatters have added their claims, so that unchanged items are
+# not written again. Only what an edit would change is compared. Statement,
+# snak and reference hashes and IDs, the *-order lists and the order of
+# statements, qualifiers and references are all ignored.
+
+def normalize_snak(snak):
+    return {
+        'property': snak.get('property'),
+        'snaktype': snak.get('snaktype', 'value'),
+        'datavalue': snak.get('datavalue')
+    }
+
+def normalize_snaks(snaks):
+    normalized = []
+    for prop_nr in sorted(snaks or {}):
+        for snak in snaks[prop_nr]:
+            normalized.append(json.dumps(normalize_snak(snak), sort_keys=True))
+    return sorted(normalized)
+
+def normalize_statement(statement):
+    return json.dumps({
+        'mainsnak': normalize_snak(statement.get('mainsnak', {})),
+        'rank': statement.get('rank', 'normal'),
+        'qualifiers': normalize_snaks(statement.get('qualifiers')),
+        'references': sorted(set(json.dumps(normalize_snaks(reference.get('snaks')), sort_keys=True) for reference in statement.get('references', [])))
+    }, sort_keys=True)
+
+def normalize_terms(terms):
+    normalized = {}
+    for language, values in (terms or {}).items():
+        if isinstance(values, list):
+            normalized[language] = sorted(value.get('value') for value in values if 'remove' not in value)
+        elif 'remove' not in values:
+            normalized[language] = values.get('value')
+    return normalized
+
+# Returns {part: normalized value}, where a part is 'labels', 'descriptions',
+# 'aliases' or a property ID.
+def normalize_entity(entity_json):
+    normalized = {
+        'labels': normalize_terms(entity_json.get('labels')),
+        'descriptions': normalize_terms(entity_json.get('descriptions')),
+        'aliases': normalize_terms(entity_json.get('aliases'))
+    }
+    for prop_nr, statements in (entity_json.get('claims') or {}).items():
+        statements = [statement for statement in statements if 'remove' not in statement]
+        if statements:
+            normalized[prop_nr] = sorted(normalize_statement(statement) for statement in statements)
+    return normalized
+
+# Returns the parts (see normalize_entity) that differ between the two
+# versions of the entity, sorted; an empty list means there is nothing to
+# write.
+def changed_parts(original_json, updated_json):
+    original = normalize_entity(original_json)
+    updated = normalize_entity(updated_json)
+    return sorted(part for part in set(original) | set(updated) if original.get(part) != updated.get(part))
+
+# Returns the entity JSON for a wbeditentity call that makes only the
+# changes from original_json to updated_json: the labels and descriptions
+# that differ, the aliases added or removed, and the statements added,
+# changed or removed. Everything else on the item is left as the wiki has
+# it, so edits made since the item was fetched are not overwritten.
+def edit_data(original_json, updated_json):
+    data = {}
+    for part in ['labels', 'descriptions']:
+        original_terms = original_json.get(part) or {}
+        updated_terms = updated_json.get(part) or {}
+        terms = {}
+        for language in set(original_terms) | set(updated_terms):
+            original_term = original_terms.get(language)
+            updated_term = updated_terms.get(language)
+            if updated_term is None or 'remove' in updated_term:
+                if original_term is not None:
+                    terms[language] = {'language': language, 'remove': ''}
+            elif original_term is None or original_term.get('value') != updated_term.get('value'):
+                terms[language] = {'language': language, 'value': updated_term.get('value')}
+        if terms:
+            data[part] = terms
+
+    original_aliases = normalize_terms(original_json.get('aliases'))
+    updated_aliases = normalize_terms(updated_json.get('aliases'))
+    aliases = {}
+    for language in set(original_aliases) | set(updated_aliases):
+        added = [value for value in updated_aliases.get(language, []) if value not in original_aliases.get(language, [])]
+        removed = [value for value in original_aliases.get(language, []) if value not in updated_aliases.get(language, [])]
+        changes = [{'language': language, 'value': value, 'add': ''} for value in added]
+        changes.extend({'language': language, 'value': value, 'remove': ''} for value in removed)
+        if changes:
+            aliases[language] = changes
+    if aliases:
+        data['aliases'] = aliases
+
+    claims = []
+    original_claims = original_json.get('claims') or {}
+    updated_claims = updated_json.get('claims') or {}
+    for prop_nr in set(original_claims) | set(updated_claims):
+        original_statements = original_claims.get(prop_nr, [])
+        unchanged = set(normalize_statement(statement) for statement in original_statements)
+        kept_ids = set()
+        for statement in updated_claims.get(prop_nr, []):
+            if 'remove' in statement:
+                if 'id' in statement:
+                    claims.append({'id': statement['id'], 'remove': ''})
+                continue
+            if 'id' in statement:
+                kept_ids.add(statement['id'])
+            if normalize_statement(statement) not in unchanged:
+                claims.append(statement)
+        for statement in original_statements:
+            if 'id' in statement and statement['id'] not in kept_ids and not any(claim.get('id') == statement['id'] for claim in claims):
+                claims.append({'id': statement['id'], 'remove': ''})
+    if claims:
+        data['claims'] = claims
+    return data
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   wikibase_plan.py
+#
+
+import argparse
+import edit_keys
+import json
+import threading
+import time
+import wikibase_diff
+
+# Dry-run mode for pubmed_query.py --plan. The formatters run as usual,
+# including their reads from the Wikibase, but wikibase_session hands every
+# new or changed item to this module instead of writing it. The edits are
+# written to a JSONL plan with one line per article:
+#
+#   {"pmid": "...", "status": "complete", "elapsed": 0.42, "edits": [
+#       {"op": "create", "id": "Q9000000001", "key": "...", "data": {...}},
+#       {"op": "update", "id": "Q123", "key": "...", "baserevid": 456, "changed": ["P12"], "data": {...}}
+#   ]}
+#
+# data is the entity JSON that wbeditentity would have been sent: the whole
+# item for a create, and only the changed terms and statements for an
+# update. elapsed is
+# the time spent formatting the article, with no write latency in it. key
+# is the edit's idempotency key (see edit_keys.py).
+#
+# Items that would be created are given placeholder IDs, numbered upwards
+# from placeholder_base, which is far above any real item. Other claims
+# can then refer to them, and the apply step swaps in the real QIDs. The
+# run journal is not updated, and new placeholder IDs are not saved to the
+# mapping files.
+#
+# A plan is applied with
+#
+#   python wikibase_plan.py --apply plan.jsonl
+#
+# which makes the edits of every complete article in order. Each edit's key
+# is recorded with its QID as soon as the edit is made, so an apply that
+# stops part way can simply be run again: edits already made are skipped
+# without a request to the wiki. Updates are sent with the revision they
+# were planned against (baserevid), so the wiki reports an edit conflict
+# rather than overwriting a change made since; conflicting updates are
+# skipped and listed at the end, to be planned again.
+
+placeholder_base = 9000000000
+
+planning = False
+plan_file = None
+current_plan = None
+next_placeholder = placeholder_base
+plan_lock = threading.Lock()
+
+def main():
+
+    # Parse arguments
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--apply', type=str, required=True, help='Plan file (JSONL) written by pubmed_query.py --plan.')
+    args=parser.parse_args()
+
+    apply_plan(args.apply)
+
+def start(plan_path):
+    global planning, plan_file
+    plan_file = open(plan_path, 'a')
+    planning = True
+
+def stop():
+    global planning, plan_file
+    planning = False
+    if plan_file is not None:
+        plan_file.close()
+        plan_file = None
+
+def begin_article(pmid):
+    global current_plan
+    with plan_lock:
+        current_plan = {'pmid': str(pmid), 'edits': [], 'started': time.perf_counter()}
+
+# status is 'complete', or 'quarantined'/'deferred' if the article stopped
+# part way (its edits are kept, but should not be applied).
+def end_article(status='complete'):
+    global current_plan
+    with plan_lock:
+        if current_plan is None:
+            return
+        plan = {
+            'pmid': current_plan['pmid'],
+            'status': status,
+            'elapsed': round(time.perf_counter() - current_plan['started'], 4),
+            'edits': current_plan['edits']
+        }
+        current_plan = None
+    plan_file.write(json.dumps(plan, sort_keys=True) + '\n')
+    plan_file.flush()
+
+def is_placeholder(qid):
+    try:
+        return int(str(qid).lstrip('Q')) >= placeholder_base
+    except ValueError:
+        return False
+
+def record(edit):
+    with plan_lock:
+        if current_plan is not None:
+            current_plan['edits'].append(edit)
+        elif plan_file is not None:
+            plan_file.write(json.dumps({'pmid': None, 'status': 'complete', 'elapsed': 0, 'edits': [edit]}, sort_keys=True) + '\n')
+
+# Plans the creation of item, gives it a placeholder ID and returns it.
+def plan_create(item, key=None):
+    global next_placeholder
+    with plan_lock:
+        next_placeholder += 1
+        placeholder = 'Q%d' % next_placeholder
+    data = item.get_json()
+    data.pop('id', None)
+    item.id = placeholder
+    record({'op': 'create', 'id': placeholder, 'key': key, 'data': data})
+    return placeholder
+
+# Plans an update of item. If original (the item's JSON as fetched) is
+# given, only the changes from it are planned (see wikibase_diff.edit_data),
+# so the update neither overwrites edits made on the wiki in the meantime
+# nor undoes an earlier planned update of the same item.
+def plan_update(item, changed=None, key=None, original=None):
+    data = item.get_json()
+    if original is not None:
+        data = wikibase_diff.edit_data(original, data)
+    record({'op': 'update', 'id': item.id, 'key': key, 'baserevid': getattr(item, 'lastrevid', None), 'changed': changed, 'data': data})
+    return item
+
+# Returns value with every placeholder ID (as 'id' or 'numeric-id') that has
+# been created replaced by its real ID.
+def resolve_placeholders(value, created):
+    if isinstance(value, list):
+        return [resolve_placeholders(element, created) for element in value]
+    if not isinstance(value, dict):
+        return value
+    resolved = {}
+    for part, element in value.items():
+        if part == 'id' and is_placeholder(element) and element in created:
+            element = created[element]
+        elif part == 'numeric-id' and is_placeholder(element) and 'Q%s' % element in created:
+            element = int(created['Q%s' % element].lstrip('Q'))
+        else:
+            element = resolve_placeholders(element, created)
+        resolved[part] = element
+    return resolved
+
+# Makes the edits of every complete article in the plan, in order, through
+# api (wikibase_batch_writer.WikibaseApi by default). Returns the numbers of
+# edits made and skipped, and the keys of the updates that hit an edit
+# conflict.
+def apply_plan(plan_path, api=None):
+    if api is None:
+        import wikibase_batch_writer
+        api = wikibase_batch_writer.WikibaseApi()
+
+    # Placeholder ID -> real QID. Placeholders are numbered again in each
+    # planning run, so a later create of the same placeholder replaces it.
+    created = {}
+    made = 0
+    skipped = 0
+    conflicts = []
+    token = None
+    with open(plan_path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            plan = json.loads(line)
+            if plan['status'] != 'complete':
+                print(f"Not applying PMID {plan['pmid']} ({plan['status']}).")
+                continue
+            for edit in plan['edits']:
+                key = edit.get('key')
+                qid = edit_keys.lookup(key)
+                if edit['op'] == 'create':
+                    data = resolve_placeholders(edit['data'], created)
+                    if qid is not None:
+                        created[edit['id']] = qid
+                        skipped += 1
+                        continue
+                    if token is None:
+                        token = api.edit_token()
+                    qid = api.call({
+                        'action': 'wbeditentity',
+                        'new': 'item',
+                        'data': json.dumps(data),
+                        'token': token,
+                        'bot': 1,
+                        'format': 'json'
+                    })['entity']['id']
+                    created[edit['id']] = qid
+                else:
+                    if qid is not None:
+                        skipped += 1
+                        continue
+                    qid = created.get(edit['id'], edit['id'])
+                    if is_placeholder(qid):
+                        raise ValueError(f"The plan updates {qid} before creating it.")
+                    data = resolve_placeholders(edit['data'], created)
+                    data['id'] = qid
+                    data.pop('lastrevid', None)
+                    if token is None:
+                        token = api.edit_token()
+                    request = {
+                        'action': 'wbeditentity',
+                        'id': qid,
+                        'data': json.dumps(data),
+                        'token': token,
+                        'bot': 1,
+                        'format': 'json'
+                    }
+                    if edit.get('baserevid') is not None:
+                        request['baserevid'] = edit['baserevid']
+                    try:
+                        api.call(request)
+                    except Exception as exception:
+                        if getattr(exception, 'code', None) != 'editconflict':
+                            raise
+                        print(f"Edit conflict updating {qid} for PMID {plan['pmid']}; skipping it.")
+                        conflicts.append(key or qid)
+                        continue
+                edit_keys.record(key, qid)
+                made += 1
+    print(f"Made {made} edits; skipped {skipped} already made.")
+    if conflicts:
+        print(f"{len(conflicts)} updates conflicted with edits made since planning and were not applied; plan their articles again:")
+        for conflict in conflicts:
+            print(f"  {conflict}")
+    return made, skipped, conflicts
+
+if __name__ == '__main__':
+    main()
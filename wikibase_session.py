@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   wikibase_session.py
+#
+
+from collections import OrderedDict
+from entrez_scheduler import TokenBucket
+from pathlib import Path
+from wikibaseintegrator import wbi_login, WikibaseIntegrator
+from wikibaseintegrator.wbi_config import config as wbi_config
+from wikibaseintegrator.wbi_exceptions import MWApiError
+
+import edit_keys
+import re
+import threading
+import time
+import wikibase_batch_writer
+import wikibase_diff
+import wikibase_plan
+import wikibaseintegrator.wbi_helpers as wbi_helpers
+import yaml
+
+# Read in YAML file.
+yaml_dict=yaml.safe_load(Path("project.yaml").read_text())
+
+full_bot_name = yaml_dict['wikibase']['full_bot_name']
+bot_password = yaml_dict['wikibase']['bot_password']
+
+wbi_config['MEDIAWIKI_API_URL'] = yaml_dict['wikibase']['mediawiki_api_url']
+wbi_config['SPARQL_ENDPOINT_URL'] = yaml_dict['wikibase']['sparql_endpoint_url']
+wbi_config['WIKIBASE_URL'] = yaml_dict['wikibase']['wikibase_url']
+
+# Writes are sent with maxlag, so the wiki asks us to back off when its
+# replicas fall behind; WikibaseIntegrator waits and retries on its own.
+maxlag = yaml_dict['wikibase'].get('maxlag', 5)
+
+# Edits per minute allowed across all write threads. Bot accounts usually
+# have a much higher limit than this, but the wiki's own rate limiter
+# ("ratelimited") is handled below either way.
+edits_per_minute = yaml_dict['wikibase'].get('edits_per_minute', 120)
+edit_bucket = TokenBucket(edits_per_minute / 60.0, capacity=max(1, edits_per_minute // 60))
+
+max_write_tries = 5
+
+# One bot login per process, shared by every module that writes to the
+# Wikibase. The login keeps a single requests session, so all API calls
+# reuse the same keep-alive connection, and it renews its edit token on its
+# own once the token is old. If the server rejects the session anyway
+# (expired cookies, a server restart), write_item() logs in again and
+# retries the write once.
+
+# MediaWiki error codes that mean the session or token is no longer valid.
+session_error_codes = {'badtoken', 'notloggedin', 'assertuserfailed', 'assertbotfailed'}
+
+# MediaWiki error codes that mean "slow down".
+throttle_error_codes = {'ratelimited', 'maxlag'}
+
+# While the wiki is throttling us, no write thread sends anything until
+# this time.
+paused_until = 0.0
+pause_lock = threading.Lock()
+
+login_lock = threading.Lock()
+login_instance = None
+wbi = None
+
+# Entity JSON fetched ahead of time by prefetch_items(), keyed by QID. An
+# entry is dropped once the item is written, so get_item() never returns a
+# stale copy of something this process has changed. Only the
+# entity_cache_size most recently used entries are kept, so items read but
+# never written do not pile up over a long run.
+entity_cache = OrderedDict()
+entity_cache_size = yaml_dict['wikibase'].get('entity_cache_size', 5000)
+entity_cache_lock = threading.Lock()
+
+# wbgetentities accepts at most 50 IDs per call (500 for some bots).
+prefetch_chunk_size = 50
+
+def get_login():
+    global login_instance
+    with login_lock:
+        if login_instance is None:
+            login_instance = wbi_login.Login(user=full_bot_name, password=bot_password)
+        return login_instance
+
+def get_wbi():
+    global wbi
+    login = get_login()
+    with login_lock:
+        if wbi is None or wbi.login is not login:
+            wbi = WikibaseIntegrator(login=login)
+        return wbi
+
+# Discards the current login (if it is still the one that failed) and logs
+# in again.
+def relogin(failed_login=None):
+    global login_instance
+    with login_lock:
+        if failed_login is None or login_instance is failed_login:
+            login_instance = None
+    return get_login()
+
+# Safe to call from several threads (see wikibase_write_queue.py).
+#
+# original is the item's JSON as fetched (item.get_json() right after
+# wbi.item.get()). If it is given and the item has not changed since, nothing
+# is written.
+def write_item(item, original=None, **kwargs):
+    changed = None
+    if original is not None:
+        changed = wikibase_diff.changed_parts(original, item.get_json())
+        if not changed:
+            print(f"{item.id} is already up to date; not writing.")
+            return item
+        print(f"Updating {item.id}: {', '.join(changed)}")
+    if wikibase_plan.planning:
+        return wikibase_plan.plan_update(item, changed=changed, key=edit_keys.next_key('update', item.id), original=original)
+    forget_item(item.id)
+    kwargs.setdefault('maxlag', maxlag)
+    return send_write(lambda login: item.write(login=login, **kwargs))
+
+# Calls write(login), which makes one write to the wiki, within the edit
+# rate. If the session has expired, logs in again and retries once; if the
+# wiki is throttling us, pauses every writer and retries with exponential
+# backoff. Used by write_item() and by the batch writer's creates.
+def send_write(write):
+    global paused_until
+    login = get_login()
+    relogged_in = False
+    last_exception = None
+    for attempt in range(max_write_tries):
+        with pause_lock:
+            wait = paused_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        edit_bucket.acquire()
+        try:
+            return write(login)
+        except MWApiError as exception:
+            last_exception = exception
+            code = getattr(exception, 'code', None)
+            if code in session_error_codes and not relogged_in:
+                print(f"Wikibase session expired ({code}); logging in again...")
+                login = relogin(login)
+                relogged_in = True
+            elif code in throttle_error_codes and attempt < max_write_tries - 1:
+                backoff = 5 * (2 ** attempt)
+                print(f"Wikibase is throttling writes ({code}); pausing for {backoff} seconds...")
+                with pause_lock:
+                    paused_until = max(paused_until, time.monotonic() + backoff)
+            else:
+                raise
+    raise last_exception
+
+# Creates a new item (sent complete, in one call) and returns its QID; see
+# wikibase_batch_writer.py. In a dry run, the item is added to the plan instead (see wikibase_plan.py).
+# If an earlier, interrupted run already created the item for this edit key
+# (see edit_keys.py), that item's QID is returned instead.
+def create_item(item):
+    key = edit_keys.next_key('create', edit_keys.item_name(item.get_json()))
+    if wikibase_plan.planning:
+        return wikibase_plan.plan_create(item, key=key)
+    qid = edit_keys.lookup(key)
+    if qid is not None:
+        print(f"{qid} was already created for {key}; not creating it again.")
+        item.id = qid
+        return qid
+    qid = wikibase_batch_writer.create_item(item)
+    edit_keys.record(key, qid)
+    return qid
+
+# Fetches the given items with as few wbgetentities calls as possible and
+# keeps them for get_item(). QIDs already cached are skipped.
+def prefetch_items(qids, chunk_size=prefetch_chunk_size):
+    with entity_cache_lock:
+        qids = [qid for qid in dict.fromkeys(str(qid) for qid in qids) if re.fullmatch(r'Q[0-9]+', qid) and qid not in entity_cache]
+    for i in range(0, len(qids), chunk_size):
+        chunk = qids[i:i+chunk_size]
+        response = wbi_helpers.mediawiki_api_call_helper(data={'action': 'wbgetentities', 'ids': '|'.join(chunk), 'format': 'json'}, login=get_login(), allow_anonymous=True)
+        with entity_cache_lock:
+            for qid, entity_json in response.get('entities', {}).items():
+                if 'missing' not in entity_json:
+                    entity_cache[qid] = entity_json
+                    entity_cache.move_to_end(qid)
+            while len(entity_cache) > entity_cache_size:
+                entity_cache.popitem(last=False)
+    return len(qids)
+
+# Drop-in replacement for wbi.item.get(qid) that uses the prefetched copy
+# if there is one.
+def get_item(qid):
+    with entity_cache_lock:
+        entity_json = entity_cache.get(str(qid))
+        if entity_json is not None:
+            entity_cache.move_to_end(str(qid))
+    if entity_json is None:
+        return get_wbi().item.get(qid)
+    return get_wbi().item.new().from_json(entity_json)
+
+def forget_item(qid):
+    with entity_cache_lock:
+        entity_cache.pop(str(qid), None)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   wikibase_write_queue.py
+#
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import threading
+import yaml
+
+# Read in YAML file.
+yaml_dict=yaml.safe_load(Path("project.yaml").read_text())
+
+# How many independent entity writes (e.g. the new authors of one article)
+# may be waiting on the Wikibase at once. The edit rate and maxlag are
+# enforced per write in wikibase_session.write_item().
+max_write_workers = yaml_dict['wikibase'].get('max_write_workers', 4)
+
+executor = None
+executor_lock = threading.Lock()
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_write_workers, thread_name_prefix='wikibase-write')
+        return executor
+
+# Runs func(*args, **kwargs) on the write queue and returns a future for its
+# result (usually a QID). With one worker, func runs straight away on the
+# calling thread; an error is still kept on the future, as it would be on
+# the queue, so the caller records the failure when it collects the result.
+def submit(func, *args, **kwargs):
+    if max_write_workers <= 1:
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except (Exception, SystemExit) as exception:
+            future.set_exception(exception)
+        return future
+    return get_executor().submit(func, *args, **kwargs)
+
+# A future that already holds result.
+def completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   wikidata_index.py
+#
+
+from datetime import datetime, timezone
+
+import argparse
+import bz2
+import constants
+import gzip
+import json
+import os
+import os.path
+import re
+import sqlite3
+import threading
+
+# Offline index of Wikidata identifier -> QID, built from a local dump, for
+# bulk backfills that would otherwise send every PMID and ORCID iD to the
+# query service. wikidata_mapping.get_wikidata_ids checks it before the
+# mapping store and the query service, so only identifiers missing from
+# the index (e.g. added to Wikidata since the dump) go over the network.
+#
+# The index is built from either
+#   - a JSON dump (https://dumps.wikimedia.org/wikidatawiki/entities/,
+#     latest-all.json.gz or .bz2), one entity per line, or
+#   - a truthy N-Triples dump or an extract of it, e.g.
+#       zgrep -E 'prop/direct/(P698|P1055|P496|P356|P236)>' latest-truthy.nt.gz > ids.nt
+#
+#   python wikidata_index.py --build latest-all.json.gz
+#   python wikidata_index.py --build ids.nt
+#
+# Both are streamed line by line; the dump is never loaded in full. From a
+# JSON dump, statements of every rank but deprecated are indexed. An
+# identifier held by more than one item keeps the first item seen.
+
+# PubMed ID, NLM Unique ID, ORCID iD, DOI and ISSN.
+indexed_properties = ['P698', 'P1055', 'P496', 'P356', 'P236']
+
+# Rows are written in batches of build_batch_size, and progress is printed
+# every progress_interval lines.
+build_batch_size = 50000
+progress_interval = 1000000
+
+# sqlite limits the number of parameters in one statement.
+lookup_chunk_size = 500
+
+ntriples_pattern = re.compile(r'^<http://www\.wikidata\.org/entity/(Q[0-9]+)> <http://www\.wikidata\.org/prop/direct/(P[0-9]+)> "((?:[^"\\]|\\.)*)"')
+
+# Each thread gets its own read-only connection, opened once the index
+# exists.
+connections = threading.local()
+
+def main():
+
+    # Parse arguments
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--build', type=str, help='Wikidata JSON dump or truthy N-Triples file (optionally .gz or .bz2) to build the index from.')
+    parser.add_argument('--format', choices=['json', 'ntriples'], help='Format of the dump (default: guessed from the file name).')
+    args=parser.parse_args()
+
+    if args.build:
+        build(args.build, dump_format=args.format)
+    for prop_nr, prop_count in counts().items():
+        print(f"{prop_nr}: {prop_count} identifiers.")
+
+def open_dump(dump_path):
+    if dump_path.endswith('.gz'):
+        return gzip.open(dump_path, 'rt', encoding='utf-8')
+    if dump_path.endswith('.bz2'):
+        return bz2.open(dump_path, 'rt', encoding='utf-8')
+    return open(dump_path, 'r', encoding='utf-8')
+
+def guess_format(dump_path):
+    name = re.sub(r'\.(gz|bz2)$', '', dump_path)
+    return 'ntriples' if name.endswith('.nt') else 'json'
+
+# Yields (property, identifier, QID) for the indexed properties of every
+# item in a JSON dump. Lines without any of the properties are not parsed.
+def read_json_dump(lines):
+    markers = ['"%s"' % prop_nr for prop_nr in indexed_properties]
+    for line in lines:
+        if not any(marker in line for marker in markers):
+            continue
+        line = line.strip().rstrip(',')
+        if not line.startswith('{'):
+            continue
+        entity = json.loads(line)
+        if entity.get('type') != 'item':
+            continue
+        for prop_nr in indexed_properties:
+            for claim in entity.get('claims', {}).get(prop_nr, []):
+                mainsnak = claim.get('mainsnak', {})
+                if claim.get('rank') == 'deprecated' or mainsnak.get('snaktype') != 'value':
+                    continue
+                yield prop_nr, mainsnak['datavalue']['value'], entity['id']
+
+# Yields (property, identifier, QID) for the triples of the indexed
+# properties in a truthy N-Triples file.
+def read_ntriples(lines):
+    properties = set(indexed_properties)
+    for line in lines:
+        if 'prop/direct/P' not in line:
+            continue
+        match = ntriples_pattern.match(line)
+        if match is None or match.group(2) not in properties:
+            continue
+        yield match.group(2), json.loads('"%s"' % match.group(3)), match.group(1)
+
+# Builds the index at index_file from dump_path, replacing any index there.
+# The new index is written next to it and moved into place when complete,
+# so a running ingest keeps using the old one until then.
+def build(dump_path, dump_format=None, index_file=constants.wikidata_index_file):
+    dump_format = dump_format or guess_format(dump_path)
+    reader = read_ntriples if dump_format == 'ntriples' else read_json_dump
+    building_file = index_file + '.building'
+    if os.path.exists(building_file):
+        os.remove(building_file)
+
+    conn = sqlite3.connect(building_file)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""CREATE TABLE identifiers (
+        property TEXT NOT NULL,
+        identifier TEXT NOT NULL,
+        qid TEXT NOT NULL,
+        PRIMARY KEY (property, identifier)
+    ) WITHOUT ROWID""")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    print(f"Building Wikidata identifier index from {dump_path} ({dump_format})...")
+    batch = []
+    indexed = 0
+    line_count = 0
+    with open_dump(dump_path) as f:
+        def counted_lines():
+            nonlocal line_count
+            for line in f:
+                line_count += 1
+                if line_count % progress_interval == 0:
+                    print(f"Read {line_count} lines; {indexed + len(batch)} identifiers found.")
+                yield line
+        for row in reader(counted_lines()):
+            batch.append(row)
+            if len(batch) >= build_batch_size:
+                conn.executemany("INSERT OR IGNORE INTO identifiers (property, identifier, qid) VALUES (?, ?, ?)", batch)
+                indexed += len(batch)
+                batch = []
+    conn.executemany("INSERT OR IGNORE INTO identifiers (property, identifier, qid) VALUES (?, ?, ?)", batch)
+    indexed += len(batch)
+    conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+        ('source', os.path.basename(dump_path)),
+        ('built_at', datetime.now(timezone.utc).isoformat())
+    ])
+    conn.commit()
+    conn.close()
+
+    os.replace(building_file, index_file)
+    print(f"Indexed {indexed} identifiers from {line_count} lines.")
+
+def connect(index_file=constants.wikidata_index_file):
+    conn = getattr(connections, 'conn', None)
+    if conn is None and os.path.isfile(index_file):
+        conn = sqlite3.connect(f"file:{index_file}?mode=ro", uri=True)
+        connections.conn = conn
+    return conn
+
+# Returns {identifier: QID} for the identifiers held by prop_nr in the
+# index, or nothing if no index has been built.
+def lookup(prop_nr, identifiers):
+    conn = connect()
+    if conn is None or prop_nr not in indexed_properties:
+        return {}
+    identifiers = [str(iden) for iden in identifiers]
+    found = {}
+    for x in range(0, len(identifiers), lookup_chunk_size):
+        chunk = identifiers[x:x+lookup_chunk_size]
+        rows = conn.execute(
+            "SELECT identifier, qid FROM identifiers WHERE property = ? AND identifier IN (%s)" % ",".join("?" * len(chunk)),
+            [prop_nr] + chunk
+        ).fetchall()
+        for identifier, qid in rows:
+            found[identifier] = qid
+    return found
+
+def counts():
+    conn = connect()
+    if conn is None:
+        return {}
+    return dict(conn.execute("SELECT property, COUNT(*) FROM identifiers GROUP BY property").fetchall())
+
+if __name__ == '__main__':
+    main()
@@ -6,122 +6,372 @@
 #   wikidata_mapping.py
 #
 
-import json
-import os.path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import random
+import re
 import requests
+import threading
+import time
+import wikidata_index
+import wikidata_mapping_store
+import yaml
+
+# Read in YAML file.
+yaml_dict=yaml.safe_load(Path("project.yaml").read_text())
+wikidata_settings = yaml_dict.get('wikidata') or {}
+
+sparql_url = 'https://query.wikidata.org/sparql'
+sparql_headers = {
+    'Accept': 'application/sparql-results+json',
+    'User-Agent': 'wikisheets (https://github.com/Superraptor/wikisheets)'
+}
+
+def normalize_orcid(orcid):
+    orcid = re.sub(r'^https?://orcid\.org/', '', orcid.strip()).upper()
+    if re.fullmatch(r'[0-9]{15}[0-9X]', orcid):
+        orcid = '-'.join(orcid[x:x+4] for x in range(0, 16, 4))
+    return orcid
+
+def normalize_doi(doi):
+    return re.sub(r'^(https?://(dx\.)?doi\.org/|doi:)', '', doi.strip(), flags=re.IGNORECASE).upper()
+
+def normalize_ror(ror):
+    return re.sub(r'^https?://ror\.org/', '', ror.strip()).lower()
+
+# Identifier types that can be resolved to Wikidata items: the Wikidata
+# property holding them, a regex a valid identifier matches (after
+# normalizing it to the form Wikidata stores) and the normalizer, if any.
+# Adding a type here is all it takes to resolve it.
+identifier_types = {
+    'PubMed': {'property': 'P698', 'pattern': r'[1-9][0-9]{0,9}'},
+    'NLM': {'property': 'P1055', 'pattern': r'[0-9]{7}R?|[0-9]{8,9}|[0-9]{16}'},
+    'ORCID': {'property': 'P496', 'pattern': r'[0-9]{4}-[0-9]{4}-[0-9]{4}-[0-9]{3}[0-9X]', 'normalize': normalize_orcid},
+    'DOI': {'property': 'P356', 'pattern': r'10\.[0-9]{4,9}/\S+', 'normalize': normalize_doi},
+    'ISSN': {'property': 'P236', 'pattern': r'[0-9]{4}-[0-9]{3}[0-9X]', 'normalize': str.upper},
+    'ROR': {'property': 'P6782', 'pattern': r'0[a-z0-9]{6}[0-9]{2}', 'normalize': normalize_ror},
+    'MeSH': {'property': 'P486', 'pattern': r'[CDQ][0-9]{6,9}'}
+}
+
+# Identifiers are resolved in chunks of up to sparql_chunk_size, each sent
+# as a POST (so no chunk can overflow a URL), with up to
+# sparql_max_workers chunks in flight. The query service allows only a few
+# concurrent queries per client. A chunk that times out on the server is
+# split in half and retried. Failed queries are tried up to
+# sparql_max_tries times; being throttled (429) is not a failure, and a
+# query may be throttled up to sparql_max_throttles times before giving up.
+sparql_chunk_size = 400
+sparql_max_workers = 3
+sparql_max_tries = 6
+sparql_max_throttles = 30
+sparql_base_backoff = 2.0
+sparql_max_backoff = 120.0
+sparql_timeout = 75
+
+# Lookups are memoized in-process, so an author who appears in many
+# articles is only looked up once. Identifiers found not to be on Wikidata
+# are re-checked once they are older than negative_ttl_days, both here and
+# in the mapping store, since they may have been added since.
+lookup_cache_size = wikidata_settings.get('lookup_cache_size', 10000)
+negative_ttl_days = wikidata_settings.get('negative_ttl_days', 30)
 
 def main():
     get_wikidata_id("33015654")
 
-# TODO: Generalize.
+# Bounded least-recently-used cache of identifier -> QID (or None), with a
+# time-to-live for the None entries.
+class LookupCache:
+
+    def __init__(self, max_size=lookup_cache_size, negative_ttl=negative_ttl_days * 86400):
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    # Returns (True, QID or None) on a hit and (False, None) on a miss.
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                qid, cached_at = entry
+                if qid is None and time.monotonic() - cached_at > self.negative_ttl:
+                    del self.entries[key]
+                    self.expired += 1
+                else:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, qid
+            self.misses += 1
+            return False, None
+
+    def put(self, key, qid):
+        with self.lock:
+            self.entries[key] = (qid, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'size': len(self.entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+lookup_cache = LookupCache()
+
+# Raised when the query service answers with an error that retrying will
+# not fix.
+class SparqlError(Exception):
+    pass
+
+class SparqlTimeout(Exception):
+    pass
+
+# When the query service answers 429, every worker waits until paused_until.
+# Each 429 in a row doubles the pause (unless Retry-After asks for longer);
+# a successful query resets it.
+paused_until = 0.0
+consecutive_throttles = 0
+throttle_lock = threading.Lock()
+
+def wait_for_throttle():
+    wait = paused_until - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+
+def throttled(retry_after=None):
+    global paused_until, consecutive_throttles
+    with throttle_lock:
+        delay = min(sparql_max_backoff, sparql_base_backoff * (2 ** consecutive_throttles)) + random.uniform(0, sparql_base_backoff)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        consecutive_throttles += 1
+        paused_until = max(paused_until, time.monotonic() + delay)
+    print(f"Wikidata query service is throttling requests; pausing for {delay:.1f} seconds...")
+
+def unthrottled():
+    global consecutive_throttles
+    with throttle_lock:
+        consecutive_throttles = 0
+
+# Returns identifier in the form Wikidata stores it, or None if it is not a
+# valid identifier of id_type.
+def normalize_identifier(identifier, id_type):
+    if id_type not in identifier_types:
+        raise ValueError("id_type must be one of %s." % ", ".join(identifier_types))
+    identifier_type = identifier_types[id_type]
+    identifier = str(identifier).strip()
+    if 'normalize' in identifier_type:
+        identifier = identifier_type['normalize'](identifier)
+    if not re.fullmatch(identifier_type['pattern'], identifier):
+        return None
+    return identifier
+
+def sparql_string(value):
+    return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+
+# One query for (id_type, identifier) pairs of any mix of types.
+def build_query(pairs):
+    formatted_values = " ".join(f'({sparql_string(id_type)} wdt:{identifier_types[id_type]["property"]} {sparql_string(iden)})' for id_type, iden in pairs)
+    return f"""
+    SELECT ?idType ?otherID ?wikidataID WHERE {{
+    VALUES (?idType ?property ?otherID) {{ {formatted_values} }}
+    ?wikidataID ?property ?otherID .
+    }}
+    """
+
+# Sends one query as a POST and returns its bindings, retrying on 429 (see
+# throttled), 5xx and network errors. Raises SparqlTimeout if the query
+# keeps timing out on the server.
+def run_sparql_query(query):
+    attempt = 0
+    throttles = 0
+    while attempt < sparql_max_tries:
+        wait_for_throttle()
+        try:
+            response = requests.post(sparql_url, headers=sparql_headers, data={'query': query}, timeout=sparql_timeout + 15)
+        except requests.exceptions.Timeout:
+            response = None
+        except requests.exceptions.ConnectionError as exception:
+            if attempt == sparql_max_tries - 1:
+                raise
+            print(f"Wikidata query failed ({exception}); retrying...")
+            time.sleep(min(sparql_max_backoff, sparql_base_backoff * (2 ** attempt)))
+            attempt += 1
+            continue
+
+        if response is not None and response.status_code == 200:
+            unthrottled()
+            return response.json()['results']['bindings']
+        if response is not None and response.status_code == 429:
+            throttles += 1
+            if throttles > sparql_max_throttles:
+                raise SparqlError("Failed to retrieve data: throttled too many times")
+            throttled(response.headers.get('Retry-After'))
+            continue
+        if response is None or (response.status_code in [500, 502, 504] and 'TimeoutException' in response.text):
+            raise SparqlTimeout(query)
+        if response.status_code < 500 or attempt == sparql_max_tries - 1:
+            raise SparqlError(f"Failed to retrieve data: {response.status_code}")
+        time.sleep(min(sparql_max_backoff, sparql_base_backoff * (2 ** attempt)))
+        attempt += 1
+    raise SparqlError("Failed to retrieve data: too many retries")
+
+# Returns {(id_type, identifier): QID} for the pairs in chunk that are on
+# Wikidata.
+def resolve_chunk(chunk):
+    try:
+        bindings = run_sparql_query(build_query(chunk))
+    except SparqlTimeout:
+        if len(chunk) == 1:
+            raise SparqlError(f"Query for {chunk[0][0]} {chunk[0][1]} timed out.")
+        half = len(chunk) // 2
+        print(f"Query for {len(chunk)} identifiers timed out; splitting it in two...")
+        found = resolve_chunk(chunk[:half])
+        found.update(resolve_chunk(chunk[half:]))
+        return found
+    found = {}
+    for result in bindings:
+        found[(result["idType"]["value"], result["otherID"]["value"])] = (result['wikidataID']['value']).rsplit('/', 1)[-1]
+    return found
+
+# Looks up any number of normalized (id_type, identifier) pairs, of any mix
+# of types, on Wikidata in chunks (see sparql_chunk_size), with up to
+# max_workers queries in flight. Returns {(id_type, identifier): QID or
+# None} for every pair given.
+#
+# If on_chunk is given, it is called on the calling thread with the same
+# kind of dict for each chunk as soon as that chunk has been resolved, so
+# the answers can be saved before the remaining chunks finish (or fail).
+def resolve_identifiers(pairs, chunk_size=sparql_chunk_size, max_workers=sparql_max_workers, on_chunk=None):
+    pairs = list(dict.fromkeys(pairs))
+    chunks = [pairs[x:x+chunk_size] for x in range(0, len(pairs), chunk_size)]
+    resolved = dict.fromkeys(pairs)
+    if not chunks:
+        return resolved
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        futures = {executor.submit(resolve_chunk, chunk): chunk for chunk in chunks}
+        for counter, future in enumerate(as_completed(futures)):
+            chunk_resolved = dict.fromkeys(futures[future])
+            chunk_resolved.update(future.result())
+            resolved.update(chunk_resolved)
+            if on_chunk is not None:
+                on_chunk(chunk_resolved)
+            if len(chunks) > 1:
+                print(f"Resolved chunk {counter + 1} of {len(chunks)} of Wikidata identifiers.")
+    return resolved
+
+# As resolve_identifiers, for identifiers of a single type. Returns
+# {identifier: QID or None}.
+def resolve_wikidata_ids(identifiers, id_type="PubMed", chunk_size=sparql_chunk_size, max_workers=sparql_max_workers):
+    resolved = resolve_identifiers([(id_type, str(iden)) for iden in identifiers], chunk_size=chunk_size, max_workers=max_workers)
+    return {iden: wikidata_id for (_, iden), wikidata_id in resolved.items()}
+
+# Returns {(id_type, identifier): QID or None} for a mixed batch of
+# (id_type, identifier) pairs, e.g. every identifier of an article. The
+# in-process cache, the offline index (see wikidata_index.py) and the
+# mapping store are checked first, and whatever is left is resolved in one
+# set of queries. Invalid identifiers map to
+# None without being looked up.
+def get_wikidata_ids(pairs):
+    results = {}
+    normalized_pairs = {}
+    for id_type, iden in pairs:
+        normalized = normalize_identifier(iden, id_type)
+        results[(id_type, iden)] = None
+        if normalized is not None:
+            normalized_pairs.setdefault((id_type, normalized), []).append((id_type, iden))
+        else:
+            print(f"{iden} does not match the {id_type} identifier pattern ({identifier_types[id_type]['pattern']}); not looking it up.")
+
+    found = {}
+    to_look_up = {}
+    for pair in normalized_pairs:
+        hit, wikidata_id = lookup_cache.get(pair)
+        if hit:
+            found[pair] = wikidata_id
+        else:
+            to_look_up.setdefault(pair[0], []).append(pair[1])
+
+    for id_type, identifiers in to_look_up.items():
+        indexed = wikidata_index.lookup(identifier_types[id_type]['property'], identifiers)
+        for iden, wikidata_id in indexed.items():
+            lookup_cache.put((id_type, iden), wikidata_id)
+            found[(id_type, iden)] = wikidata_id
+        to_look_up[id_type] = [iden for iden in identifiers if iden not in indexed]
+
+    to_find = []
+    for id_type, identifiers in to_look_up.items():
+        if not identifiers:
+            continue
+        stored = wikidata_mapping_store.lookup(id_type, identifiers, negative_ttl=lookup_cache.negative_ttl)
+        for iden in identifiers:
+            if iden in stored:
+                lookup_cache.put((id_type, iden), stored[iden])
+                found[(id_type, iden)] = stored[iden]
+            else:
+                to_find.append((id_type, iden))
+
+    # Each chunk's answers are stored as soon as it is resolved, so a run
+    # that stops part way does not look them up again.
+    def store_chunk(chunk_resolved):
+        for id_type in to_look_up:
+            chunk_mappings = {iden: wikidata_id for (resolved_type, iden), wikidata_id in chunk_resolved.items() if resolved_type == id_type}
+            if chunk_mappings:
+                wikidata_mapping_store.upsert(id_type, chunk_mappings)
+        for pair, wikidata_id in chunk_resolved.items():
+            lookup_cache.put(pair, wikidata_id)
+            found[pair] = wikidata_id
+
+    if to_find:
+        resolve_identifiers(to_find, on_chunk=store_chunk)
+
+    for pair, wikidata_id in found.items():
+        for original_pair in normalized_pairs[pair]:
+            results[original_pair] = wikidata_id
+    return results
+
 def get_wikidata_id(identifier, id_type="PubMed"):
     """
-    Retrieves the Wikidata ID given a PubMed ID or NLM Unique ID.
+    Retrieves the Wikidata ID given an identifier of one of the types in
+    identifier_types (a PubMed ID, NLM Unique ID, ORCID iD, DOI, ...).
     
     Args:
-        identifier (str): The PubMed ID or NLM Unique ID.
-        id_type (str): The type of identifier. Either "PubMed" or "NLM". Default is "PubMed".
+        identifier (str or list): The identifier, or a list of identifiers.
+        id_type (str): The type of identifier (see identifier_types). Default is "PubMed".
         
     Returns:
-        str: The Wikidata ID if found, otherwise None.
+        str: The Wikidata ID if found, otherwise None. For a list of
+        identifiers, a dictionary of the identifiers found and their IDs.
     """
 
-    id_dict = {}
-    file_name = None
-
-    if id_type == "PubMed":
-        file_name = "pubmed-wikidata-mapping.json"
-    elif id_type == "NLM":
-        file_name = "nlm-wikidata-mapping.json"
-    elif id_type == "ORCID":
-        file_name = "orcid-wikidata-mapping.json"
-    else:
-        print("id_type must be 'PubMed' or 'NLM'. Exiting...")
+    if id_type not in identifier_types:
+        print("id_type must be one of %s. Exiting..." % ", ".join(identifier_types))
         exit()
 
     if isinstance(identifier, str):
-        identifier = [identifier]
-
-    if os.path.isfile(file_name):
-        with open(file_name, 'r') as f:
-            id_dict = json.load(f)
-
-    to_find_list = []
-    found_dict = {}
-    for iden in identifier:
-        if iden not in id_dict.keys():
-            to_find_list.append(iden)
-        else:
-            found_dict[iden] = id_dict[iden]
-
-    if len(to_find_list) > 0:
-
-        formatted_identifier = " ".join([f'"{iden}"' for iden in to_find_list])
-
-        # Set up the appropriate SPARQL query depending on the identifier type
-        if id_type == "PubMed":
-            query = f"""
-            SELECT ?otherID ?wikidataID WHERE {{
-            ?wikidataID wdt:P698 ?otherID .
-            VALUES ?otherID {{ {formatted_identifier} }}.
-            }}
-            """
-        elif id_type == "NLM":
-            query = f"""
-            SELECT ?otherID ?wikidataID WHERE {{
-            ?wikidataID wdt:P1055 ?otherID .
-            VALUES ?otherID {{ {formatted_identifier} }}.
-            }}
-            """
-        elif id_type == "ORCID":
-            query = f"""
-            SELECT ?otherID ?wikidataID WHERE {{
-            ?wikidataID wdt:P496 ?otherID .
-            VALUES ?otherID {{ {formatted_identifier} }}.
-            }}
-            """
-        else:
-            raise ValueError("id_type must be 'PubMed', 'NLM', or 'ORCID'.")
-        
-        # Set up the SPARQL endpoint URL
-        url = 'https://query.wikidata.org/sparql'
-        headers = {'Accept': 'application/sparql-results+json'}
-        params = {'query': query}
-        
-        # Make the HTTP GET request
-        response = requests.get(url, headers=headers, params=params)
-        
-        # Check if the response is OK
-        if response.status_code == 200:
-            data = response.json()
-            if data['results']['bindings']:
-                results = response.json()["results"]["bindings"]
-                for result in results:
-                    id_dict[result["otherID"]["value"]] = (result['wikidataID']['value']).rsplit('/', 1)[-1]
-                    found_dict[result["otherID"]["value"]] = (result['wikidataID']['value']).rsplit('/', 1)[-1]
-                with open(file_name, 'w') as f:
-                    json.dump(id_dict, f, indent=4, sort_keys=True)
-                if len(to_find_list) == 1:
-                    return found_dict[to_find_list[0]]
-                else:
-                    return found_dict
-            else:
-                for iden in to_find_list:
-                    id_dict[iden] = None
-                with open(file_name, 'w') as f:
-                    json.dump(id_dict, f, indent=4, sort_keys=True)
-                if len(to_find_list) > 1:
-                    return found_dict
-                else:
-                    return None
-        else:
-            raise Exception(f"Failed to retrieve data: {response.status_code}")
+        return get_wikidata_ids([(id_type, identifier)])[(id_type, identifier)]
 
-    else:
-        if len(identifier) == 1:
-            return found_dict[identifier[0]]
-        else:
-            return found_dict
+    results = get_wikidata_ids([(id_type, str(iden)) for iden in identifier])
+    return {iden: wikidata_id for (_, iden), wikidata_id in results.items() if wikidata_id is not None}
 
 # Example usage:
 # wikidata_id = get_wikidata_id("27679979", id_type="PubMed")
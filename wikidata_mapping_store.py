@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+#
+#   Clair Kronk
+#   18 October 2026
+#   wikidata_mapping_store.py
+#
+
+from datetime import datetime, timedelta, timezone
+
+import argparse
+import constants
+import json
+import os.path
+import sqlite3
+import threading
+
+# Indexed store for the identifier -> Wikidata QID mappings used by
+# wikidata_mapping.get_wikidata_id (see wikidata_mapping.identifier_types).
+# A lookup is a primary-key read and new mappings are upserted in batches,
+# so the cost of a call no longer grows with the number of mappings (the
+# JSON files were read and rewritten in full on every call). Identifiers
+# known not to be on Wikidata are stored with a NULL QID.
+#
+# The store is seeded from the JSON mapping files (kept for PubMed, NLM and
+# ORCID) the first time an identifier type is used, and can be written back
+# to them for committing:
+#
+#   python wikidata_mapping_store.py --export
+
+# JSON files the mappings were kept in before, by identifier type.
+seed_files = {
+    'PubMed': 'pubmed-wikidata-mapping.json',
+    'NLM': 'nlm-wikidata-mapping.json',
+    'ORCID': 'orcid-wikidata-mapping.json'
+}
+
+# sqlite limits the number of parameters in one statement.
+lookup_chunk_size = 500
+
+# Each thread gets its own connection; the database is in WAL mode so
+# readers do not block each other or the writer.
+connections = threading.local()
+seeded = set()
+seed_lock = threading.Lock()
+
+def main():
+
+    # Parse arguments
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--export', action='store_true', help='Write the mappings back to the JSON mapping files.')
+    parser.add_argument('--import', dest='import_files', action='store_true', help='Load the JSON mapping files into the store again, replacing stored mappings.')
+    args=parser.parse_args()
+
+    for id_type in seed_files:
+        if args.import_files:
+            seed(id_type, force=True)
+        if args.export:
+            export(id_type)
+        print(f"{id_type}: {count(id_type)} mappings.")
+
+def connect(store_file=constants.wikidata_mapping_store_file):
+    conn = getattr(connections, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(store_file, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS mappings (
+            id_type TEXT NOT NULL,
+            identifier TEXT NOT NULL,
+            qid TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (id_type, identifier)
+        ) WITHOUT ROWID""")
+        conn.commit()
+        connections.conn = conn
+    return conn
+
+# Loads the JSON mapping file for id_type into the store, once per store.
+def seed(id_type, force=False):
+    with seed_lock:
+        if id_type in seeded and not force:
+            return
+        conn = connect()
+        has_rows = conn.execute("SELECT 1 FROM mappings WHERE id_type = ? LIMIT 1", (id_type,)).fetchone()
+        seed_file = seed_files.get(id_type)
+        if (force or not has_rows) and seed_file is not None and os.path.isfile(seed_file):
+            with open(seed_file, 'r') as f:
+                upsert(id_type, json.load(f))
+        seeded.add(id_type)
+
+# Returns {identifier: QID or None} for the identifiers that are in the
+# store; identifiers that have never been looked up are left out, as are
+# misses recorded more than negative_ttl seconds ago, if given.
+def lookup(id_type, identifiers, negative_ttl=None):
+    seed(id_type)
+    identifiers = [str(iden) for iden in identifiers]
+    negative_cutoff = ''
+    if negative_ttl is not None:
+        negative_cutoff = (datetime.now(timezone.utc) - timedelta(seconds=negative_ttl)).isoformat()
+    found = {}
+    conn = connect()
+    for x in range(0, len(identifiers), lookup_chunk_size):
+        chunk = identifiers[x:x+lookup_chunk_size]
+        rows = conn.execute(
+            "SELECT identifier, qid FROM mappings WHERE id_type = ? AND (qid IS NOT NULL OR updated_at >= ?) AND identifier IN (%s)" % ",".join("?" * len(chunk)),
+            [id_type, negative_cutoff] + chunk
+        ).fetchall()
+        for identifier, qid in rows:
+            found[identifier] = qid
+    return found
+
+# Stores {identifier: QID or None} in one transaction.
+def upsert(id_type, mappings):
+    updated_at = datetime.now(timezone.utc).isoformat()
+    conn = connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO mappings (id_type, identifier, qid, updated_at) VALUES (?, ?, ?, ?)",
+            [(id_type, str(identifier), qid, updated_at) for identifier, qid in mappings.items()]
+        )
+
+def count(id_type):
+    seed(id_type)
+    return connect().execute("SELECT COUNT(*) FROM mappings WHERE id_type = ?", (id_type,)).fetchone()[0]
+
+def export(id_type):
+    seed(id_type)
+    rows = connect().execute("SELECT identifier, qid FROM mappings WHERE id_type = ?", (id_type,)).fetchall()
+    with open(seed_files[id_type], 'w') as f:
+        json.dump(dict(rows), f, indent=4, sort_keys=True)
+
+if __name__ == '__main__':
+    main()